@@ -57,6 +57,8 @@ from src.gui._grid_table import GridTable
 from src.lib.parsers import get_font_from_data
 from src.lib.gpg import sign, verify
 from src.lib.selection import Selection
+from src.model.pys import FILE_VERSION, get_file_version
+from src.model.pys import iter_read, iter_write
 
 from src.actions._main_window_actions import Actions
 from src.actions._grid_cell_actions import CellActions
@@ -187,14 +189,11 @@ class FileActions(Actions):
     def _get_file_version(self, infile):
         """Returns infile version string."""
 
-        # Determine file version
-        for line1 in infile:
-            if line1.strip() != "[Pyspread save file version]":
-                raise ValueError(_("File format unsupported."))
-            break
+        try:
+            return get_file_version(infile)
 
-        for line2 in infile:
-            return line2.strip()
+        except ValueError:
+            raise ValueError(_("File format unsupported."))
 
     def _abort_open(self, filepath, infile):
         """Aborts file open"""
@@ -240,6 +239,7 @@ class FileActions(Actions):
         # Clear caches
         self.code_array.unredo.reset()
         self.code_array.result_cache.clear()
+        self.code_array.dependencies.clear()
 
         # Clear globals
         self.code_array.clear_globals()
@@ -278,7 +278,7 @@ class FileActions(Actions):
         # Abort if file version not supported
         try:
             version = self._get_file_version(infile)
-            if version != "0.1":
+            if version != FILE_VERSION:
                 statustext = \
                     _("File version {} unsupported (not 0.1).").format(version)
                 post_command_event(self.main_window, self.StatusBarMsg,
@@ -291,41 +291,17 @@ class FileActions(Actions):
 
         # Parse content
 
-        def parser(*args):
-            """Dummy parser. Raises ValueError"""
-
-            raise ValueError(_("No section parser present."))
-
-        section_readers = { \
-            "[shape]": self.code_array.dict_grid.parse_to_shape,
-            "[grid]": self.code_array.dict_grid.parse_to_grid,
-            "[attributes]": self.code_array.dict_grid.parse_to_attribute,
-            "[row_heights]": self.code_array.dict_grid.parse_to_height,
-            "[col_widths]": self.code_array.dict_grid.parse_to_width,
-            "[macros]": self.code_array.dict_grid.parse_to_macro,
-        }
-
         # Disable undo
         self.grid.code_array.unredo.active = True
 
         try:
-            for cycle, line in enumerate(infile):
-                stripped_line = line.decode("utf-8").strip()
-                if stripped_line:
-                    # There is content in this line
-                    if stripped_line in section_readers:
-                        # Switch parser
-                        parser = section_readers[stripped_line]
-                    else:
-                        # Parse line
-                        parser(line)
-                        if parser == self.code_array.dict_grid.parse_to_shape:
-                            # Empty grid
-                            self.clear(self.code_array.shape)
-
-                            self.grid.GetTable().ResetView()
-                else:
-                    pass
+            for cycle, section in \
+                    enumerate(iter_read(infile, self.code_array.dict_grid)):
+                if section == "[shape]":
+                    # Empty grid
+                    self.clear(self.code_array.shape)
+
+                    self.grid.GetTable().ResetView()
 
                 # Enable abort during long saves
                 if self._is_aborted(cycle, "Loading file... "):
@@ -421,7 +397,11 @@ class FileActions(Actions):
 
         filepath = event.attr["filepath"]
 
-        dict_grid = self.code_array.dict_grid
+        # Overridden cell attributes are neither saved nor looked up
+        self.code_array.cell_attributes.compact()
+
+        # The snapshot is not affected by edits during the save
+        dict_grid = self.code_array.dict_grid.snapshot()
 
         self.saving = True
         self.need_abort = False
@@ -442,10 +422,26 @@ class FileActions(Actions):
                 pass
             return False
 
-        # Header
+        # Options for self._is_aborted for each section
+        abort_options = { \
+            "[grid]": ["Saving grid... ", len(dict_grid), 100000],
+            "[attributes]": ["Saving cell attributes... ",
+                             len(dict_grid.cell_attributes)],
+            "[row_heights]": ["Saving row heights... ",
+                              len(dict_grid.row_heights)],
+            "[col_widths]": ["Saving column widths... ",
+                             len(dict_grid.col_widths)],
+            "[macros]": ["Saving macros... ", dict_grid.macros.count("\n")],
+        }
+
+        # Save cycle
+
         try:
-            outfile.write("[Pyspread save file version]\n")
-            outfile.write("0.1\n")
+            for section, cycle in iter_write(outfile, dict_grid):
+                # Enable abort during long saves
+                if self._is_aborted(cycle, *abort_options[section]):
+                    self._abort_save(filepath, outfile)
+                    return False
 
         except IOError:
             try:
@@ -454,53 +450,8 @@ class FileActions(Actions):
             except TypeError:
                 # The main window does not exist any more
                 pass
-
             return False
 
-        # The output generators yield the lines for the outfile
-        output_generators = [ \
-            # Grid content
-            dict_grid.grid_to_strings(),
-            # Cell attributes
-            dict_grid.attributes_to_strings(),
-            # Row heights
-            dict_grid.heights_to_strings(),
-            # Column widths
-            dict_grid.widths_to_strings(),
-            # Macros
-            dict_grid.macros_to_strings(),
-        ]
-
-        # Options for self._is_aborted
-        abort_options_list = [ \
-            ["Saving grid... ", len(dict_grid), 100000],
-            ["Saving cell attributes... ", len(dict_grid.cell_attributes)],
-            ["Saving row heights... ", len(dict_grid.row_heights)],
-            ["Saving column widths... ", len(dict_grid.col_widths)],
-            ["Saving macros... ", dict_grid.macros.count("\n")],
-        ]
-
-        # Save cycle
-
-        for generator, options in zip(output_generators, abort_options_list):
-            for cycle, line in enumerate(generator):
-                try:
-                    outfile.write(line.encode("utf-8"))
-
-                except IOError:
-                    try:
-                        post_command_event(self.main_window, self.StatusBarMsg,
-                                           text=io_error_text)
-                    except TypeError:
-                        # The main window does not exist any more
-                        pass
-                    return False
-
-                # Enable abort during long saves
-                if self._is_aborted(cycle, *options):
-                    self._abort_save(filepath, outfile)
-                    return False
-
         # Save is done
 
         outfile.close()
@@ -741,7 +692,8 @@ class TableActions(TableRowActionsMixin, TableColumnActionsMixin,
         row_overflow = False
         col_overflow = False
 
-        no_pasted_cells = 0
+        # Cells are set at once so that the paste is undone in one step
+        paste_items = []
 
         for src_row, col_data in enumerate(data):
             target_row = tl_row + src_row
@@ -762,13 +714,12 @@ class TableActions(TableRowActionsMixin, TableColumnActionsMixin,
                     col_overflow = True
                     break
 
-                key = target_row, target_col, tl_tab
+                paste_items.append(((target_row, target_col, tl_tab),
+                                    cell_data))
+
+        self.grid.code_array.set_many(paste_items)
 
-                try:
-                    self.grid.code_array[key] = cell_data
-                    no_pasted_cells += 1
-                except KeyError:
-                    pass
+        no_pasted_cells = len(paste_items)
 
         if row_overflow or col_overflow:
             self._show_final_overflow_message(row_overflow, col_overflow)
@@ -984,6 +935,7 @@ class GridActions(Actions):
 
         if 0 <= newtable <= no_tabs:
             self.grid.current_table = newtable
+            self.grid.code_array.activate_table(newtable)
             self.main_window.table_choice.SetMax(newtable + 1)
             self.main_window.table_choice.SetValue(newtable)
 
@@ -1094,9 +1046,24 @@ class SelectionActions(Actions):
                            changed=True)
 
         selection = self.get_selection()
+        dict_grid = self.grid.code_array.dict_grid
+
+        # Only the cells in the ranges of the selection are visited
+
+        ranges = [((top, left, None), (bottom + 1, right + 1, None))
+                  for (top, left), (bottom, right) in
+                  zip(selection.block_tl, selection.block_br)]
+        ranges += [((row, None, None), (row + 1, None, None))
+                   for row in selection.rows]
+        ranges += [((None, col, None), (None, col + 1, None))
+                   for col in selection.cols]
+        ranges += [((row, col, None), (row + 1, col + 1, None))
+                   for row, col in selection.cells]
+
+        del_keys = set()
 
-        del_keys = [key for key in self.grid.code_array \
-                        if key[:2] in selection]
+        for start, stop in ranges:
+            del_keys.update(dict_grid.iterkeys_in_range(start, stop))
 
         for key in del_keys:
             self.grid.actions.delete_cell(key)
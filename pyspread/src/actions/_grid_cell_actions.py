@@ -309,14 +309,14 @@ class CellActions(Actions):
             # We have an frozen cell that has to be unfrozen
 
             # Delete frozen cache content
-            self.grid.code_array.frozen_cache.pop(repr(cursor))
+            self.grid.code_array.frozen_cache.pop(cursor, None)
 
         else:
             # We have an non-frozen cell that has to be frozen
 
             # Add frozen cache content
             res_obj = self.grid.code_array[cursor]
-            self.grid.code_array.frozen_cache[repr(cursor)] = res_obj
+            self.grid.code_array.frozen_cache[cursor] = res_obj
 
         # Set the new frozen state / code
         selection = Selection([], [], [], [], [cursor[:2]])
@@ -464,6 +464,6 @@ class CellActions(Actions):
                 if skey in selection:
                     key = tuple(list(skey) + [tab])
                     result = self.grid.code_array._eval_cell(key)
-                    self.grid.code_array.frozen_cache[repr(key)] = result
+                    self.grid.code_array.frozen_cache[key] = result
 
         cell_attributes._attr_cache.clear()
\ No newline at end of file
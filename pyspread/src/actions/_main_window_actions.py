@@ -51,6 +51,7 @@ import lib.i18n as i18n
 from src.sysvars import get_help_path
 
 from src.config import config
+from src.model.parallel import Recalculation
 from src.lib.__csv import CsvInterface, TxtGenerator
 from src.gui._printout import PrintCanvas, Printout
 
@@ -436,8 +437,18 @@ class MacroActions(Actions):
         post_command_event(self.main_window, self.ContentChangedMsg,
                            changed=True)
 
+        if self.grid.recalculation is not None:
+            self.grid.recalculation.cancel()
+            self.grid.recalculation = None
+
         self.grid.code_array.execute_macros()
 
+        if config["parallel_recalculation"]:
+            # Results are merged in idle time, see GridEventHandlers.OnIdle
+            self.grid.recalculation = Recalculation(
+                self.grid.code_array,
+                processes=config["recalculation_processes"])
+
     def open_macros(self, filepath):
         """Loads macros from file and marks grid as changed
 
@@ -230,7 +230,7 @@ class TestCellActions(object):
 
         self.grid.actions.change_frozen_attr()
 
-        res = self.grid.code_array.frozen_cache[repr(cell)]
+        res = self.grid.code_array.frozen_cache[cell]
 
         assert res == result
 
@@ -311,7 +311,7 @@ class TestCellActions(object):
         self.grid.current_table = cell[2]
         self.grid.actions.change_frozen_attr()
 
-        res = self.grid.code_array.frozen_cache[repr(cell)]
+        res = self.grid.code_array.frozen_cache[cell]
         assert res == eval(code1)
 
         # Change cell code
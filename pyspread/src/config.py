@@ -26,14 +26,31 @@ pyspread config file
 """
 
 from ast import literal_eval
+import os
 
-import wx
+try:
+    import wx
+
+except ImportError:
+    # Headless operation without wxPython, e.g. in batch mode
+    wx = None
 
 from sysvars import get_color, get_font_string
 
 VERSION = "0.2.2"
 
 
+def is_headless():
+    """Returns True if no wx application is available
+
+    Without wx application, system colors, fonts and the display size
+    cannot be queried, and the configuration file is not used.
+
+    """
+
+    return wx is None or wx.GetApp() is None
+
+
 class DefaultConfig(object):
     """Contains default config for starting pyspread without resource file"""
 
@@ -41,21 +58,31 @@ class DefaultConfig(object):
         # User defined paths
         # ------------------
 
-        standardpaths = wx.StandardPaths.Get()
-        self.work_path = standardpaths.GetDocumentsDir()
+        if is_headless():
+            self.work_path = os.path.expanduser("~")
+
+        else:
+            standardpaths = wx.StandardPaths.Get()
+            self.work_path = standardpaths.GetDocumentsDir()
 
         # Window configuration
         # --------------------
 
+        if is_headless():
+            display_size = 1024, 768
+
+        else:
+            display_size = wx.GetDisplaySize()
+
         self.window_position = "(10, 10)"
-        self.window_size = repr((wx.GetDisplaySize()[0] * 9 / 10,
-                                 wx.GetDisplaySize()[1] * 9 / 10))
+        self.window_size = repr((display_size[0] * 9 / 10,
+                                 display_size[1] * 9 / 10))
         self.window_layout = "''"
         self.icon_theme = "'Tango'"
 
-        self.help_window_position = repr((wx.GetDisplaySize()[0] * 7 / 10, 15))
-        self.help_window_size = repr((wx.GetDisplaySize()[0] * 3 / 10,
-                                      wx.GetDisplaySize()[1] * 7 / 10))
+        self.help_window_position = repr((display_size[0] * 7 / 10, 15))
+        self.help_window_size = repr((display_size[0] * 3 / 10,
+                                      display_size[1] * 7 / 10))
 
         # Grid configuration
         # ------------------
@@ -71,15 +98,40 @@ class DefaultConfig(object):
         # Maximum result length in a cell in characters
         self.max_result_length = "1000"
 
-        # Colors
-        self.grid_color = repr(get_color(wx.SYS_COLOUR_3DSHADOW))
-        self.selection_color = repr(get_color(wx.SYS_COLOUR_HIGHLIGHT))
-        self.background_color = repr(get_color(wx.SYS_COLOUR_WINDOW))
-        self.text_color = repr(get_color(wx.SYS_COLOUR_WINDOWTEXT))
+        # Maximum number of cached cell results
+        self.max_result_cache_entries = "100000"
+
+        # Maximum estimated memory of cached cell results in bytes
+        self.max_result_cache_bytes = repr(256 * 1024 * 1024)
 
-        # Fonts
+        # Recalculate all cells in worker processes after executing macros
+        self.parallel_recalculation = "False"
 
-        self.font = repr(get_font_string(wx.SYS_DEFAULT_GUI_FONT))
+        # Number of worker processes, None uses the number of CPUs
+        self.recalculation_processes = "None"
+
+        # Maximum number of tables with cells in memory. Tables that have
+        # not been switched to recently are moved to temporary files.
+        # None keeps all tables in memory.
+        self.max_loaded_tables = "None"
+
+        # Colors and fonts
+
+        if is_headless():
+            self.grid_color = repr((160, 160, 160))
+            self.selection_color = repr((51, 153, 255))
+            self.background_color = repr((255, 255, 255))
+            self.text_color = repr((0, 0, 0))
+
+            self.font = repr("Sans")
+
+        else:
+            self.grid_color = repr(get_color(wx.SYS_COLOUR_3DSHADOW))
+            self.selection_color = repr(get_color(wx.SYS_COLOUR_HIGHLIGHT))
+            self.background_color = repr(get_color(wx.SYS_COLOUR_WINDOW))
+            self.text_color = repr(get_color(wx.SYS_COLOUR_WINDOWTEXT))
+
+            self.font = repr(get_font_string(wx.SYS_DEFAULT_GUI_FONT))
 
         # Default cell font size
 
@@ -129,7 +181,11 @@ class Config(object):
 
         self.data = DefaultConfig()
 
-        self.cfg_file = wx.Config(self.config_filename)
+        if is_headless():
+            self.cfg_file = None
+
+        else:
+            self.cfg_file = wx.Config(self.config_filename)
 
         self.load()
 
@@ -152,6 +208,9 @@ class Config(object):
         # Reset data
         self.data.__dict__.update(self.defaults.__dict__)
 
+        if self.cfg_file is None:
+            return
+
         for key in self.defaults.__dict__:
             if self.cfg_file.Exists(key):
                 setattr(self.data, key, self.cfg_file.Read(key))
@@ -159,6 +218,9 @@ class Config(object):
     def save(self):
         """Saves configuration file"""
 
+        if self.cfg_file is None:
+            return
+
         for key in self.defaults.__dict__:
             data = getattr(self.data, key)
 
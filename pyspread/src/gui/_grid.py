@@ -45,6 +45,7 @@ import src.lib.i18n as i18n
 
 import src.lib.xrect as xrect
 from src.model.model import CodeArray
+from src.model.scheduler import EvaluationScheduler
 
 from src.actions._grid_actions import AllGridActions
 
@@ -68,6 +69,12 @@ class Grid(wx.grid.Grid, EventMixin):
 
         # Create new grid
         self.code_array = CodeArray(dimensions)
+
+        # Defers slow cell evaluations to idle time
+        self.scheduler = EvaluationScheduler(self.code_array)
+
+        # Parallel Recalculation whose results are merged in idle time
+        self.recalculation = None
         post_command_event(self, self.GridActionNewMsg, shape=dimensions)
 
         _grid_table = GridTable(self, self.code_array)
@@ -141,6 +148,7 @@ class Grid(wx.grid.Grid, EventMixin):
         self.GetGridWindow().Bind(wx.EVT_MOTION, handlers.OnMouseMotion)
         self.Bind(wx.grid.EVT_GRID_CELL_LEFT_CLICK, handlers.OnMouseClick)
         self.Bind(wx.EVT_SCROLLWIN, handlers.OnScroll)
+        self.Bind(wx.EVT_IDLE, handlers.OnIdle)
 
         # Context menu
 
@@ -675,14 +683,43 @@ class GridEventHandlers(object):
             elif keycode == 27:
                 # Esc pressed
                 self.grid.actions.need_abort = True
+                self.grid.scheduler.cancel()
 
         event.Skip()
 
     def OnScroll(self, event):
         """Event handler for grid scroll event"""
 
+        # Queued cells may not be visible any more
+        self.grid.scheduler.cancel()
+
         event.Skip()
 
+    def OnIdle(self, event):
+        """Evaluates queued cells and redraws them when they are ready"""
+
+        scheduler = self.grid.scheduler
+
+        # Also resets the evaluation time budget for drawing
+        evaluated_keys = scheduler.step()
+
+        if any(key[2] == self.grid.current_table for key in evaluated_keys):
+            self.grid.ForceRefresh()
+
+        if scheduler.has_pending():
+            event.RequestMore()
+
+        recalculation = self.grid.recalculation
+
+        if recalculation is not None:
+            if recalculation.merge_ready():
+                self.grid.ForceRefresh()
+
+            if recalculation.done:
+                self.grid.recalculation = None
+            else:
+                event.RequestMore()
+
     # Grid view events
 
     def OnDisplayGoToCellDialog(self, event):
@@ -69,9 +69,76 @@ class GridRenderer(wx.grid.PyGridCellRenderer):
         # Zoom of grid
         self.zoom = 1.0
 
+        # Text that is shown while a cell is evaluated
+        self.placeholder = _(u"Evaluating...")
+
         # Old curso position
         self.old_cursor_row_col = 0, 0
 
+        # CellStyles of the visible cells are tuple of table, top row,
+        # left column, numpy array of CellStyles and attribute changes
+        self.style_block = None
+
+    def get_result(self, grid, key):
+        """Returns cell result or placeholder if the result is not ready
+
+        Cells that are not ready are evaluated in idle time by the grid's
+        scheduler.
+
+        """
+
+        is_ready, result = grid.scheduler.get_result(key)
+
+        if is_ready:
+            return result
+
+        return self.placeholder
+
+    def get_cell_style(self, grid, key):
+        """Returns CellStyle with the attributes of cell key
+
+        The CellStyles of all visible cells are resolved in one pass when
+        a cell outside the last resolved block is drawn or when the cell
+        attributes have changed.
+
+        """
+
+        row, col, tab = key
+
+        cell_attributes = self.data_array.cell_attributes
+
+        if self.style_block is not None:
+            block_tab, block_top, block_left, styles, changes = \
+                self.style_block
+
+            i, j = row - block_top, col - block_left
+
+            if block_tab == tab and changes == cell_attributes.changes and \
+               0 <= i < styles.shape[0] and 0 <= j < styles.shape[1]:
+                return styles[i, j]
+
+        (top, left), (bottom, right) = grid.actions.get_visible_area()
+
+        # Cells outside of the visible area, e.g. in printouts, get a
+        # block of the same size
+
+        if not top <= row <= bottom:
+            top, bottom = row, row + max(0, bottom - top)
+
+        if not left <= col <= right:
+            left, right = col, col + max(0, right - left)
+
+        # Border lines of the first row and column use row and column -1
+        top -= 1
+        left -= 1
+
+        styles = cell_attributes.resolve_block(xrange(top, bottom + 1),
+                                               xrange(left, right + 1), tab)
+
+        self.style_block = tab, top, left, styles, cell_attributes.changes
+
+        return styles[row - top, col - left]
+
     def get_zoomed_size(self, size):
         """Returns zoomed size as Integer
 
@@ -166,7 +233,7 @@ class GridRenderer(wx.grid.PyGridCellRenderer):
 
             if not( \
                (blocking_distance is None or distance == blocking_distance) \
-               and not self.data_array[__row, __col, tab]):
+               and not self.get_result(grid, (__row, __col, tab))):
 
                 yield __row, __col, tab
 
@@ -191,8 +258,9 @@ class GridRenderer(wx.grid.PyGridCellRenderer):
         for distance, __row, __col in grid.colliding_cells(row, col, textbox):
 
             if blocking_distance is None or distance == blocking_distance:
-                if self.data_array[__row, __col, tab] is not None and \
-                   self.data_array[__row, __col, tab] != "":
+                res = self.get_result(grid, (__row, __col, tab))
+
+                if res is not None and res != "":
                     blocking_distance = distance
                 else:
                     yield __row, __col, tab
@@ -229,7 +297,7 @@ class GridRenderer(wx.grid.PyGridCellRenderer):
 
         row, col, tab = key
 
-        cell_attributes = self.data_array.cell_attributes[key]
+        cell_attributes = self.get_cell_style(grid, key)
 
         # Text font attributes
         textfont = cell_attributes["textfont"]
@@ -483,8 +551,7 @@ class GridRenderer(wx.grid.PyGridCellRenderer):
         row, col, tab = key
 
         # Check if cell is merged:
-        cell_attributes = grid.code_array.cell_attributes
-        merge_area = cell_attributes[key]["merge_area"]
+        merge_area = self.get_cell_style(grid, key)["merge_area"]
 
         if merge_area is None:
             return rect
@@ -595,9 +662,10 @@ class GridRenderer(wx.grid.PyGridCellRenderer):
                              "borderwidth_bottom", "borderwidth_right",
                              "bordercolor_bottom", "bordercolor_right"]
 
+            cell_style = self.get_cell_style(grid, key)
+
             bg_key = tuple([width, height] + \
-                           [self.data_array.cell_attributes[key][bgc] \
-                                            for bgc in bg_components])
+                           [cell_style[bgc] for bgc in bg_components])
 
             try:
                 bg = self.backgrounds[bg_key]
@@ -620,7 +688,11 @@ class GridRenderer(wx.grid.PyGridCellRenderer):
                 bg.dc, 0, 0, mask_type)
 
         # Check if the dc is drawn manually be a return func
-        res = self.data_array[row, col, grid.current_table]
+        if printing:
+            # Printouts show all results
+            res = self.data_array[key]
+        else:
+            res = self.get_result(grid, key)
 
         if isinstance(res, types.FunctionType):
             # Add func_dict attribute
@@ -683,7 +755,8 @@ class Background(object):
         if self.selection:
             color.Set(*config["selection_color"])
         else:
-            rgb = self.data_array.cell_attributes[self.key]["bgcolor"]
+            get_cell_style = self.grid.grid_renderer.get_cell_style
+            rgb = get_cell_style(self.grid, self.key)["bgcolor"]
             color.SetRGB(rgb)
 
         bgbrush = wx.Brush(color, wx.SOLID)
@@ -698,7 +771,8 @@ class Background(object):
         x, y, w, h = 0, 0, self.rect.width - 1, self.rect.height - 1
         row, col, tab = key = self.key
 
-        cell_attributes = self.data_array.cell_attributes
+        get_cell_style = self.grid.grid_renderer.get_cell_style
+        cell_style = get_cell_style(self.grid, key)
 
         # Get borderpens and bgbrushes for rects
         # Each cell draws its bottom and its right line only
@@ -708,14 +782,14 @@ class Background(object):
 
         # Bottom line pen
 
-        color = cell_attributes[key]["bordercolor_bottom"]
-        width = cell_attributes[key]["borderwidth_bottom"]
+        color = cell_style["bordercolor_bottom"]
+        width = cell_style["borderwidth_bottom"]
         bottom_pen = get_pen_from_data((color, width, int(wx.SOLID)))
 
         # Right line pen
 
-        color = cell_attributes[key]["bordercolor_right"]
-        width = cell_attributes[key]["borderwidth_right"]
+        color = cell_style["bordercolor_right"]
+        width = cell_style["borderwidth_right"]
         right_pen = get_pen_from_data((color, width, int(wx.SOLID)))
 
         borderpens = [bottom_pen, right_pen]
@@ -725,8 +799,9 @@ class Background(object):
         if row == 0:
             lines.append((x, y, x + w, y))
             topkey = -1, col, tab
-            color = cell_attributes[topkey]["bordercolor_bottom"]
-            width = cell_attributes[topkey]["borderwidth_bottom"]
+            top_style = get_cell_style(self.grid, topkey)
+            color = top_style["bordercolor_bottom"]
+            width = top_style["borderwidth_bottom"]
             top_pen = get_pen_from_data((color, width, int(wx.SOLID)))
             borderpens.append(top_pen)
 
@@ -735,8 +810,9 @@ class Background(object):
         if col == 0:
             lines.append((x, y, x, y + h))
             leftkey = row, -1, tab
-            color = cell_attributes[leftkey]["bordercolor_bottom"]
-            width = cell_attributes[leftkey]["borderwidth_bottom"]
+            left_style = get_cell_style(self.grid, leftkey)
+            color = left_style["bordercolor_bottom"]
+            width = left_style["borderwidth_bottom"]
             left_pen = get_pen_from_data((color, width, int(wx.SOLID)))
             borderpens.append(left_pen)
 
@@ -44,6 +44,7 @@ import types
 from src.config import config
 
 from src.gui._events import post_command_event, StatusBarEventMixin
+from src.model.literals import to_literal
 
 
 def sniff(filepath):
@@ -369,7 +370,14 @@ class CsvInterface(StatusBarEventMixin):
 
                 if digest_key is not None and digest_res != "\b" and \
                    digest_key is not types.CodeType:
-                    digest_res = repr(digest_res)
+                    # Numbers, unicode and dates become literal cells
+                    literal = to_literal(digest_res)
+
+                    if literal is None:
+                        digest_res = repr(digest_res)
+
+                    else:
+                        digest_res = literal
                 elif digest_res == "\b":
                     digest_res = None
 
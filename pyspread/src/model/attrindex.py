@@ -0,0 +1,464 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright 2011 Martin Manns
+# Distributed under the terms of the GNU General Public License
+
+# --------------------------------------------------------------------
+# pyspread is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# pyspread is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with pyspread.  If not, see <http://www.gnu.org/licenses/>.
+# --------------------------------------------------------------------
+
+"""
+
+AttrIndex
+=========
+
+AttrIndex contains the SelectionIndex class, a spatial index of the
+selections of the cell attributes of one table.
+
+A lookup returns only the positions of the selections that contain a
+cell instead of testing each selection.
+
+Provides
+--------
+
+ * SelectionIndex: Spatial index of selections
+ * get_selection_bbox: Returns bounding box of a selection
+ * selection_covers: Returns True if a selection contains another one
+ * get_compacted_attributes: Returns minimal equivalent cell attributes
+
+"""
+
+from bisect import bisect_right
+from types import IntType, LongType
+
+
+class SelectionIndex(object):
+    """Spatial index of selections that are identified by their positions
+
+    Blocks are registered in the buckets of a uniform grid that they
+    overlap. Blocks that overlap more than max_block_buckets buckets or
+    that have no integer corners are checked on each lookup. Rows,
+    columns and cells are kept in dicts.
+
+    """
+
+    # Rows and columns of a bucket are 2 ** bucket_bits
+    bucket_bits = 5
+
+    # Maximum number of buckets of a block in the bucket grid
+    max_block_buckets = 64
+
+    def __init__(self):
+        # Maps bucket (row, col) to list of position, top, left, bottom,
+        # right of blocks
+        self._buckets = {}
+
+        # List of position, top, left, bottom, right of large blocks
+        self._large_blocks = []
+
+        # Map row, column or (row, col) of a cell to list of positions
+        self._rows = {}
+        self._cols = {}
+        self._cells = {}
+
+    def __len__(self):
+        """Returns number of entries, which may count a selection twice"""
+
+        return sum(len(positions) for positions in self._buckets.values()) + \
+            len(self._large_blocks) + \
+            sum(len(positions) for positions in self._rows.values()) + \
+            sum(len(positions) for positions in self._cols.values()) + \
+            sum(len(positions) for positions in self._cells.values())
+
+    def _add_block(self, pos, top_left, bottom_right):
+        """Adds block of selection at pos"""
+
+        top, left = top_left
+        bottom, right = bottom_right
+
+        int_types = IntType, LongType
+
+        if not all(type(ele) in int_types
+                   for ele in (top, left, bottom, right)):
+            self._large_blocks.append((pos, top, left, bottom, right))
+            return
+
+        if bottom < top or right < left:
+            # Empty block
+            return
+
+        bits = self.bucket_bits
+        first_row, last_row = top >> bits, bottom >> bits
+        first_col, last_col = left >> bits, right >> bits
+
+        if (last_row - first_row + 1) * (last_col - first_col + 1) > \
+           self.max_block_buckets:
+            self._large_blocks.append((pos, top, left, bottom, right))
+            return
+
+        block = pos, top, left, bottom, right
+        buckets = self._buckets
+
+        for bucket_row in xrange(first_row, last_row + 1):
+            for bucket_col in xrange(first_col, last_col + 1):
+                buckets.setdefault((bucket_row, bucket_col), []).append(block)
+
+    def add(self, pos, selection):
+        """Adds selection at position pos
+
+        Positions must be added in ascending order.
+
+        Parameters
+        ----------
+        pos: Integer
+        \tPosition of the selection, e.g. in the list of cell attributes
+        selection: Selection
+        \tSelection that is added
+
+        """
+
+        for top_left, bottom_right in zip(selection.block_tl,
+                                          selection.block_br):
+            self._add_block(pos, top_left, bottom_right)
+
+        for row in selection.rows:
+            self._rows.setdefault(row, []).append(pos)
+
+        for col in selection.cols:
+            self._cols.setdefault(col, []).append(pos)
+
+        for cell in selection.cells:
+            self._cells.setdefault(tuple(cell), []).append(pos)
+
+    def get_positions(self, row, col):
+        """Returns sorted list of positions of selections that contain cell
+
+        Parameters
+        ----------
+        row: Integer
+        \tRow of the cell
+        col: Integer
+        \tColumn of the cell
+
+        """
+
+        positions = set()
+
+        bits = self.bucket_bits
+        bucket = self._buckets.get((row >> bits, col >> bits), ())
+
+        for blocks in bucket, self._large_blocks:
+            for pos, top, left, bottom, right in blocks:
+                if top <= row <= bottom and left <= col <= right:
+                    positions.add(pos)
+
+        positions.update(self._rows.get(row, ()))
+        positions.update(self._cols.get(col, ()))
+        positions.update(self._cells.get((row, col), ()))
+
+        return sorted(positions)
+
+    def get_block_positions(self, top, left, bottom, right):
+        """Returns sorted list of positions of selections that meet block
+
+        Selections may be returned that contain no cell of the block if
+        they only have a large block that meets it partly.
+
+        Parameters
+        ----------
+        top: Integer
+        \tTop row of the block
+        left: Integer
+        \tLeft column of the block
+        bottom: Integer
+        \tBottom row of the block
+        right: Integer
+        \tRight column of the block
+
+        """
+
+        positions = set()
+
+        def meets(block):
+            """Returns True if block meets the query block"""
+
+            __, b_top, b_left, b_bottom, b_right = block
+
+            return (b_top is None or b_top <= bottom) and \
+                (b_bottom is None or top <= b_bottom) and \
+                (b_left is None or b_left <= right) and \
+                (b_right is None or left <= b_right)
+
+        bits = self.bucket_bits
+        first_row, last_row = top >> bits, bottom >> bits
+        first_col, last_col = left >> bits, right >> bits
+
+        buckets = self._buckets
+
+        if (last_row - first_row + 1) * (last_col - first_col + 1) < \
+           len(buckets):
+            bucket_keys = [(bucket_row, bucket_col)
+                           for bucket_row in xrange(first_row, last_row + 1)
+                           for bucket_col in xrange(first_col, last_col + 1)
+                           if (bucket_row, bucket_col) in buckets]
+        else:
+            bucket_keys = [(bucket_row, bucket_col)
+                           for bucket_row, bucket_col in buckets
+                           if first_row <= bucket_row <= last_row and
+                           first_col <= bucket_col <= last_col]
+
+        for bucket_key in bucket_keys:
+            positions.update(block[0] for block in buckets[bucket_key]
+                             if meets(block))
+
+        positions.update(block[0] for block in self._large_blocks
+                         if meets(block))
+
+        for lines, first, last in [(self._rows, top, bottom),
+                                   (self._cols, left, right)]:
+            for line, line_positions in lines.iteritems():
+                if first <= line <= last:
+                    positions.update(line_positions)
+
+        for (row, col), cell_positions in self._cells.iteritems():
+            if top <= row <= bottom and left <= col <= right:
+                positions.update(cell_positions)
+
+        return sorted(positions)
+
+# End of class SelectionIndex
+
+
+def get_selection_bbox(selection):
+    """Returns top, left, bottom, right of box that contains all cells
+
+    Sides that are None are unbounded. Selection.get_bbox is not used
+    because it bounds row and column selections by their own rows and
+    columns. None is returned for selections without parts.
+
+    Parameters
+    ----------
+    selection: Selection
+    \tSelection for which the bounding box is returned
+
+    """
+
+    tops, lefts, bottoms, rights = [], [], [], []
+
+    for (top, left), (bottom, right) in zip(selection.block_tl,
+                                            selection.block_br):
+        tops.append(top)
+        lefts.append(left)
+        bottoms.append(bottom)
+        rights.append(right)
+
+    for row in selection.rows:
+        tops.append(row)
+        bottoms.append(row)
+        lefts.append(None)
+        rights.append(None)
+
+    for col in selection.cols:
+        tops.append(None)
+        bottoms.append(None)
+        lefts.append(col)
+        rights.append(col)
+
+    for row, col in selection.cells:
+        tops.append(row)
+        lefts.append(col)
+        bottoms.append(row)
+        rights.append(col)
+
+    if not tops:
+        return
+
+    def get_side(values, func):
+        """Returns None if a value is unbounded else func(values)"""
+
+        return None if None in values else func(values)
+
+    return get_side(tops, min), get_side(lefts, min), \
+        get_side(bottoms, max), get_side(rights, max)
+
+
+def selection_covers(selection, other):
+    """Returns True if selection contains all cells of selection other
+
+    Each part of other has to be contained in a single part of selection.
+    Therefore, False may be returned for some covered selections.
+
+    Parameters
+    ----------
+    selection: Selection
+    \tSelection that may contain other
+    other: Selection
+    \tSelection that may be contained
+
+    """
+
+    rows = set(selection.rows)
+    cols = set(selection.cols)
+
+    if not (rows.issuperset(other.rows) and cols.issuperset(other.cols)):
+        return False
+
+    blocks = zip(selection.block_tl, selection.block_br)
+
+    for (top, left), (bottom, right) in zip(other.block_tl, other.block_br):
+        if bottom < top or right < left:
+            # Empty block
+            continue
+
+        if top == bottom and top in rows or left == right and left in cols:
+            continue
+
+        if not any(s_top <= top and bottom <= s_bottom and
+                   s_left <= left and right <= s_right
+                   for (s_top, s_left), (s_bottom, s_right) in blocks):
+            return False
+
+    return all(tuple(cell) in selection for cell in other.cells)
+
+
+def _get_selection_cell(selection):
+    """Returns a cell of selection or None if none is found"""
+
+    int_types = IntType, LongType
+
+    for (top, left), (bottom, right) in zip(selection.block_tl,
+                                            selection.block_br):
+        if type(top) in int_types and type(left) in int_types and \
+           top <= bottom and left <= right:
+            return top, left
+
+    if selection.rows:
+        return selection.rows[0], 0
+
+    if selection.cols:
+        return 0, selection.cols[0]
+
+    if selection.cells:
+        return tuple(selection.cells[0])
+
+
+def get_compacted_attributes(attributes, default_attributes,
+                             keep_keys=()):
+    """Returns list of cell attributes that yields the same cell formats
+
+    Attributes that later attributes override for all cells of their
+    selection are removed. Default values that no earlier attribute
+    overrides are removed. Attributes with equal selections are merged if
+    no attribute in between sets one of their keys. Attributes without
+    keys and attributes with empty selection are removed.
+
+    The attribute dicts of attributes are not changed.
+
+    Parameters
+    ----------
+    attributes: Iterable of 3-tuples
+    \tSelection, table and attribute dict of each cell attribute
+    default_attributes: Dict
+    \tAttributes of cells without cell attributes
+    keep_keys: Iterable, defaults to ()
+    \tKeys of attributes that are kept even if they equal the default
+
+    """
+
+    entries = [(selection, tab, dict(attr_dict))
+               for selection, tab, attr_dict in attributes]
+
+    # Index of the selections of each table
+    table_indices = {}
+    for pos, (selection, tab, _) in enumerate(entries):
+        if tab not in table_indices:
+            table_indices[tab] = SelectionIndex()
+        table_indices[tab].add(pos, selection)
+
+    # Remove keys that later attributes set for all cells of the selection
+    # The later attribute dicts are still complete when they are checked
+
+    for pos, (selection, tab, attr_dict) in enumerate(entries):
+        if not attr_dict:
+            continue
+
+        cell = _get_selection_cell(selection)
+
+        if cell is None:
+            later_positions = xrange(pos + 1, len(entries))
+        else:
+            # Covering selections contain cell
+            positions = table_indices[tab].get_positions(*cell)
+            later_positions = positions[bisect_right(positions, pos):]
+
+        for later_pos in later_positions:
+            later_selection, later_tab, later_attr_dict = entries[later_pos]
+
+            if later_tab != tab or \
+               not any(key in attr_dict for key in later_attr_dict) or \
+               not selection_covers(later_selection, selection):
+                continue
+
+            for key in later_attr_dict:
+                attr_dict.pop(key, None)
+
+            if not attr_dict:
+                break
+
+    # Remove default values that do not override an earlier attribute
+    keep_keys = set(keep_keys)
+    table_keys = {}
+
+    for _, tab, attr_dict in entries:
+        set_keys = table_keys.setdefault(tab, set())
+
+        for key in attr_dict.keys():
+            if key not in set_keys and key not in keep_keys and \
+               key in default_attributes and \
+               attr_dict[key] == default_attributes[key]:
+                del attr_dict[key]
+
+        set_keys.update(attr_dict)
+
+    # Merge attributes with equal selections
+    result = []
+
+    for selection, tab, attr_dict in entries:
+        if not attr_dict or not selection:
+            continue
+
+        passed_keys = set()
+
+        for pos in xrange(len(result) - 1, -1, -1):
+            prev_selection, prev_tab, prev_attr_dict = result[pos]
+
+            if prev_tab != tab:
+                continue
+
+            if prev_selection == selection:
+                if passed_keys.isdisjoint(prev_attr_dict):
+                    merged_attr_dict = dict(prev_attr_dict)
+                    merged_attr_dict.update(attr_dict)
+                    attr_dict = merged_attr_dict
+
+                    del result[pos]
+
+                break
+
+            passed_keys.update(prev_attr_dict)
+
+        result.append((selection, tab, attr_dict))
+
+    return result
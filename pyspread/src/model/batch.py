@@ -0,0 +1,261 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright 2011 Martin Manns
+# Distributed under the terms of the GNU General Public License
+
+# --------------------------------------------------------------------
+# pyspread is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# pyspread is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with pyspread.  If not, see <http://www.gnu.org/licenses/>.
+# --------------------------------------------------------------------
+
+"""
+
+Batch
+=====
+
+Batch contains functions that load, recalculate and export pyspread
+files without GUI.
+
+Files are loaded without signature check. Their code is executed, so
+that only trusted files should be processed.
+
+Provides
+--------
+
+ * load_pys: Returns CodeArray from pys file
+ * save_pys: Saves CodeArray to pys file
+ * recalculate_all: Evaluates all cells
+ * get_value_array: Returns CodeArray with cell results as code
+ * get_table_keys: Returns keys of all cells of a table
+ * export_csv: Writes cell results of a table to a CSV file
+
+"""
+
+from ast import literal_eval
+import bz2
+import csv
+
+from literals import is_literal
+from model import CodeArray, DictGrid
+from parallel import get_assignment_keys, recalculate
+from pys import read_pys, write_pys
+
+
+def load_pys(filepath, dict_grid_class=DictGrid):
+    """Returns CodeArray that is loaded from pys file
+
+    Raises ValueError if the file format or version is unsupported.
+
+    Parameters
+    ----------
+    filepath: String
+    \tPath of pys file
+    dict_grid_class: DictGrid subclass, defaults to DictGrid
+    \tClass of the grid store of the CodeArray
+
+    """
+
+    code_array = CodeArray((1, 1, 1), dict_grid_class)
+
+    infile = bz2.BZ2File(filepath, "r")
+
+    try:
+        read_pys(infile, code_array.dict_grid)
+
+    finally:
+        infile.close()
+
+    return code_array
+
+
+def save_pys(code_array, filepath):
+    """Saves CodeArray to pys file
+
+    The file is not signed.
+
+    Parameters
+    ----------
+    code_array: CodeArray
+    \tCodeArray that is saved
+    filepath: String
+    \tPath of pys file
+
+    """
+
+    outfile = bz2.BZ2File(filepath, "wb")
+
+    try:
+        write_pys(outfile, code_array.dict_grid)
+
+    finally:
+        outfile.close()
+
+
+def recalculate_all(code_array, processes=1):
+    """Evaluates all cells and returns list of keys of failed cells
+
+    Cells fail if their result is an exception.
+
+    Parameters
+    ----------
+    code_array: CodeArray
+    \tCodeArray that is recalculated
+    processes: Integer or None, defaults to 1
+    \tNumber of worker processes, None uses the number of CPUs
+
+    """
+
+    if processes != 1:
+        recalculate(code_array, processes)
+
+    # Global assignments first so that other cells see their globals
+    assignment_keys = get_assignment_keys(code_array)
+    keys = assignment_keys + list(set(code_array.dict_grid) -
+                                  set(assignment_keys))
+
+    return [key for key in keys
+            if isinstance(code_array[key], Exception)]
+
+
+def get_literal_code(result):
+    """Returns code that evaluates to result or None if there is none
+
+    Parameters
+    ----------
+    result: Object
+    \tCell result
+
+    """
+
+    if isinstance(result, Exception):
+        return
+
+    try:
+        code = repr(result)
+        literal_eval(code)
+
+    except Exception:
+        return
+
+    return unicode(code)
+
+
+def get_value_array(code_array):
+    """Returns CodeArray, in which cell code is replaced by cell results
+
+    Cells keep their code if their results are exceptions or cannot be
+    represented as Python literals. Global assignment cells keep their
+    code as well. Literal cells are copied. Attributes, row heights,
+    column widths and macros are shared with code_array.
+
+    Parameters
+    ----------
+    code_array: CodeArray
+    \tCodeArray with evaluated cells
+
+    """
+
+    value_array = CodeArray(code_array.shape, type(code_array.dict_grid))
+
+    dict_grid = code_array.dict_grid
+    value_dict_grid = value_array.dict_grid
+
+    value_dict_grid.cell_attributes = dict_grid.cell_attributes
+    value_dict_grid.row_heights = dict_grid.row_heights
+    value_dict_grid.col_widths = dict_grid.col_widths
+    value_dict_grid.macros = dict_grid.macros
+
+    assignment_keys = set(get_assignment_keys(code_array))
+
+    for key, code in dict_grid.iteritems():
+        if key not in assignment_keys and not is_literal(code):
+            literal_code = get_literal_code(code_array[key])
+
+            if literal_code is not None:
+                code = literal_code
+
+        value_dict_grid[key] = code
+
+    return value_array
+
+
+def get_table_keys(code_array, table):
+    """Returns list of rows of keys from (0, 0) to the last non-empty cell
+
+    Parameters
+    ----------
+    code_array: CodeArray
+    \tCodeArray that is searched
+    table: Integer
+    \tTable of the keys
+
+    """
+
+    dict_grid = code_array.dict_grid
+    keys = list(dict_grid.iterkeys_in_range((None, None, table),
+                                            (None, None, table + 1)))
+
+    if not keys:
+        return []
+
+    no_rows = max(key[0] for key in keys) + 1
+    no_cols = max(key[1] for key in keys) + 1
+
+    return [[(row, col, table) for col in xrange(no_cols)]
+            for row in xrange(no_rows)]
+
+
+def export_csv(code_array, filepath, table, dialect="excel"):
+    """Writes cell results of a table to a CSV file
+
+    Empty cells and cells with result None become empty fields. Other
+    results are written as utf-8 encoded unicode strings.
+
+    Parameters
+    ----------
+    code_array: CodeArray
+    \tCodeArray, whose results are exported
+    filepath: String
+    \tPath of CSV file
+    table: Integer
+    \tTable that is exported
+    dialect: String or csv.Dialect, defaults to "excel"
+    \tCSV dialect of the file
+
+    """
+
+    outfile = open(filepath, "wb")
+
+    try:
+        writer = csv.writer(outfile, dialect)
+
+        for row_keys in get_table_keys(code_array, table):
+            line = []
+
+            for key in row_keys:
+                result = code_array[key]
+
+                if result is None:
+                    line.append("")
+
+                elif isinstance(result, str):
+                    line.append(result)
+
+                else:
+                    line.append(unicode(result).encode("utf-8"))
+
+            writer.writerow(line)
+
+    finally:
+        outfile.close()
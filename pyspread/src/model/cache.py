@@ -0,0 +1,267 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright 2011 Martin Manns
+# Distributed under the terms of the GNU General Public License
+
+# --------------------------------------------------------------------
+# pyspread is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# pyspread is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with pyspread.  If not, see <http://www.gnu.org/licenses/>.
+# --------------------------------------------------------------------
+
+"""
+
+Cache
+=====
+
+Cache contains the ResultCache class that stores cell results with
+least recently used eviction.
+
+"""
+
+from heapq import heapify, heappop, heappush
+from itertools import count
+import sys
+
+from dependencies import get_hashable_key
+
+
+def get_size(obj):
+    """Returns estimated memory size of obj in bytes
+
+    The size of numpy arrays includes their data buffer. The size of
+    matplotlib figures is estimated from the size of their RGBA canvas.
+
+    Parameters
+    ----------
+    obj: Object
+    \tCell result
+
+    """
+
+    size = sys.getsizeof(obj, 0)
+
+    try:
+        size = max(size, obj.nbytes)
+
+    except (AttributeError, TypeError):
+        pass
+
+    try:
+        width, height = obj.get_size_inches()
+        size += int(width * height * obj.dpi ** 2 * 4)
+
+    except (AttributeError, TypeError, ValueError):
+        pass
+
+    return size
+
+
+class ResultCache(object):
+    """Bounded cache for cell results with least recently used eviction
+
+    Keys are cell keys. Keys that contain slices are stored with the
+    slices converted into 3-tuples.
+
+    Parameters
+    ----------
+    max_entries: Integer or None, defaults to None
+    \tMaximum number of cached results, None means unlimited
+    max_bytes: Integer or None, defaults to None
+    \tMaximum estimated memory of cached results, None means unlimited.
+    \tResults that are larger than max_bytes are not cached.
+
+    Attributes
+    ----------
+    hits: Integer
+    \tNumber of successful lookups
+    misses: Integer
+    \tNumber of failed lookups
+    evictions: Integer
+    \tNumber of results that have been removed because of the limits
+    nbytes: Integer
+    \tEstimated memory of all cached results
+
+    """
+
+    def __init__(self, max_entries=None, max_bytes=None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+
+        # Maps key to list of result, size and time stamp of last access
+        self._data = {}
+
+        # Heap of time stamp and key. A key's time stamp in the heap may
+        # be older than its last access. This keeps lookups cheap.
+        self._heap = []
+        self._clock = count()
+
+        self.nbytes = 0
+
+        self.reset_stats()
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key):
+        try:
+            return key in self._data
+
+        except TypeError:
+            return get_hashable_key(key) in self._data
+
+    def __getitem__(self, key):
+        """Returns cached result and marks it as most recently used
+
+        Raises KeyError if key is not cached.
+
+        """
+
+        try:
+            entry = self._data[key]
+
+        except TypeError:
+            return self[get_hashable_key(key)]
+
+        except KeyError:
+            self.misses += 1
+            raise
+
+        entry[2] = next(self._clock)
+        self.hits += 1
+
+        return entry[0]
+
+    def __setitem__(self, key, result):
+        """Caches result and evicts least recently used results"""
+
+        try:
+            hash(key)
+
+        except TypeError:
+            key = get_hashable_key(key)
+
+        self.pop(key)
+
+        size = get_size(result)
+
+        if self.max_bytes is not None and size > self.max_bytes:
+            return
+
+        stamp = next(self._clock)
+
+        self._data[key] = [result, size, stamp]
+        heappush(self._heap, (stamp, key))
+        self.nbytes += size
+
+        self._evict()
+
+    def _evict(self):
+        """Removes least recently used results until limits are met"""
+
+        data = self._data
+        heap = self._heap
+
+        while data and \
+              (self.max_entries is not None and
+               len(data) > self.max_entries or
+               self.max_bytes is not None and self.nbytes > self.max_bytes):
+            stamp, key = heappop(heap)
+
+            try:
+                entry = data[key]
+
+            except KeyError:
+                # Key has been popped
+                continue
+
+            if entry[2] != stamp:
+                # Key has been accessed since stamp
+                heappush(heap, (entry[2], key))
+                continue
+
+            del data[key]
+            self.nbytes -= entry[1]
+            self.evictions += 1
+
+        if len(heap) > 2 * len(data) + 64:
+            # Drop heap entries of popped keys
+            self._heap = [(entry[2], key) for key, entry in data.iteritems()]
+            heapify(self._heap)
+
+    def pop(self, key, default=None):
+        """Removes key from cache and returns its result or default"""
+
+        try:
+            result, size, __ = self._data.pop(key)
+
+        except TypeError:
+            return self.pop(get_hashable_key(key), default)
+
+        except KeyError:
+            return default
+
+        self.nbytes -= size
+
+        return result
+
+    def pop_table(self, tab):
+        """Removes results of the single cells of table tab
+
+        Returns number of removed results.
+
+        """
+
+        keys = [key for key in self._data
+                if len(key) == 3 and key[2] == tab and
+                all(type(ele) in (int, long) for ele in key)]
+
+        for key in keys:
+            self.pop(key)
+
+        return len(keys)
+
+    def clear(self):
+        """Removes all results"""
+
+        self._data.clear()
+        self._heap = []
+        self.nbytes = 0
+
+    def set_limits(self, max_entries=None, max_bytes=None):
+        """Sets new limits and evicts results that exceed them"""
+
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+
+        self._evict()
+
+    def reset_stats(self):
+        """Resets hit, miss and eviction counters"""
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get_stats(self):
+        """Returns dict of cache statistics"""
+
+        return {
+            "entries": len(self._data),
+            "bytes": self.nbytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+# End of class ResultCache
@@ -0,0 +1,405 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright 2011 Martin Manns
+# Distributed under the terms of the GNU General Public License
+
+# --------------------------------------------------------------------
+# pyspread is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# pyspread is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with pyspread.  If not, see <http://www.gnu.org/licenses/>.
+# --------------------------------------------------------------------
+
+"""
+
+Dependencies
+============
+
+Dependencies contains the DependencyTracker class that records, which
+cell results have been computed from which other cells, and the static
+analysis of cell references.
+
+"""
+
+import ast
+from types import SliceType, TupleType
+
+# Names in cell code that are bound to the key of the evaluated cell
+KEY_NAMES = frozenset(["X", "Y", "Z", "R", "C", "T"])
+
+
+class CycleError(Exception):
+    """Raised when a cell is read during its own evaluation
+
+    Parameters
+    ----------
+    cycle: List of Tuple of Integer
+    \tKeys of the cells in the cycle, first and last key are identical
+
+    """
+
+    def __init__(self, cycle):
+        self.cycle = cycle
+
+        msg = "Cycle detected: " + " -> ".join(map(repr, cycle))
+        Exception.__init__(self, msg)
+
+# End of class CycleError
+
+
+def get_hashable_key(key):
+    """Returns hashable version of key, in which slices are 3-tuples
+
+    Parameters
+    ----------
+    key: Tuple of Integer or slice
+    \tCell key or slice key
+
+    """
+
+    return tuple((ele.start, ele.stop, ele.step)
+                 if type(ele) is SliceType else ele for ele in key)
+
+
+def get_key(hashable_key):
+    """Returns original key from hashable key, i. e. the inverse of
+    get_hashable_key
+
+    Parameters
+    ----------
+    hashable_key: Tuple of Integer or 3-tuple
+    \tHashable cell key or slice key
+
+    """
+
+    return tuple(slice(*ele) if type(ele) is TupleType else ele
+                 for ele in hashable_key)
+
+
+def _is_key_expression(node):
+    """Returns True if ast node is an integer expression of key names"""
+
+    if isinstance(node, ast.Num):
+        return isinstance(node.n, (int, long))
+
+    elif isinstance(node, ast.Name):
+        return node.id in KEY_NAMES
+
+    elif isinstance(node, ast.BinOp):
+        return isinstance(node.op, (ast.Add, ast.Sub, ast.Mult)) and \
+            _is_key_expression(node.left) and _is_key_expression(node.right)
+
+    elif isinstance(node, ast.UnaryOp):
+        return isinstance(node.op, (ast.UAdd, ast.USub)) and \
+            _is_key_expression(node.operand)
+
+    return False
+
+
+def get_reference_code(expression):
+    """Returns code object for the keys of the cells that expression reads
+
+    Only single cell reads S[a, b, c] are found, in which a, b and c are
+    integer expressions of X, Y, Z, R, C, T and integer literals. The
+    code object evaluates to a list of keys if these names are bound to
+    the key of the cell. None is returned if there are no such reads.
+
+    Parameters
+    ----------
+    expression: String
+    \tCell code without global assignment
+
+    """
+
+    try:
+        tree = ast.parse(expression.strip(), mode="eval")
+
+    except Exception:
+        return
+
+    key_nodes = []
+
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Subscript) and \
+           isinstance(node.value, ast.Name) and node.value.id == "S" and \
+           isinstance(node.slice, ast.Index) and \
+           isinstance(node.slice.value, ast.Tuple) and \
+           len(node.slice.value.elts) == 3 and \
+           all(_is_key_expression(ele) for ele in node.slice.value.elts):
+            key_nodes.append(node.slice.value)
+
+    if not key_nodes:
+        return
+
+    keys_expression = ast.Expression(body=ast.List(elts=key_nodes,
+                                                   ctx=ast.Load()))
+    ast.fix_missing_locations(keys_expression)
+
+    return compile(keys_expression, "<references>", "eval")
+
+
+def slice_key_contains(slice_key, key, shape):
+    """Returns True iif the single cell key lies inside slice_key
+
+    Parameters
+    ----------
+    slice_key: Tuple of Integer or slice
+    \tKey that contains at least one slice
+    key: Tuple of Integer
+    \tSingle cell key
+    shape: Tuple of Integer
+    \tGrid shape that is used for resolving slice bounds
+
+    """
+
+    for slice_ele, key_ele, length in zip(slice_key, key, shape):
+        if type(slice_ele) is SliceType:
+            start, stop, step = slice_ele.indices(length)
+
+            if step > 0:
+                if not start <= key_ele < stop:
+                    return False
+            elif not stop < key_ele <= start:
+                return False
+
+            if (key_ele - start) % step:
+                return False
+
+        elif slice_ele != key_ele:
+            return False
+
+    return True
+
+
+class DependencyTracker(object):
+    """Records which cells each cell evaluation reads
+
+    Cell evaluations are nested because cells read other cells via S.
+    The cell that is currently evaluated is on top of a stack. Each read
+    of another cell or of a slice is recorded as a dependency of the cell
+    on top of the stack.
+
+    Reads of slices are not recorded cell by cell. Instead, the slice is
+    kept as a range node that is found by containment when a cell inside
+    the slice changes.
+
+    Attributes
+    ----------
+    dependents: Dict
+    \tMaps hashable key to set of keys of cells that have read it
+    precedents: Dict
+    \tMaps key of evaluated cell to set of hashable keys that it has read
+    slice_keys: Dict
+    \tMaps hashable slice key to original slice key for all read slices
+
+    """
+
+    def __init__(self):
+        self.dependents = {}
+        self.precedents = {}
+        self.slice_keys = {}
+
+        # Keys of the cells that are currently evaluated
+        # None suppresses recording, e. g. while a slice is assembled
+        self.stack = []
+        self.evaluating = set()
+
+    def push(self, key):
+        """Marks key as the cell that is currently evaluated"""
+
+        self.stack.append(key)
+
+        if key is not None:
+            self.evaluating.add(key)
+
+    def pop(self):
+        """Marks the evaluation of the top cell as finished"""
+
+        key = self.stack.pop()
+
+        if key is not None:
+            self.evaluating.discard(key)
+
+        return key
+
+    def is_evaluating(self, key):
+        """Returns True if key is on the evaluation stack"""
+
+        return key in self.evaluating
+
+    def get_cycle(self, key):
+        """Returns list of keys from the evaluation of key to key
+
+        Parameters
+        ----------
+        key: Tuple of Integer
+        \tKey of a cell that is currently evaluated
+
+        """
+
+        keys = [ele for ele in self.stack if ele is not None]
+
+        return keys[keys.index(key):] + [key]
+
+    def add_read(self, key):
+        """Records that the cell on top of the stack has read key
+
+        Parameters
+        ----------
+        key: Tuple of Integer or slice
+        \tKey of the cell or of the slice that is read
+
+        """
+
+        if not self.stack:
+            return
+
+        reader = self.stack[-1]
+
+        if reader is None or reader == key:
+            return
+
+        hashable_key = get_hashable_key(key)
+
+        if hashable_key != key:
+            # Slice read
+            self.slice_keys[hashable_key] = key
+
+        try:
+            self.dependents[hashable_key].add(reader)
+        except KeyError:
+            self.dependents[hashable_key] = set([reader])
+
+        try:
+            self.precedents[reader].add(hashable_key)
+        except KeyError:
+            self.precedents[reader] = set([hashable_key])
+
+    def invalidate(self, key, shape):
+        """Removes key and all its direct and indirect dependents
+
+        Returns list of original keys of all cells and slices, whose
+        results are no longer valid.
+
+        Parameters
+        ----------
+        key: Tuple of Integer
+        \tKey of the cell that has changed
+        shape: Tuple of Integer
+        \tGrid shape that is used for resolving slice bounds
+
+        """
+
+        return self.invalidate_many([key], shape)
+
+    def invalidate_many(self, keys, shape):
+        """Removes keys and all their direct and indirect dependents
+
+        Returns list of original keys of all cells and slices, whose
+        results are no longer valid. Each dependent is visited once.
+
+        Parameters
+        ----------
+        keys: Iterable of Tuple of Integer
+        \tKeys of the cells that have changed
+        shape: Tuple of Integer
+        \tGrid shape that is used for resolving slice bounds
+
+        """
+
+        dirty = set()
+        invalid_keys = []
+
+        todo = list(keys)
+
+        while todo:
+            hashable_key = todo.pop()
+
+            if hashable_key in dirty:
+                continue
+
+            dirty.add(hashable_key)
+
+            try:
+                slice_key = self.slice_keys.pop(hashable_key)
+
+            except KeyError:
+                # Single cell
+                invalid_keys.append(hashable_key)
+
+                for h_slice_key, slice_key in self.slice_keys.iteritems():
+                    if slice_key_contains(slice_key, hashable_key, shape):
+                        todo.append(h_slice_key)
+
+            else:
+                invalid_keys.append(slice_key)
+
+            todo.extend(self.dependents.pop(hashable_key, ()))
+
+            # The evaluation of an invalid cell records its reads again
+            for precedent in self.precedents.pop(hashable_key, ()):
+                try:
+                    self.dependents[precedent].discard(hashable_key)
+                except KeyError:
+                    pass
+
+        return invalid_keys
+
+    def get_groups(self, keys):
+        """Returns list of lists of keys that are connected by dependencies
+
+        Keys in different groups have not read each other or a common
+        cell or slice in their last evaluation.
+
+        Parameters
+        ----------
+        keys: Iterable of Tuple of Integer
+        \tKeys of the cells that are grouped
+
+        """
+
+        # Union find on keys and on the cells and slices that they read
+        parents = {}
+
+        def find(node):
+            root = node
+            while parents[root] != root:
+                root = parents[root]
+
+            # Path compression
+            while parents[node] != root:
+                parents[node], node = root, parents[node]
+
+            return root
+
+        for key in keys:
+            parents.setdefault(key, key)
+
+            for precedent in self.precedents.get(key, ()):
+                parents.setdefault(precedent, precedent)
+                parents[find(precedent)] = find(key)
+
+        groups = {}
+
+        for key in keys:
+            groups.setdefault(find(key), []).append(key)
+
+        return groups.values()
+
+    def clear(self):
+        """Removes all recorded dependencies"""
+
+        self.dependents.clear()
+        self.precedents.clear()
+        self.slice_keys.clear()
+
+# End of class DependencyTracker
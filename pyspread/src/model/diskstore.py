@@ -0,0 +1,407 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright 2011 Martin Manns
+# Distributed under the terms of the GNU General Public License
+
+# --------------------------------------------------------------------
+# pyspread is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# pyspread is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with pyspread.  If not, see <http://www.gnu.org/licenses/>.
+# --------------------------------------------------------------------
+
+"""
+
+DiskStore
+=========
+
+DiskStore contains layer 0 and layer 1 classes that keep cells in a
+temporary sqlite database on disk instead of memory so that grids can
+be larger than the available memory.
+
+A CodeArray uses them if it is created with dict_grid_class=DiskDictGrid.
+
+Provides
+--------
+
+* DiskKeyValueStore: KeyValueStore in a temporary sqlite database
+* DiskDictGrid: DictGrid that is based on DiskKeyValueStore
+
+"""
+
+from collections import OrderedDict
+import cPickle as pickle
+import sqlite3
+import sys
+
+from indexmap import pack_key, unpack_key
+from model import KeyValueStore, DictGrid
+
+
+class DiskKeyValueStore(KeyValueStore):
+    """Key-Value store in a temporary sqlite database
+
+    Cells are read in pages that hold page_rows rows of one column. The
+    max_pages most recently used pages are kept in memory. Changes are
+    written to the database and to the page if it is in memory.
+
+    The database is removed when the store is garbage collected.
+
+    Snapshots read the database of the store. Therefore, they may only
+    be read in the thread of the store.
+
+    """
+
+    # Number of rows of a page
+    page_rows = 256
+
+    # Maximum number of pages in memory
+    max_pages = 4096
+
+    _store_attributes = KeyValueStore._store_attributes + \
+        ["_connection", "_pages", "_length"]
+
+    def _init_store(self):
+        """Sets up empty store in a new temporary database"""
+
+        KeyValueStore._init_store(self)
+
+        # An empty file name creates a temporary database on disk
+        self._connection = sqlite3.connect("", isolation_level=None)
+
+        execute = self._connection.execute
+
+        execute("PRAGMA journal_mode = OFF")
+        execute("PRAGMA synchronous = OFF")
+        execute("CREATE TABLE cells (tab INTEGER, col INTEGER, "
+                "row INTEGER, value BLOB, PRIMARY KEY (tab, col, row)) "
+                "WITHOUT ROWID")
+
+        # Maps physical (tab, col, page number) to dict that maps physical
+        # row to value, least recently used page first
+        self._pages = OrderedDict()
+
+        # Number of items
+        self._length = 0
+
+    def _find_physical_key(self, key):
+        """Returns physical key or None if key cannot be stored"""
+
+        try:
+            physical_key = self._get_physical_key(key)
+            pack_key(physical_key)
+
+        except (TypeError, ValueError):
+            return
+
+        return physical_key
+
+    def _get_page(self, row, col, tab):
+        """Returns page dict of physical key and loads it if required"""
+
+        page_key = tab, col, row // self.page_rows
+        pages = self._pages
+
+        try:
+            page = pages.pop(page_key)
+
+        except KeyError:
+            first_row = page_key[2] * self.page_rows
+
+            cursor = self._connection.execute(
+                "SELECT row, value FROM cells WHERE tab = ? AND col = ? "
+                "AND row >= ? AND row < ?",
+                (tab, col, first_row, first_row + self.page_rows))
+
+            page = dict((page_row, pickle.loads(str(value)))
+                        for page_row, value in cursor)
+
+            if len(pages) >= self.max_pages:
+                pages.popitem(last=False)
+
+        pages[page_key] = page
+
+        return page
+
+    def _remove(self, physical_key):
+        """Removes item of physical key and returns its value"""
+
+        row, col, tab = physical_key
+        page = self._get_page(row, col, tab)
+
+        if row in page and self._snapshots:
+            self._save_for_snapshots(pack_key(physical_key))
+
+        value = page.pop(row)
+
+        self._length -= 1
+        self._connection.execute(
+            "DELETE FROM cells WHERE tab = ? AND col = ? AND row = ?",
+            (tab, col, row))
+
+        return value
+
+    def _iter_columns(self):
+        """Yields physical (tab, col) of columns that contain keys"""
+
+        return iter(self._connection.execute(
+            "SELECT DISTINCT tab, col FROM cells").fetchall())
+
+    def _get_logical_rows(self, tab, col, start=None, stop=None):
+        """Returns sorted list of logical rows of a physical column
+
+        Parameters
+        ----------
+        tab: Integer
+        \tPhysical table
+        col: Integer
+        \tPhysical column
+        start: Integer or None, defaults to None
+        \tFirst logical row, None means no limit
+        stop: Integer or None, defaults to None
+        \tLogical row after the last, None means no limit
+
+        """
+
+        execute = self._connection.execute
+        logical_rows = []
+
+        for first, last, offset in \
+                self.index_maps[0].get_physical_ranges(start, stop):
+            if last is None:
+                cursor = execute("SELECT row FROM cells WHERE tab = ? AND "
+                                 "col = ? AND row >= ? ORDER BY row",
+                                 (tab, col, first))
+            else:
+                cursor = execute("SELECT row FROM cells WHERE tab = ? AND "
+                                 "col = ? AND row >= ? AND row < ? "
+                                 "ORDER BY row", (tab, col, first, last))
+
+            logical_rows += [row - offset for row, in cursor]
+
+        return logical_rows
+
+    # Snapshots
+
+    def _get_packed(self, packed_key, default=None):
+        """Returns value of packed physical key or default if missing"""
+
+        row, col, tab = unpack_key(packed_key)
+
+        return self._get_page(row, col, tab).get(row, default)
+
+    def _get_packed_keys(self):
+        """Returns list of packed physical keys"""
+
+        cursor = self._connection.execute("SELECT row, col, tab FROM cells")
+
+        return map(pack_key, cursor)
+
+    # Dict interface with logical keys
+
+    def __getitem__(self, key):
+        physical_key = self._find_physical_key(key)
+
+        if physical_key is not None:
+            row, col, tab = physical_key
+
+            try:
+                return self._get_page(row, col, tab)[row]
+
+            except KeyError:
+                pass
+
+        return self.__missing__(key)
+
+    def __setitem__(self, key, value):
+        physical_key = self._get_physical_key(key)
+        packed_key = pack_key(physical_key)  # Raises error for invalid keys
+
+        if self._snapshots:
+            self._save_for_snapshots(packed_key)
+
+        row, col, tab = physical_key
+        page = self._get_page(row, col, tab)
+
+        if row not in page:
+            self._length += 1
+
+        page[row] = value
+
+        self._connection.execute(
+            "INSERT OR REPLACE INTO cells VALUES (?, ?, ?, ?)",
+            (tab, col, row, buffer(pickle.dumps(value, 2))))
+
+    def __delitem__(self, key):
+        physical_key = self._find_physical_key(key)
+
+        try:
+            if physical_key is None:
+                raise KeyError(key)
+
+            self._remove(physical_key)
+
+        except KeyError:
+            raise KeyError(key)
+
+    def __contains__(self, key):
+        physical_key = self._find_physical_key(key)
+
+        if physical_key is None:
+            return False
+
+        row, col, tab = physical_key
+
+        return row in self._get_page(row, col, tab)
+
+    has_key = __contains__
+
+    def __len__(self):
+        return self._length
+
+    def __iter__(self):
+        get_logical_key = self._get_logical_key
+
+        cursor = self._connection.execute("SELECT row, col, tab FROM cells")
+
+        return (get_logical_key(key) for key in cursor)
+
+    iterkeys = __iter__
+
+    def iteritems(self):
+        """Yields items with logical keys"""
+
+        get_logical_key = self._get_logical_key
+
+        cursor = self._connection.execute(
+            "SELECT row, col, tab, value FROM cells")
+
+        return ((get_logical_key((row, col, tab)), pickle.loads(str(value)))
+                for row, col, tab, value in cursor)
+
+    def itervalues(self):
+        """Yields values"""
+
+        cursor = self._connection.execute("SELECT value FROM cells")
+
+        return (pickle.loads(str(value)) for value, in cursor)
+
+    def values(self):
+        """Returns list of values"""
+
+        return list(self.itervalues())
+
+    def get(self, key, default=None):
+        """Returns value of key or default if missing"""
+
+        physical_key = self._find_physical_key(key)
+
+        if physical_key is None:
+            return default
+
+        row, col, tab = physical_key
+
+        return self._get_page(row, col, tab).get(row, default)
+
+    def pop(self, key, *default):
+        """Removes key and returns its value, see dict.pop"""
+
+        physical_key = self._find_physical_key(key)
+
+        try:
+            if physical_key is None:
+                raise KeyError(key)
+
+            return self._remove(physical_key)
+
+        except KeyError:
+            if default:
+                return default[0]
+
+            raise KeyError(key)
+
+    def popitem(self):
+        """Removes and returns an arbitrary item, see dict.popitem"""
+
+        physical_key = self._connection.execute(
+            "SELECT row, col, tab FROM cells LIMIT 1").fetchone()
+
+        if physical_key is None:
+            raise KeyError("popitem(): dictionary is empty")
+
+        return self._get_logical_key(physical_key), \
+            self._remove(physical_key)
+
+    def clear(self):
+        """Removes all items and resets the index maps"""
+
+        KeyValueStore.clear(self)
+
+        self._connection.execute("DELETE FROM cells")
+        self._pages.clear()
+        self._length = 0
+
+    def get_memory_report(self):
+        """Returns dict with estimated memory and disk usage in bytes
+
+        The dict has the keys:
+        cells: Number of cells
+        total: Bytes of the database and of the pages in memory
+        per_cell: Average bytes per cell
+        tables: Dict that maps each table to the bytes of its values on disk
+        memory: Bytes of the pages in memory
+
+        """
+
+        getsizeof = sys.getsizeof
+        execute = self._connection.execute
+        tab_map = self.index_maps[2]
+
+        memory = getsizeof(self._pages)
+
+        for page in self._pages.itervalues():
+            memory += getsizeof(page)
+            memory += sum(getsizeof(value) for value in page.itervalues())
+
+        page_count, = execute("PRAGMA page_count").fetchone()
+        page_size, = execute("PRAGMA page_size").fetchone()
+
+        total = page_count * page_size + memory
+
+        tables = dict((tab_map.to_logical(tab), size) for tab, size in
+                      execute("SELECT tab, SUM(LENGTH(value)) FROM cells "
+                              "GROUP BY tab"))
+
+        return {
+            "cells": len(self),
+            "total": total,
+            "per_cell": float(total) / len(self) if self else 0.0,
+            "tables": tables,
+            "memory": memory,
+        }
+
+# End of class DiskKeyValueStore
+
+
+class DiskDictGrid(DictGrid, DiskKeyValueStore):
+    """DictGrid that keeps cells in a temporary sqlite database
+
+    Parameters
+    ----------
+    shape: n-tuple of integer
+    \tShape of the grid
+
+    """
+
+    pass
+
+# End of class DiskDictGrid
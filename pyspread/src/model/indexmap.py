@@ -0,0 +1,533 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright 2011 Martin Manns
+# Distributed under the terms of the GNU General Public License
+
+# --------------------------------------------------------------------
+# pyspread is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# pyspread is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with pyspread.  If not, see <http://www.gnu.org/licenses/>.
+# --------------------------------------------------------------------
+
+"""
+
+IndexMap
+========
+
+IndexMap contains the IndexMap class that maps the logical indices of
+a grid axis to the physical indices, under which cells are stored.
+
+Inserting or deleting rows changes the map instead of moving the
+stored cells.
+
+pack_key and unpack_key convert physical keys (row, col, tab) to and
+from single integers, under which cells are stored.
+
+CellSizes stores row heights or column widths behind index maps.
+
+"""
+
+from bisect import bisect_right
+
+# Physical indices of inserted indices are allocated downwards from here.
+# Negative logical indices are mapped to themselves and never reach it.
+FIRST_FREE_INDEX = -2 ** 31
+
+# Bits per axis in packed keys. Physical indices must be within
+# [-KEY_BIAS, KEY_BIAS).
+KEY_BITS = 34
+KEY_BIAS = 1 << (KEY_BITS - 1)
+KEY_MASK = (1 << KEY_BITS) - 1
+
+
+def pack_key(key):
+    """Returns integer that represents physical key
+
+    Packed keys sort by table, column and row. An integer takes less
+    than half the memory of a 3-tuple of integers.
+
+    Raises ValueError if an index is out of range and TypeError if an
+    index is no integer.
+
+    Parameters
+    ----------
+    key: 3-tuple of Integer
+    \tPhysical key (row, col, tab)
+
+    """
+
+    row, col, tab = key
+
+    row += KEY_BIAS
+    col += KEY_BIAS
+    tab += KEY_BIAS
+
+    if not (0 <= row <= KEY_MASK and 0 <= col <= KEY_MASK and
+            0 <= tab <= KEY_MASK):
+        raise ValueError("Key {} out of range".format(key))
+
+    return (tab << KEY_BITS | col) << KEY_BITS | row
+
+
+def unpack_key(packed_key):
+    """Returns physical key (row, col, tab) of integer from pack_key"""
+
+    return int((packed_key & KEY_MASK) - KEY_BIAS), \
+        int((packed_key >> KEY_BITS & KEY_MASK) - KEY_BIAS), \
+        int((packed_key >> 2 * KEY_BITS) - KEY_BIAS)
+
+
+class IndexMap(object):
+    """Maps logical indices of an axis to physical indices
+
+    The map consists of runs, in which consecutive logical indices map to
+    consecutive physical indices. The last run is unbounded. Lookups
+    bisect the runs. Insertions and deletions split and shift runs so
+    that their cost depends on the number of runs and not on the number
+    of stored cells. Adjacent runs are merged, so that undoing an
+    insertion restores the original runs.
+
+    Negative logical indices are not mapped.
+
+    """
+
+    def __init__(self):
+        # Logical start, physical start and length of each run sorted by
+        # logical start. The length of the last run is None.
+        self._logical_starts = [0]
+        self._physical_starts = [0]
+        self._lengths = [None]
+
+        # Next free physical index for inserted indices
+        self._next_free = FIRST_FREE_INDEX
+
+        # Run indices and physical starts sorted by physical start for
+        # reverse lookups, built on demand
+        self._physical_order = None
+        self._sorted_physical_starts = None
+
+    def __len__(self):
+        """Returns number of runs"""
+
+        return len(self._lengths)
+
+    def __eq__(self, other):
+        return self.get_runs() == other.get_runs()
+
+    def __ne__(self, other):
+        return not self == other
+
+    @property
+    def is_identity(self):
+        """True if each logical index is its own physical index"""
+
+        return self._physical_starts == [0]
+
+    def get_runs(self):
+        """Returns list of 3-tuples of logical start, physical start, length"""
+
+        return zip(self._logical_starts, self._physical_starts, self._lengths)
+
+    def to_physical(self, index):
+        """Returns physical index of logical index"""
+
+        if index < 0:
+            return index
+
+        run = bisect_right(self._logical_starts, index) - 1
+
+        return self._physical_starts[run] + index - self._logical_starts[run]
+
+    def to_logical(self, index):
+        """Returns logical index of physical index
+
+        Raises KeyError if the physical index has been deleted.
+
+        """
+
+        if FIRST_FREE_INDEX < index < 0:
+            return index
+
+        if self._physical_order is None:
+            physical_starts = self._physical_starts
+            self._physical_order = sorted(xrange(len(self._lengths)),
+                                          key=physical_starts.__getitem__)
+            self._sorted_physical_starts = [self._physical_starts[run]
+                                            for run in self._physical_order]
+
+        pos = bisect_right(self._sorted_physical_starts, index) - 1
+
+        if pos >= 0:
+            run = self._physical_order[pos]
+            offset = index - self._physical_starts[run]
+            length = self._lengths[run]
+
+            if length is None or offset < length:
+                return self._logical_starts[run] + offset
+
+        raise KeyError("Physical index {} has been deleted".format(index))
+
+    def get_physical_ranges(self, start=None, stop=None):
+        """Returns list of physical ranges of the logical range start, stop
+
+        The ranges are 3-tuples of physical start, physical stop and
+        offset in logical order. A physical stop of None means no limit.
+        The logical index of a physical index in a range is the physical
+        index minus offset.
+
+        Parameters
+        ----------
+        start: Integer or None, defaults to None
+        \tFirst logical index, None means no limit
+        stop: Integer or None, defaults to None
+        \tLogical index after the last, None means no limit
+
+        """
+
+        ranges = []
+
+        if start is None or start < 0:
+            # Negative indices are not mapped
+            first = FIRST_FREE_INDEX + 1 if start is None else start
+            last = 0 if stop is None or stop > 0 else stop
+
+            if first < last:
+                ranges.append((first, last, 0))
+
+            if stop is not None and stop <= 0:
+                return ranges
+
+            start = 0
+
+        for logical_start, physical_start, length in self.get_runs():
+            logical_stop = None if length is None else logical_start + length
+
+            if logical_stop is not None and logical_stop <= start:
+                continue
+
+            if stop is not None and logical_start >= stop:
+                break
+
+            first = max(logical_start, start)
+
+            if logical_stop is None:
+                last = stop
+
+            elif stop is None:
+                last = logical_stop
+
+            else:
+                last = min(logical_stop, stop)
+
+            offset = physical_start - logical_start
+            ranges.append((first + offset,
+                           None if last is None else last + offset, offset))
+
+        return ranges
+
+    def _split(self, index):
+        """Splits run at logical index and returns number of the new run"""
+
+        run = bisect_right(self._logical_starts, index) - 1
+        logical_start = self._logical_starts[run]
+
+        if logical_start == index:
+            return run
+
+        offset = index - logical_start
+        length = self._lengths[run]
+
+        self._lengths[run] = offset
+
+        self._logical_starts.insert(run + 1, index)
+        self._physical_starts.insert(run + 1,
+                                     self._physical_starts[run] + offset)
+        self._lengths.insert(run + 1,
+                             None if length is None else length - offset)
+
+        return run + 1
+
+    def _shift(self, first_run, amount):
+        """Shifts logical starts of runs from first_run on by amount"""
+
+        logical_starts = self._logical_starts
+
+        for run in xrange(first_run, len(logical_starts)):
+            logical_starts[run] += amount
+
+    def _merge(self):
+        """Merges adjacent runs that are physically consecutive"""
+
+        run = 1
+
+        while run < len(self._lengths):
+            previous_length = self._lengths[run - 1]
+
+            if self._physical_starts[run - 1] + previous_length == \
+               self._physical_starts[run]:
+                length = self._lengths[run]
+
+                self._lengths[run - 1] = \
+                    None if length is None else previous_length + length
+
+                del self._logical_starts[run]
+                del self._physical_starts[run]
+                del self._lengths[run]
+
+            else:
+                run += 1
+
+        self._physical_order = None
+
+    def insert(self, index, number):
+        """Inserts number new logical indices before logical index
+
+        Negative indices are treated as 0.
+
+        """
+
+        if number <= 0:
+            return
+
+        index = max(index, 0)
+        run = self._split(index)
+
+        self._shift(run, number)
+
+        self._next_free -= number
+
+        self._logical_starts.insert(run, index)
+        self._physical_starts.insert(run, self._next_free)
+        self._lengths.insert(run, number)
+
+        self._merge()
+
+    def delete(self, index, number):
+        """Deletes number logical indices starting with logical index
+
+        Negative indices are treated as 0.
+
+        """
+
+        if number <= 0:
+            return
+
+        index = max(index, 0)
+
+        first_run = self._split(index)
+        last_run = self._split(index + number)
+
+        del self._logical_starts[first_run:last_run]
+        del self._physical_starts[first_run:last_run]
+        del self._lengths[first_run:last_run]
+
+        self._shift(first_run, -number)
+
+        self._merge()
+
+# End of class IndexMap
+
+
+class CellSizes(dict):
+    """Dict of row heights or column widths with keys (index, tab)
+
+    Sizes are stored under physical keys. One IndexMap for the rows or
+    columns and one for the tables translate the logical keys. Inserting
+    or deleting rows, columns or tables only changes an index map so that
+    no size is moved.
+
+    Parameters
+    ----------
+    items: Dict or iterable of 2-tuples, defaults to None
+    \tLogical keys and sizes
+
+    """
+
+    def __init__(self, items=None):
+        dict.__init__(self)
+
+        # Index maps of rows or columns and of tables
+        self.index_maps = [IndexMap(), IndexMap()]
+
+        if items is not None:
+            self.update(items)
+
+    def __reduce__(self):
+        """Returns logical items, the index maps are not pickled"""
+
+        return self.__class__, (self.items(),)
+
+    def __eq__(self, other):
+        if isinstance(other, CellSizes):
+            other = dict(other.iteritems())
+
+        return dict(self.iteritems()) == other
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __repr__(self):
+        return repr(dict(self.iteritems()))
+
+    def _get_physical_key(self, key):
+        """Returns physical key of logical key"""
+
+        index_map, tab_map = self.index_maps
+        index, tab = key
+
+        return index_map.to_physical(index), tab_map.to_physical(tab)
+
+    def _get_logical_key(self, key):
+        """Returns logical key of physical key"""
+
+        index_map, tab_map = self.index_maps
+        index, tab = key
+
+        return index_map.to_logical(index), tab_map.to_logical(tab)
+
+    def __getitem__(self, key):
+        try:
+            return dict.__getitem__(self, self._get_physical_key(key))
+
+        except KeyError:
+            raise KeyError(key)
+
+    def __setitem__(self, key, value):
+        dict.__setitem__(self, self._get_physical_key(key), value)
+
+    def __delitem__(self, key):
+        try:
+            dict.__delitem__(self, self._get_physical_key(key))
+
+        except KeyError:
+            raise KeyError(key)
+
+    def __contains__(self, key):
+        return dict.__contains__(self, self._get_physical_key(key))
+
+    has_key = __contains__
+
+    def __iter__(self):
+        return (self._get_logical_key(key) for key in dict.__iter__(self))
+
+    iterkeys = __iter__
+
+    def keys(self):
+        """Returns list of keys"""
+
+        return list(self)
+
+    def iteritems(self):
+        """Yields items with logical keys"""
+
+        return ((self._get_logical_key(key), value)
+                for key, value in dict.iteritems(self))
+
+    def items(self):
+        """Returns list of items"""
+
+        return list(self.iteritems())
+
+    def copy(self):
+        """Returns CellSizes with the items of self"""
+
+        return self.__class__(self.iteritems())
+
+    def get(self, key, default=None):
+        """Returns size of key or default if missing"""
+
+        return dict.get(self, self._get_physical_key(key), default)
+
+    def pop(self, key, *default):
+        """Removes key and returns its size, see dict.pop"""
+
+        physical_key = self._get_physical_key(key)
+
+        if not default and not dict.__contains__(self, physical_key):
+            raise KeyError(key)
+
+        return dict.pop(self, physical_key, *default)
+
+    def popitem(self):
+        """Removes and returns an arbitrary item, see dict.popitem"""
+
+        key, value = dict.popitem(self)
+
+        return self._get_logical_key(key), value
+
+    def setdefault(self, key, default=None):
+        """Returns size of key and sets it to default if missing"""
+
+        return dict.setdefault(self, self._get_physical_key(key), default)
+
+    def update(self, items):
+        """Updates sizes from dict like object or iterable of items"""
+
+        if hasattr(items, "iteritems"):
+            items = items.iteritems()
+
+        for key, value in items:
+            self[key] = value
+
+    def clear(self):
+        """Removes all sizes and resets the index maps"""
+
+        dict.clear(self)
+
+        self.index_maps = [IndexMap(), IndexMap()]
+
+    def insert(self, insertion_point, no_to_insert, axis):
+        """Inserts rows, columns or tables before insertion_point
+
+        Parameters
+        ----------
+        insertion_point: Integer
+        \tLogical index or table, before which is inserted
+        no_to_insert: Integer
+        \tNumber of indices or tables that are inserted
+        axis: Integer in [0, 1]
+        \t0 for rows or columns, 1 for tables
+
+        """
+
+        self.index_maps[axis].insert(insertion_point, no_to_insert)
+
+    def delete(self, deletion_point, no_to_delete, axis):
+        """Deletes rows, columns or tables and returns the deleted sizes
+
+        The deleted sizes are returned as dict with logical keys.
+
+        Parameters
+        ----------
+        deletion_point: Integer
+        \tFirst logical index or table that is deleted
+        no_to_delete: Integer
+        \tNumber of indices or tables that are deleted
+        axis: Integer in [0, 1]
+        \t0 for rows or columns, 1 for tables
+
+        """
+
+        stop = deletion_point + no_to_delete
+
+        deleted_items = dict((key, value) for key, value in self.iteritems()
+                             if deletion_point <= key[axis] < stop)
+
+        for key in deleted_items:
+            del self[key]
+
+        self.index_maps[axis].delete(deletion_point, no_to_delete)
+
+        return deleted_items
+
+# End of class CellSizes
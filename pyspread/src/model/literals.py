@@ -0,0 +1,193 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright 2011 Martin Manns
+# Distributed under the terms of the GNU General Public License
+
+# --------------------------------------------------------------------
+# pyspread is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# pyspread is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with pyspread.  If not, see <http://www.gnu.org/licenses/>.
+# --------------------------------------------------------------------
+
+"""
+
+Literals
+========
+
+Literals contains the value types of literal cells. Literal cells store
+a number, a text or a date instead of code. Their value is returned
+without evaluation.
+
+Code is always a str or unicode object. Therefore, literal texts are
+stored as TextLiteral, which is a unicode subclass.
+
+Provides
+--------
+
+ * TextLiteral: Unicode text that is a cell value and not cell code
+ * is_literal: Returns True if a cell value is a literal
+ * to_literal: Returns literal for a value or None
+ * literal_to_code: Returns code that evaluates to a literal
+ * literal_to_strings: Returns type name and string for saving
+ * strings_to_literal: Returns literal from type name and string
+
+"""
+
+import datetime
+
+
+class TextLiteral(unicode):
+    """Unicode text that is a cell value and not cell code"""
+
+    __slots__ = ()
+
+# End of class TextLiteral
+
+
+# Maps literal types to their type names in save files
+LITERAL_TYPE_NAMES = {
+    bool: "bool",
+    int: "int",
+    long: "int",
+    float: "float",
+    complex: "complex",
+    TextLiteral: "text",
+    datetime.date: "date",
+    datetime.datetime: "datetime",
+    datetime.time: "time",
+}
+
+
+def is_literal(value):
+    """Returns True if value is a literal cell value
+
+    Subclasses, e.g. numpy scalars, are no literals.
+
+    """
+
+    return type(value) in LITERAL_TYPE_NAMES
+
+
+def to_literal(value):
+    """Returns literal cell value for value or None if there is none
+
+    Unicode texts become TextLiterals. Datetimes and times with time
+    zone are no literals.
+
+    """
+
+    value_type = type(value)
+
+    if value_type is unicode:
+        return TextLiteral(value)
+
+    if value_type not in LITERAL_TYPE_NAMES:
+        return
+
+    if value_type in (datetime.datetime, datetime.time) and \
+       value.tzinfo is not None:
+        return
+
+    return value
+
+
+def literal_to_code(value):
+    """Returns code that evaluates to the literal value
+
+    Dates and times require the datetime module in the cell namespace.
+
+    """
+
+    value_type = type(value)
+
+    if value_type is TextLiteral:
+        return repr(value).decode("ascii")
+
+    code = repr(value)
+
+    if value_type is float and code in ("inf", "-inf", "nan"):
+        return u"float('{}')".format(code)
+
+    if value_type is complex and ("inf" in code or "nan" in code):
+        return u"complex('{}')".format(code)
+
+    return code.decode("ascii")
+
+
+def literal_to_strings(value):
+    """Returns 2-tuple of type name and value string for saving
+
+    The value string contains no tabs and no line breaks.
+
+    """
+
+    value_type = type(value)
+    type_name = LITERAL_TYPE_NAMES[value_type]
+
+    if value_type is TextLiteral:
+        value_str = value.encode("unicode_escape").decode("ascii")
+
+    elif value_type in (float, complex):
+        value_str = repr(value).decode("ascii")
+
+    elif type_name in ("date", "datetime", "time"):
+        value_str = value.isoformat().decode("ascii")
+
+    else:
+        value_str = unicode(value)
+
+    return type_name, value_str
+
+
+def strings_to_literal(type_name, value_str):
+    """Returns literal from type name and value string of a save file
+
+    Parameters
+    ----------
+    type_name: String
+    \tType name from literal_to_strings
+    value_str: String
+    \tValue string from literal_to_strings
+
+    """
+
+    if type_name == "text":
+        return TextLiteral(value_str.encode("ascii").decode("unicode_escape"))
+
+    elif type_name == "int":
+        return int(value_str)
+
+    elif type_name == "float":
+        return float(value_str)
+
+    elif type_name == "complex":
+        return complex(value_str)
+
+    elif type_name == "bool":
+        return value_str == u"True"
+
+    elif type_name == "date":
+        return datetime.datetime.strptime(value_str, "%Y-%m-%d").date()
+
+    elif type_name == "datetime":
+        time_format = "%Y-%m-%dT%H:%M:%S.%f" if "." in value_str else \
+            "%Y-%m-%dT%H:%M:%S"
+
+        return datetime.datetime.strptime(value_str, time_format)
+
+    elif type_name == "time":
+        time_format = "%H:%M:%S.%f" if "." in value_str else "%H:%M:%S"
+
+        return datetime.datetime.strptime(value_str, time_format).time()
+
+    raise ValueError("Unknown literal type {}".format(type_name))
@@ -36,17 +36,29 @@ Layer 0: KeyValueStore
 
 import ast
 import base64
+from bisect import bisect_left, bisect_right
 import bz2
-from copy import copy
+from collections import OrderedDict
+from copy import copy, deepcopy
+import cPickle as pickle
 import cStringIO
-from itertools import imap, ifilter, product
+import datetime
+from itertools import chain, imap, product
 import re
 import sys
-from types import SliceType, IntType
+import tempfile
+import weakref
+from types import SliceType, IntType, LongType, FloatType, NoneType
+from types import CodeType
 
 import numpy
 
-import wx
+try:
+    import wx
+
+except ImportError:
+    # Headless operation without wxPython, e.g. in batch mode
+    wx = None
 
 from src.config import config
 
@@ -56,899 +68,3299 @@ from src.lib.selection import Selection
 import src.lib.charts as charts
 
 from unredo import UnRedo
+from dependencies import DependencyTracker, CycleError, get_reference_code
+from cache import ResultCache
+from indexmap import CellSizes, IndexMap, pack_key, unpack_key
+from literals import is_literal, literal_to_code, literal_to_strings
+from literals import strings_to_literal
+from attrindex import SelectionIndex, get_compacted_attributes
+from attrindex import get_selection_bbox
+from styles import StylePool
 
 chart = charts.chart
 
-class KeyValueStore(dict):
-    """Key-Value store in memory. Currently a dict with default value None.
+# Font weight and style wx.NORMAL
+FONT_NORMAL = 90
 
-    This class represents layer 0 of the model.
+# Marks items that are missing in a snapshot
+MISSING = object()
+
+
+def get_color_int(rgb):
+    """Returns integer color value as in wx.Colour(*rgb).GetRGB()
+
+    Parameters
+    ----------
+    rgb: 3-tuple of Integer
+    \tRed, green and blue color components from 0 to 255
 
     """
 
-    def __missing__(self, value):
-        """Returns the default value None"""
+    red, green, blue = rgb[:3]
 
-        return
+    return red | green << 8 | blue << 16
 
-# End of class KeyValueStore
 
-# -----------------------------------------------------------------------------
+def _rebuild_key_value_store(cls, state, items):
+    """Returns KeyValueStore of class cls for copy and pickle support"""
 
+    store = cls.__new__(cls)
+    store.__dict__.update(state)
+    KeyValueStore.__init__(store, items)
 
-class CellAttributes(list):
-    """Stores cell formatting attributes in a list of 3 - tuples
+    return store
 
-    The first element of each tuple is a Selection.
-    The second element is the table
-    The third element is a dict of attributes that are altered.
 
-    The class provides attribute read access to single cells via __getitem__
-    Otherwise it behaves similar to a list.
+class KeyValueStore(dict):
+    """Key-Value store in memory. Currently a dict with default value None.
 
-    Note that for the method undoable_append to work, unredo has to be
-    defined as class attribute.
+    Keys are 3-tuples (row, col, tab). The keys are indexed by table and
+    column. Each column holds the set of its rows. A sorted list of the
+    rows is built on demand for range queries and dropped when the
+    column changes. Therefore, range queries, table and column
+    operations only touch the affected cells.
 
-    """
+    Items are stored under physical keys. One IndexMap per axis
+    translates the logical keys of the interface into physical keys.
+    Inserting rows, columns or tables only changes an index map so that
+    no cells are moved.
 
-    default_cell_attributes = {
-        "borderwidth_bottom": 1,
-        "borderwidth_right": 1,
-        "bordercolor_bottom": wx.Colour(*config["grid_color"]).GetRGB(),
-        "bordercolor_right": wx.Colour(*config["grid_color"]).GetRGB(),
-        "bgcolor": wx.Colour(*config["background_color"]).GetRGB(),
-        "textfont": config["font"],
-        "pointsize": 10,
-        "fontweight": wx.NORMAL,
-        "fontstyle": wx.NORMAL,
-        "textcolor": wx.Colour(*config["text_color"]).GetRGB(),
-        "underline": False,
-        "strikethrough": False,
-        "angle": 0.0,
-        "column-width": 150,
-        "row-height": 26,
-        "vertical_align": "top",
-        "justification": "left",
-        "frozen": False,
-        "merge_area": None,
-    }
+    Physical keys are packed into single integers. Equal code strings
+    are shared between cells. Note that dict(store) copies the packed
+    keys. Use dict(store.iteritems()) for a copy with logical keys.
 
-    # Cache for __getattr__ maps key to tuple of len and attr_dict
+    snapshot returns a read-only copy-on-write view of the store. Before
+    an item is changed, its old value is handed to the snapshots.
 
-    _attr_cache = {}
+    unload_table moves the items of a table into a temporary file. The
+    table is loaded back when one of its keys is accessed.
 
-    def undoable_append(self, value):
-        """Appends item to list and provides undo and redo functionality"""
+    Subclasses may store items elsewhere, e.g. on disk, by overriding
+    _init_store, _get_packed, _get_packed_keys, the dict interface and
+    the index methods.
 
-        undo_operation = (self.pop, [])
-        redo_operation = (self.undoable_append, [value])
+    This class represents layer 0 of the model.
 
-        self.unredo.append(undo_operation, redo_operation)
+    """
 
-        self.unredo.mark()
+    # Maximum number of entries in the table of shared code strings
+    max_shared_codes = 65536
 
-        self.append(value)
-        self._attr_cache.clear()
+    # Attributes that are not copied or pickled but set up by _init_store
+    _store_attributes = ["index_maps", "_is_mapped", "_index",
+                         "_sorted_rows", "_shared_codes", "_snapshots",
+                         "_unloaded_tables", "_table_history"]
 
-    def __getitem__(self, key):
-        """Returns attribute dict for a single key"""
+    def __init__(self, items=None):
+        dict.__init__(self)
 
-        assert not any(type(key_ele) is SliceType for key_ele in key)
+        self._init_store()
 
-        if key in self._attr_cache:
-            cache_len, cache_dict = self._attr_cache[key]
+        if items is not None:
+            self.update(items)
 
-            # Use cache result only if no new attrs have been defined
-            if cache_len == len(self):
-                return cache_dict
+    def _init_store(self):
+        """Sets up empty store"""
 
-        row, col, tab = key
+        # Maps code strings to the equal string that is stored
+        self._shared_codes = {}
 
-        result_dict = copy(self.default_cell_attributes)
+        # Index maps of rows, columns and tables
+        self.index_maps = [IndexMap(), IndexMap(), IndexMap()]
 
-        for selection, table, attr_dict in self:
-            if tab == table and (row, col) in selection:
-                result_dict.update(attr_dict)
+        # False as long as logical and physical keys are identical
+        self._is_mapped = False
 
-        # Upddate cache with current length and dict
-        self._attr_cache[key] = (len(self), result_dict)
+        # Maps physical table to dict that maps physical column to set of
+        # physical rows
+        self._index = {}
 
-        return result_dict
+        # Maps physical (tab, col) to sorted list of physical rows
+        self._sorted_rows = {}
 
-# End of class CellAttributes
+        # Weak references to the snapshots of the store
+        self._snapshots = []
 
+        # Maps unloaded physical table to tuple of temporary file, number
+        # of items and list of physical columns
+        self._unloaded_tables = {}
 
-class ParserMixin(object):
-    """Provides parser methods for DictGrid"""
+        # Physical tables, least recently used first
+        self._table_history = OrderedDict()
 
-    def _split_tidy(self, string, maxsplit=None):
-        """Rstrips string for \n and splits string for \t"""
+    def __reduce__(self):
+        """Returns state without index, which is rebuilt on unpickling"""
 
-        if maxsplit is None:
-            return string.rstrip("\n").split("\t")
-        else:
-            return string.rstrip("\n").split("\t", maxsplit)
+        state = self.__dict__.copy()
 
-    def _get_key(self, *keystrings):
-        """Returns int key tuple from key string list"""
+        for name in self._store_attributes:
+            del state[name]
 
-        return tuple(imap(int, keystrings))
+        return _rebuild_key_value_store, \
+            (self.__class__, state, dict(self.iteritems()))
 
-    def parse_to_shape(self, line):
-        """Parses line and adjusts grid shape"""
+    def __missing__(self, value):
+        """Returns the default value None"""
 
-        self.shape = self._get_key(*self._split_tidy(line))
+        return
 
-    def parse_to_grid(self, line):
-        """Parses line and inserts grid data"""
+    def __eq__(self, other):
+        if isinstance(other, KeyValueStore):
+            other = dict(other.iteritems())
 
-        row, col, tab, code = self._split_tidy(line, maxsplit=3)
-        key = self._get_key(row, col, tab)
+        return dict(self.iteritems()) == other
 
-        self[key] = unicode(code, encoding='utf-8')
+    def __ne__(self, other):
+        return not self == other
 
-    def parse_to_attribute(self, line):
-        """Parses line and appends cell attribute"""
+    def __repr__(self):
+        return repr(dict(self.iteritems()))
 
-        splitline = self._split_tidy(line)
+    # Key translation
 
-        selection_data = map(ast.literal_eval, splitline[:5])
-        selection = Selection(*selection_data)
+    def _get_physical_key(self, key):
+        """Returns physical key of logical key"""
 
-        tab = int(splitline[5])
+        if not self._is_mapped:
+            return key
 
-        attrs = {}
-        for col, ele in enumerate(splitline[6:]):
-            if not (col % 2):
-                # Odd entries are keys
-                key = ast.literal_eval(ele)
+        row_map, col_map, tab_map = self.index_maps
+        row, col, tab = key
 
-            else:
-                # Even cols are values
-                attrs[key] = ast.literal_eval(ele)
+        return row_map.to_physical(row), col_map.to_physical(col), \
+            tab_map.to_physical(tab)
 
-        self.cell_attributes.append((selection, tab, attrs))
+    def _get_logical_key(self, key):
+        """Returns logical key of physical key"""
 
-    def parse_to_height(self, line):
-        """Parses line and inserts row hight"""
+        if not self._is_mapped:
+            return key
 
-        # Split with maxsplit 3
-        row, tab, height = self._split_tidy(line)
-        key = self._get_key(row, tab)
+        row_map, col_map, tab_map = self.index_maps
+        row, col, tab = key
 
-        self.row_heights[key] = float(height)
+        return row_map.to_logical(row), col_map.to_logical(col), \
+            tab_map.to_logical(tab)
 
-    def parse_to_width(self, line):
-        """Parses line and inserts column width"""
+    def _pack_key(self, key):
+        """Returns packed physical key of logical key"""
 
-        # Split with maxsplit 3
-        col, tab, width = self._split_tidy(line)
-        key = self._get_key(col, tab)
+        return pack_key(self._get_physical_key(key))
 
-        self.col_widths[key] = float(width)
+    def _find_key(self, key):
+        """Returns packed physical key or None if key cannot be stored
 
-    def parse_to_macro(self, line):
-        """Appends line to macro"""
+        The table of the key is loaded if it has been unloaded.
 
-        self.macros += line
+        """
 
-# End of class ParserMixin
+        try:
+            physical_key = self._get_physical_key(key)
+            packed_key = pack_key(physical_key)
 
+        except (TypeError, ValueError):
+            return
 
-class StringGeneratorMixin(object):
-    """String generation methods for DictGrid"""
+        if self._unloaded_tables and \
+           physical_key[2] in self._unloaded_tables:
+            self._load_table(physical_key[2])
 
-    def grid_to_strings(self):
-        """Yields a string that represents the grid content for saving
+        return packed_key
 
-        Format
-        ------
-        [shape]
-        rows\tcols\ttabs\n
-        [grid]
-        row\tcol\ttab\tcode\n
-        row\tcol\ttab\tcode\n
-        ...
+    def _unpack_key(self, packed_key):
+        """Returns logical key of packed physical key"""
 
-        """
+        return self._get_logical_key(unpack_key(packed_key))
 
-        yield u"[shape]\n"
-        yield u"\t".join(map(unicode, self.shape)) + u"\n"
+    def _share_code(self, value):
+        """Returns stored string that equals value if present"""
 
-        yield u"[grid]\n"
+        if type(value) not in (unicode, str):
+            return value
 
-        for key in self:
-            key_str = u"\t".join(repr(ele) for ele in key)
-            code_str = unicode(self[key])
+        shared_codes = self._shared_codes
+        shared_value = shared_codes.get(value)
 
-            yield key_str + u"\t" + code_str + u"\n"
+        if shared_value is not None:
+            return shared_value
 
-    def attributes_to_strings(self):
-        """Yields a string that represents the cell attributes for saving
+        if len(shared_codes) >= self.max_shared_codes:
+            shared_codes.clear()
 
-        Format
-        ------
+        shared_codes[value] = value
 
-        [attributes]
-        selection[0]\t...\tselection[5]\ttab\tkey\tvalue\t...\tkey\tvalue\n
-        ...
+        return value
 
-        """
+    # Index
 
-        yield u"[attributes]\n"
+    def _add_to_index(self, key):
+        """Adds physical key to index"""
 
-        for selection, tab, attr_dict in self.cell_attributes:
-            sel_list = [selection.block_tl, selection.block_br,
-                        selection.rows, selection.cols, selection.cells]
+        row, col, tab = key
 
-            tab_list = [tab]
+        try:
+            self._index[tab][col].add(row)
 
-            attr_dict_list = []
-            for key in attr_dict:
-                attr_dict_list.append(key)
-                attr_dict_list.append(attr_dict[key])
+        except KeyError:
+            self._index.setdefault(tab, {}).setdefault(col, set()).add(row)
 
-            line_list = map(repr, sel_list + tab_list + attr_dict_list)
+        self._sorted_rows.pop((tab, col), None)
 
-            yield u"\t".join(line_list) + u"\n"
+    def _remove_from_index(self, key):
+        """Removes physical key from index"""
 
-    def heights_to_strings(self):
-        """Yields a string that represents the row heights for saving
+        row, col, tab = key
 
-        Format
-        ------
+        columns = self._index[tab]
+        rows = columns[col]
+        rows.discard(row)
 
-        [row_heights]
-        row\ttab\tvalue\n
-        ...
+        if not rows:
+            del columns[col]
 
-        """
+            if not columns:
+                del self._index[tab]
 
-        yield u"[row_heights]\n"
+        self._sorted_rows.pop((tab, col), None)
 
-        for row, tab in self.row_heights:
-            height = self.row_heights[(row, tab)]
-            height_strings = map(repr, [row, tab, height])
-            yield u"\t".join(height_strings) + u"\n"
+    def _iter_columns(self):
+        """Yields physical (tab, col) of columns that contain keys"""
 
-    def widths_to_strings(self):
-        """Yields a string that represents the column widths for saving
+        for tab, columns in self._index.iteritems():
+            for col in columns:
+                yield tab, col
 
-        Format
-        ------
+        for tab, (__, __, columns) in self._unloaded_tables.items():
+            for col in columns:
+                yield tab, col
 
-        [col_widths]
-        col\ttab\tvalue\n
-        ...
+    def _get_sorted_rows(self, tab, col):
+        """Returns sorted list of physical rows of a physical column"""
 
-        """
+        try:
+            return self._sorted_rows[tab, col]
 
-        yield u"[col_widths]\n"
+        except KeyError:
+            if tab in self._unloaded_tables:
+                self._load_table(tab)
 
-        for col, tab in self.col_widths:
-            width = self.col_widths[(col, tab)]
-            width_strings = map(repr, [col, tab, width])
-            yield u"\t".join(width_strings) + u"\n"
+            rows = self._sorted_rows[tab, col] = sorted(self._index[tab][col])
 
-    def macros_to_strings(self):
-        """Yields a string that represents the content for saving
+            return rows
 
-        Format
-        ------
+    def _get_logical_rows(self, tab, col, start=None, stop=None):
+        """Returns sorted list of logical rows of a physical column
 
-        [macros]
-        Macro code
+        Parameters
+        ----------
+        tab: Integer
+        \tPhysical table
+        col: Integer
+        \tPhysical column
+        start: Integer or None, defaults to None
+        \tFirst logical row, None means no limit
+        stop: Integer or None, defaults to None
+        \tLogical row after the last, None means no limit
 
         """
 
-        yield u"[macros]\n"
+        rows = self._get_sorted_rows(tab, col)
 
-        for line in self.macros.split("\n"):
-            yield line + u"\n"
+        if start is None and stop is None and self.index_maps[0].is_identity:
+            return rows
 
-# End of class StringGeneratorMixin
+        logical_rows = []
 
+        for first, last, offset in \
+                self.index_maps[0].get_physical_ranges(start, stop):
+            first_pos = bisect_left(rows, first)
+            last_pos = len(rows) if last is None else bisect_left(rows, last)
 
-class DictGrid(KeyValueStore, ParserMixin, StringGeneratorMixin):
-    """The core data class with all information that is stored in a pys file.
+            if offset:
+                logical_rows += [row - offset
+                                 for row in rows[first_pos:last_pos]]
+            else:
+                logical_rows += rows[first_pos:last_pos]
 
-    Besides grid code access via standard dict operations, it provides
-    the following attributes:
+        return logical_rows
 
-    * cell_attributes: Stores cell formatting attributes
-    * macros:          String of all macros
+    # Snapshots
 
-    This class represents layer 1 of the model.
+    def _get_packed(self, packed_key, default=None):
+        """Returns value of packed physical key or default if missing"""
 
-    Parameters
-    ----------
-    shape: n-tuple of integer
-    \tShape of the grid
+        return dict.get(self, packed_key, default)
 
-    """
+    def _get_packed_keys(self):
+        """Returns list of packed physical keys"""
 
-    def __init__(self, shape):
-        KeyValueStore.__init__(self)
+        return dict.keys(self)
 
-        self.shape = shape
+    def _save_for_snapshots(self, packed_key):
+        """Hands value of packed_key to the snapshots before it changes"""
 
-        self.cell_attributes = CellAttributes()
+        value = self._get_packed(packed_key, MISSING)
 
-        self.macros = u""
+        for snapshot_ref in self._snapshots[:]:
+            snapshot = snapshot_ref()
 
-        self.row_heights = {}  # Keys have the format (row, table)
-        self.col_widths = {}  # Keys have the format (col, table)
+            if snapshot is None:
+                self._snapshots.remove(snapshot_ref)
 
-    def __getitem__(self, key):
+            else:
+                snapshot._save(packed_key, value)
 
-        shape = self.shape
+    def _detach_snapshots(self):
+        """Copies all items into the snapshots and releases them"""
 
-        for axis, key_ele in enumerate(key):
-            if shape[axis] <= key_ele or key_ele < -shape[axis]:
-                msg = "Grid index {} outside grid shape {}.".format(key, shape)
-                raise IndexError(msg)
+        snapshot_refs, self._snapshots = self._snapshots, []
 
-        return KeyValueStore.__getitem__(self, key)
+        for snapshot_ref in snapshot_refs:
+            snapshot = snapshot_ref()
 
-# End of class DictGrid
+            if snapshot is not None:
+                snapshot._detach()
 
-# -----------------------------------------------------------------------------
+    def snapshot(self):
+        """Returns read-only KeyValueSnapshot of the current items
 
+        Unloaded tables are loaded.
 
-class DataArray(object):
-    """DataArray provides enhanced grid read/write access.
+        """
 
-    Enhancements comprise:
-     * Slicing
-     * Multi-dimensional operations such as insertion and deletion along 1 axis
-     * Undo/redo operations
+        self._load_tables()
 
-    This class represents layer 2 of the model.
+        snapshot = KeyValueSnapshot(self)
 
-    Parameters
-    ----------
-    shape: n-tuple of integer
-    \tShape of the grid
+        self._snapshots.append(weakref.ref(snapshot))
 
-    """
+        return snapshot
 
-    def __init__(self, shape):
-        self.dict_grid = DictGrid(shape)
+    # Unloading of tables
 
-        # Undo and redo management
-        self.unredo = UnRedo()
-        self.dict_grid.cell_attributes.unredo = self.unredo
+    def _touch_table(self, tab):
+        """Marks physical table as most recently used"""
 
-        # Safe mode
-        self.safe_mode = False
+        self._table_history.pop(tab, None)
+        self._table_history[tab] = None
 
-    # Row and column attributes mask
-    # Keys have the format (row, table)
+    def _load_table(self, tab):
+        """Loads items of unloaded physical table from its temporary file"""
 
-    @property
-    def row_heights(self):
-        """Returns row_heights dict"""
+        infile, __, __ = self._unloaded_tables.pop(tab)
 
-        return self.dict_grid.row_heights
+        infile.seek(0)
+        items = pickle.load(infile)
+        infile.close()
 
-    @property
-    def col_widths(self):
-        """Returns col_widths dict"""
+        for packed_key, value in items:
+            dict.__setitem__(self, packed_key, value)
+            self._add_to_index(unpack_key(packed_key))
 
-        return self.dict_grid.col_widths
+        self._touch_table(tab)
 
-    # Cell attributes mask
-    @property
-    def cell_attributes(self):
-        """Returns cell_attributes list"""
+    def _load_tables(self):
+        """Loads all unloaded tables"""
 
-        return self.dict_grid.cell_attributes
+        for tab in self._unloaded_tables.keys():
+            self._load_table(tab)
 
-    def __iter__(self):
+    def touch_table(self, tab):
+        """Marks logical table as most recently used and loads it"""
+
+        tab = self.index_maps[2].to_physical(tab)
+
+        if tab in self._unloaded_tables:
+            self._load_table(tab)
+
+        else:
+            self._touch_table(tab)
+
+    def is_table_loaded(self, tab):
+        """Returns False if logical table has been unloaded"""
+
+        return self.index_maps[2].to_physical(tab) not in \
+            self._unloaded_tables
+
+    def unload_table(self, tab):
+        """Moves the items of logical table into a temporary file
+
+        Returns the number of unloaded items. The table is loaded back
+        when one of its keys is accessed.
+
+        Parameters
+        ----------
+        tab: Integer
+        \tLogical table
+
+        """
+
+        tab = self.index_maps[2].to_physical(tab)
+
+        if tab in self._unloaded_tables or tab not in self._index:
+            return 0
+
+        columns = self._index.pop(tab)
+
+        packed_keys = [pack_key((row, col, tab))
+                       for col, rows in columns.iteritems() for row in rows]
+
+        if self._snapshots:
+            for packed_key in packed_keys:
+                self._save_for_snapshots(packed_key)
+
+        items = [(packed_key, dict.pop(self, packed_key))
+                 for packed_key in packed_keys]
+
+        for col in columns:
+            self._sorted_rows.pop((tab, col), None)
+
+        outfile = tempfile.TemporaryFile()
+        pickle.dump(items, outfile, pickle.HIGHEST_PROTOCOL)
+
+        self._unloaded_tables[tab] = outfile, len(items), list(columns)
+
+        return len(items)
+
+    def unload_tables(self, max_loaded_tables):
+        """Unloads least recently used tables and returns them
+
+        At most max_loaded_tables tables with items stay loaded. Tables
+        that have never been touched count as least recently used.
+
+        Parameters
+        ----------
+        max_loaded_tables: Integer
+        \tMaximum number of loaded tables with items
+
+        """
+
+        history = [tab for tab in self._table_history if tab in self._index]
+        tables = [tab for tab in self._index if tab not in self._table_history]
+        tables += history
+
+        tab_map = self.index_maps[2]
+        unloaded_tables = []
+
+        for tab in tables[:max(len(tables) - max_loaded_tables, 0)]:
+            logical_tab = tab_map.to_logical(tab)
+
+            self.unload_table(logical_tab)
+            unloaded_tables.append(logical_tab)
+
+        return unloaded_tables
+
+    # Dict interface with logical keys
+
+    def __getitem__(self, key):
+        return dict.__getitem__(self, self._find_key(key))
+
+    def __setitem__(self, key, value):
+        physical_key = self._get_physical_key(key)
+        packed_key = pack_key(physical_key)
+
+        if self._unloaded_tables and \
+           physical_key[2] in self._unloaded_tables:
+            self._load_table(physical_key[2])
+
+        if self._snapshots:
+            self._save_for_snapshots(packed_key)
+
+        if not dict.__contains__(self, packed_key):
+            self._add_to_index(physical_key)
+
+        dict.__setitem__(self, packed_key, self._share_code(value))
+
+    def __delitem__(self, key):
+        packed_key = self._find_key(key)
+
+        if self._snapshots:
+            self._save_for_snapshots(packed_key)
+
+        dict.__delitem__(self, packed_key)
+
+        self._remove_from_index(unpack_key(packed_key))
+
+    def __contains__(self, key):
+        return dict.__contains__(self, self._find_key(key))
+
+    has_key = __contains__
+
+    def __len__(self):
+        return dict.__len__(self) + \
+            sum(length for __, length, __ in self._unloaded_tables.values())
+
+    def __iter__(self):
+        self._load_tables()
+
+        if not self._is_mapped:
+            return imap(unpack_key, dict.__iter__(self))
+
+        return imap(self._unpack_key, dict.__iter__(self))
+
+    iterkeys = __iter__
+
+    def keys(self):
+        """Returns list of keys"""
+
+        return list(self)
+
+    def iteritems(self):
+        """Yields items with logical keys"""
+
+        self._load_tables()
+
+        _unpack_key = self._unpack_key if self._is_mapped else unpack_key
+
+        return ((_unpack_key(key), value)
+                for key, value in dict.iteritems(self))
+
+    def items(self):
+        """Returns list of items"""
+
+        return list(self.iteritems())
+
+    def itervalues(self):
+        """Yields values"""
+
+        self._load_tables()
+
+        return dict.itervalues(self)
+
+    def values(self):
+        """Returns list of values"""
+
+        return list(self.itervalues())
+
+    def copy(self):
+        """Returns dict with the items of the store"""
+
+        return dict(self.iteritems())
+
+    def get(self, key, default=None):
+        """Returns value of key or default if missing"""
+
+        return dict.get(self, self._find_key(key), default)
+
+    def pop(self, key, *default):
+        """Removes key and returns its value, see dict.pop"""
+
+        packed_key = self._find_key(key)
+
+        if dict.__contains__(self, packed_key):
+            if self._snapshots:
+                self._save_for_snapshots(packed_key)
+
+            self._remove_from_index(unpack_key(packed_key))
+
+        elif not default:
+            raise KeyError(key)
+
+        return dict.pop(self, packed_key, *default)
+
+    def popitem(self):
+        """Removes and returns an arbitrary item, see dict.popitem"""
+
+        self._load_tables()
+
+        try:
+            packed_key = next(dict.__iter__(self))
+
+        except StopIteration:
+            raise KeyError("popitem(): dictionary is empty")
+
+        if self._snapshots:
+            self._save_for_snapshots(packed_key)
+
+        value = dict.pop(self, packed_key)
+        physical_key = unpack_key(packed_key)
+
+        self._remove_from_index(physical_key)
+
+        return self._get_logical_key(physical_key), value
+
+    def setdefault(self, key, default=None):
+        """Returns value of key and sets it to default if missing"""
+
+        if key not in self:
+            self[key] = default
+
+        return self.get(key)
+
+    def update(self, items):
+        """Updates store from dict like object or iterable of items"""
+
+        if hasattr(items, "iteritems"):
+            items = items.iteritems()
+
+        for key, value in items:
+            self[key] = value
+
+    def clear(self):
+        """Removes all items and resets the index maps"""
+
+        self._detach_snapshots()
+
+        dict.clear(self)
+
+        for outfile, __, __ in self._unloaded_tables.values():
+            outfile.close()
+
+        self._unloaded_tables.clear()
+        self._table_history.clear()
+
+        self._index.clear()
+        self._sorted_rows.clear()
+        self._shared_codes.clear()
+
+        self.index_maps = [IndexMap(), IndexMap(), IndexMap()]
+        self._is_mapped = False
+
+    def get_memory_report(self):
+        """Returns dict with estimated memory usage of the store in bytes
+
+        The dict has the keys:
+        cells: Number of cells
+        total: Bytes of keys, codes, hash tables and index
+        per_cell: Average bytes per cell
+        tables: Dict that maps each table to the bytes of its keys, codes
+        and index
+
+        Shared code strings are counted once. Unloaded tables are loaded.
+
+        """
+
+        self._load_tables()
+
+        getsizeof = sys.getsizeof
+        tab_map = self.index_maps[2]
+
+        counted_codes = set()
+        table_sizes = {}
+
+        for packed_key, code in dict.iteritems(self):
+            size = getsizeof(packed_key)
+
+            if id(code) not in counted_codes:
+                counted_codes.add(id(code))
+                size += getsizeof(code)
+
+            tab = unpack_key(packed_key)[2]
+            table_sizes[tab] = table_sizes.get(tab, 0) + size
+
+        for tab, columns in self._index.iteritems():
+            size = getsizeof(columns)
+
+            for col, rows in columns.iteritems():
+                size += getsizeof(col) + getsizeof(rows)
+                size += sum(getsizeof(row) for row in rows)
+
+            table_sizes[tab] = table_sizes.get(tab, 0) + size
+
+        tables = dict((tab_map.to_logical(tab), size)
+                      for tab, size in table_sizes.iteritems())
+
+        total = sum(tables.itervalues()) + getsizeof(self) + \
+            getsizeof(self._index) + getsizeof(self._shared_codes)
+
+        return {
+            "cells": len(self),
+            "total": total,
+            "per_cell": float(total) / len(self) if self else 0.0,
+            "tables": tables,
+        }
+
+    # Grid operations
+
+    def insert(self, insertion_point, no_to_insert, axis):
+        """Inserts empty rows, columns or tables before insertion_point
+
+        Keys at and after insertion_point are shifted by no_to_insert.
+        Only the index map of axis is changed.
+
+        Parameters
+        ----------
+        insertion_point: Integer
+        \tLogical row, column or table, before which is inserted
+        no_to_insert: Integer
+        \tNumber of rows, columns or tables that are inserted
+        axis: Integer in [0, 1, 2]
+        \tAxis of insertion
+
+        """
+
+        self.index_maps[axis].insert(insertion_point, no_to_insert)
+        self._is_mapped = not all(index_map.is_identity
+                                  for index_map in self.index_maps)
+
+    def delete(self, deletion_point, no_to_delete, axis):
+        """Deletes rows, columns or tables and returns the deleted items
+
+        Keys after the deleted range are shifted by -no_to_delete.
+        The deleted items are returned as dict with logical keys.
+
+        Parameters
+        ----------
+        deletion_point: Integer
+        \tFirst logical row, column or table that is deleted
+        no_to_delete: Integer
+        \tNumber of rows, columns or tables that are deleted
+        axis: Integer in [0, 1, 2]
+        \tAxis of deletion
+
+        """
+
+        start = [None, None, None]
+        stop = [None, None, None]
+
+        start[axis] = deletion_point
+        stop[axis] = deletion_point + no_to_delete
+
+        deleted_items = {}
+
+        for key in list(self.iterkeys_in_range(start, stop)):
+            deleted_items[key] = self.pop(key)
+
+        self.index_maps[axis].delete(deletion_point, no_to_delete)
+        self._is_mapped = not all(index_map.is_identity
+                                  for index_map in self.index_maps)
+
+        return deleted_items
+
+    # Index queries
+
+    def _get_logical_pairs(self):
+        """Returns dict that maps logical to physical (tab, col) pairs"""
+
+        row_map, col_map, tab_map = self.index_maps
+
+        return dict(((tab_map.to_logical(tab), col_map.to_logical(col)),
+                     (tab, col)) for tab, col in self._iter_columns())
+
+    def get_tables(self):
+        """Returns list of tables that contain keys"""
+
+        tables = set(tab for tab, __ in self._iter_columns())
+
+        return map(self.index_maps[2].to_logical, tables)
+
+    def iterkeys_in_range(self, start=None, stop=None):
+        """Yields keys from start to stop excluding stop on each axis
+
+        Keys of a column are yielded with ascending rows. The store may be
+        changed while iterating over the keys of a range.
+
+        Parameters
+        ----------
+        start: 3-tuple of Integer or None, defaults to None
+        \tFirst row, column and table, None elements mean no limit
+        stop: 3-tuple of Integer or None, defaults to None
+        \tRow, column and table after the last, None elements mean no limit
+
+        """
+
+        row_start, col_start, tab_start = start or (None, None, None)
+        row_stop, col_stop, tab_stop = stop or (None, None, None)
+
+        is_in = lambda ele, first, last: \
+            (first is None or ele >= first) and (last is None or ele < last)
+
+        for (tab, col), (phys_tab, phys_col) in \
+                self._get_logical_pairs().iteritems():
+            if not is_in(tab, tab_start, tab_stop) or \
+               not is_in(col, col_start, col_stop):
+                continue
+
+            # Sorted row lists are replaced but never changed in place
+            try:
+                rows = self._get_logical_rows(phys_tab, phys_col,
+                                              row_start, row_stop)
+
+            except KeyError:
+                # Column has been emptied while iterating
+                continue
+
+            for row in rows:
+                yield row, col, tab
+
+    def iterkeys_sorted(self, startkey=None, reverse=False):
+        """Yields keys sorted by table, column and row starting at startkey
+
+        Keys before startkey are yielded after the last key so that the
+        order wraps around.
+
+        Parameters
+        ----------
+        startkey: 3-tuple of Integer or None, defaults to None
+        \tKey, from which the iteration starts, None means first key
+        reverse: Bool, defaults to False
+        \tSort direction reversed if True
+
+        """
+
+        logical_pairs = self._get_logical_pairs()
+        pairs = sorted(logical_pairs, reverse=reverse)
+
+        if startkey is None:
+            start_row, start_pair = None, None
+            no_before = 0
+
+        else:
+            start_row, start_col, start_tab = startkey
+            start_pair = start_tab, start_col
+
+            if reverse:
+                no_before = sum(1 for pair in pairs if pair > start_pair)
+
+            else:
+                no_before = sum(1 for pair in pairs if pair < start_pair)
+
+        # Rows of the start column that are yielded last
+        wrapped_rows = []
+
+        for tab, col in pairs[no_before:] + pairs[:no_before]:
+            try:
+                rows = self._get_logical_rows(*logical_pairs[tab, col])
+
+            except KeyError:
+                # Column has been emptied while iterating
+                continue
+
+            if (tab, col) == start_pair:
+                if reverse:
+                    pos = bisect_right(rows, start_row)
+                    rows, wrapped_rows = rows[:pos], rows[pos:]
+
+                else:
+                    pos = bisect_left(rows, start_row)
+                    rows, wrapped_rows = rows[pos:], rows[:pos]
+
+            if reverse:
+                rows = rows[::-1]
+
+            for row in rows:
+                yield row, col, tab
+
+        if reverse:
+            wrapped_rows = wrapped_rows[::-1]
+
+        if start_pair is not None:
+            start_tab, start_col = start_pair
+
+            for row in wrapped_rows:
+                yield row, start_col, start_tab
+
+# End of class KeyValueStore
+
+
+class KeyValueSnapshot(object):
+    """Read-only copy-on-write snapshot of a KeyValueStore
+
+    The snapshot shares the items with its store. The store hands the
+    old value of an item to the snapshot before the item is changed for
+    the first time. Therefore, the snapshot may be read, e.g. in a
+    background thread, while the store is edited. Snapshots of stores,
+    which are not kept in memory, may only be read in the thread of
+    the store.
+
+    Parameters
+    ----------
+    store: KeyValueStore
+    \tStore, of which the snapshot is taken
+
+    """
+
+    def __init__(self, store):
+        self.store = store
+
+        self.index_maps = deepcopy(store.index_maps)
+
+        # Maps packed physical keys to their values at snapshot time,
+        # MISSING for keys that have been added since
+        self._saved = {}
+
+        # True if all items have been copied to _saved
+        self._is_detached = False
+
+        self._length = len(store)
+
+    def __len__(self):
+        return self._length
+
+    def _save(self, packed_key, value):
+        """Stores value of packed_key unless already saved"""
+
+        self._saved.setdefault(packed_key, value)
+
+    def _detach(self):
+        """Copies all items that have not been saved yet"""
+
+        store = self.store
+        saved = self._saved
+
+        for packed_key in store._get_packed_keys():
+            if packed_key not in saved:
+                saved[packed_key] = store._get_packed(packed_key)
+
+        self._is_detached = True
+        self.store = None
+
+    def release(self):
+        """Copies the remaining items and detaches from the store"""
+
+        store = self.store
+
+        if store is not None:
+            self._detach()
+
+            store._snapshots = [snapshot_ref
+                                for snapshot_ref in store._snapshots
+                                if snapshot_ref() is not self]
+
+    def _get_packed(self, packed_key):
+        """Returns value of packed physical key or MISSING"""
+
+        if self._is_detached:
+            return self._saved.get(packed_key, MISSING)
+
+        # The store saves old values before changing them. Therefore,
+        # _saved is read after the store.
+        value = self.store._get_packed(packed_key, MISSING)
+
+        return self._saved.get(packed_key, value)
+
+    def _get_packed_keys(self):
+        """Returns list of packed physical keys of the snapshot"""
+
+        if self._is_detached:
+            store_keys = []
+
+        else:
+            store_keys = self.store._get_packed_keys()
+
+        saved_items = self._saved.items()
+        saved_keys = set(packed_key for packed_key, __ in saved_items)
+
+        return [packed_key for packed_key in store_keys
+                if packed_key not in saved_keys] + \
+               [packed_key for packed_key, value in saved_items
+                if value is not MISSING]
+
+    def _get_logical_key(self, packed_key):
+        """Returns logical key of packed physical key"""
+
+        row, col, tab = unpack_key(packed_key)
+        row_map, col_map, tab_map = self.index_maps
+
+        return row_map.to_logical(row), col_map.to_logical(col), \
+            tab_map.to_logical(tab)
+
+    def _find_key(self, key):
+        """Returns packed physical key or None if key cannot be stored"""
+
+        row_map, col_map, tab_map = self.index_maps
+
+        try:
+            row, col, tab = key
+
+            return pack_key((row_map.to_physical(row),
+                             col_map.to_physical(col),
+                             tab_map.to_physical(tab)))
+
+        except (TypeError, ValueError):
+            return
+
+    def __getitem__(self, key):
+        return self.get(key)
+
+    def get(self, key, default=None):
+        """Returns value of key or default if missing"""
+
+        value = self._get_packed(self._find_key(key))
+
+        return default if value is MISSING else value
+
+    def __contains__(self, key):
+        return self._get_packed(self._find_key(key)) is not MISSING
+
+    has_key = __contains__
+
+    def __iter__(self):
+        return imap(self._get_logical_key, self._get_packed_keys())
+
+    iterkeys = __iter__
+
+    def keys(self):
+        """Returns list of keys"""
+
+        return list(self)
+
+    def iteritems(self):
+        """Yields items with logical keys"""
+
+        for packed_key in self._get_packed_keys():
+            value = self._get_packed(packed_key)
+
+            if value is not MISSING:
+                yield self._get_logical_key(packed_key), value
+
+    def items(self):
+        """Returns list of items"""
+
+        return list(self.iteritems())
+
+# End of class KeyValueSnapshot
+
+# -----------------------------------------------------------------------------
+
+
+class CellAttributes(list):
+    """Stores cell formatting attributes in a list of 3 - tuples
+
+    The first element of each tuple is a Selection.
+    The second element is the table
+    The third element is a dict of attributes that are altered.
+
+    The class provides attribute read access to single cells via __getitem__
+    Otherwise it behaves similar to a list.
+
+    Note that for the method undoable_append to work, unredo has to be
+    defined as class attribute.
+
+    """
+
+    default_cell_attributes = {
+        "borderwidth_bottom": 1,
+        "borderwidth_right": 1,
+        "bordercolor_bottom": get_color_int(config["grid_color"]),
+        "bordercolor_right": get_color_int(config["grid_color"]),
+        "bgcolor": get_color_int(config["background_color"]),
+        "textfont": config["font"],
+        "pointsize": 10,
+        "fontweight": FONT_NORMAL,
+        "fontstyle": FONT_NORMAL,
+        "textcolor": get_color_int(config["text_color"]),
+        "underline": False,
+        "strikethrough": False,
+        "angle": 0.0,
+        "column-width": 150,
+        "row-height": 26,
+        "vertical_align": "top",
+        "justification": "left",
+        "frozen": False,
+        "merge_area": None,
+    }
+
+    # Defaults of these attributes depend on the configuration.
+    # Therefore, compact keeps them even if they equal the default.
+
+    config_attribute_keys = ("bordercolor_bottom", "bordercolor_right",
+                             "bgcolor", "textfont", "textcolor")
+
+    # Maps table to SelectionIndex of the list positions of the attributes
+    # of the table. The indices are built on the first lookup and discarded
+    # when attributes are removed, inserted or reordered.
+
+    _table_indices = None
+
+    # Maps attribute key to set of tables, in which attributes set the key.
+    # The sets are valid while changes equals _key_tables_changes.
+
+    _key_tables = None
+    _key_tables_changes = None
+
+    def __init__(self, *args):
+        list.__init__(self, *args)
+
+        # Cache for __getitem__ maps (tab, row) to dict that maps col to
+        # CellStyle. Changed attributes remove the cells inside their
+        # bounding box.
+        self._attr_cache = {}
+
+        # Cells with equal attributes share one CellStyle from the pool
+        self._style_pool = StylePool(self.default_cell_attributes)
+
+        # Number of changes that may have altered resolved attributes
+        self.changes = 0
+
+    def __getstate__(self):
+        """Returns instance dict without caches and table indices"""
+
+        state = self.__dict__.copy()
+        for name in ("_attr_cache", "_style_pool", "_table_indices",
+                     "_key_tables", "_key_tables_changes"):
+            state.pop(name, None)
+
+        return state
+
+    def __setstate__(self, state):
+        """Restores instance dict with empty caches"""
+
+        self.__dict__.update(state)
+        self._attr_cache = {}
+        self._style_pool = StylePool(self.default_cell_attributes)
+
+    def clear_caches(self):
+        """Clears attribute cache and table indices
+
+        Has to be called after selections or tables of attributes are
+        changed in place.
+
+        """
+
+        self._attr_cache.clear()
+        self._style_pool.clear()
+        self._table_indices = None
+        self.changes += 1
+
+    def resolve_block(self, rows, cols, tab):
+        """Returns 2D numpy object array of the CellStyles of a block
+
+        The attributes of the block are overlaid in one pass. Cells with
+        the same attributes are resolved once. The array is indexed by the
+        positions of row and col in rows and cols.
+
+        Parameters
+        ----------
+        rows: Iterable of Integer
+        \tRows of the block
+        cols: Iterable of Integer
+        \tColumns of the block
+        tab: Integer
+        \tTable of the block
+
+        """
+
+        rows = list(rows)
+        cols = list(cols)
+
+        styles = numpy.empty((len(rows), len(cols)), dtype="O")
+
+        if not rows or not cols:
+            return styles
+
+        row_indices = dict((row, i) for i, row in enumerate(rows))
+        col_indices = dict((col, j) for j, col in enumerate(cols))
+
+        min_row, max_row = min(rows), max(rows)
+        min_col, max_col = min(cols), max(cols)
+
+        # Ascending positions of the attributes of each cell
+        cell_positions = [[[] for _ in cols] for _ in rows]
+
+        def add_position(i, j, pos):
+            """Adds pos to the positions of cell i, j once"""
+
+            positions = cell_positions[i][j]
+            if not positions or positions[-1] != pos:
+                positions.append(pos)
+
+        table_index = self._get_table_index(tab)
+
+        if table_index is None:
+            block_positions = []
+        else:
+            block_positions = table_index.get_block_positions(
+                min_row, min_col, max_row, max_col)
+
+        for pos in block_positions:
+            selection, _, attr_dict = list.__getitem__(self, pos)
+
+            if not attr_dict:
+                continue
+
+            for (top, left), (bottom, right) in zip(selection.block_tl,
+                                                    selection.block_br):
+                block_cols = [j for j, col in enumerate(cols)
+                              if left <= col <= right]
+                for i, row in enumerate(rows):
+                    if top <= row <= bottom:
+                        for j in block_cols:
+                            add_position(i, j, pos)
+
+            for row in selection.rows:
+                if row in row_indices:
+                    for j in xrange(len(cols)):
+                        add_position(row_indices[row], j, pos)
+
+            for col in selection.cols:
+                if col in col_indices:
+                    for i in xrange(len(rows)):
+                        add_position(i, col_indices[col], pos)
+
+            for row, col in selection.cells:
+                if row in row_indices and col in col_indices:
+                    add_position(row_indices[row], col_indices[col], pos)
+
+        # Maps tuple of positions to CellStyle
+        position_styles = {}
+
+        get_style = self._style_pool.get_style
+        get_attr_dict = lambda pos: list.__getitem__(self, pos)[2]
+
+        for i, row in enumerate(rows):
+            row_cache = self._attr_cache.setdefault((tab, row), {})
+
+            for j, col in enumerate(cols):
+                positions = tuple(cell_positions[i][j])
+
+                try:
+                    style = position_styles[positions]
+
+                except KeyError:
+                    attributes = {}
+                    for pos in positions:
+                        attributes.update(get_attr_dict(pos))
+
+                    style = position_styles[positions] = \
+                        get_style(attributes)
+
+                styles[i, j] = style
+                row_cache[col] = style
+
+        return styles
+
+    def get_memory_report(self):
+        """Returns dict with estimated memory usage of the cache in bytes
+
+        The dict has the keys:
+        cells: Number of cached cells
+        styles: Number of shared CellStyles
+        total: Bytes of cache, keys and CellStyles
+        per_cell: Average bytes per cached cell
+
+        """
+
+        getsizeof = sys.getsizeof
+
+        cells = 0
+        total = getsizeof(self._attr_cache) + \
+            self._style_pool.get_memory_size()
+
+        for row_key, row_cache in self._attr_cache.iteritems():
+            cells += len(row_cache)
+            total += getsizeof(row_key) + getsizeof(row_cache) + \
+                sum(getsizeof(col) for col in row_cache)
+
+        per_cell = float(total) / cells if cells else 0.0
+
+        return {
+            "cells": cells,
+            "styles": len(self._style_pool),
+            "total": total,
+            "per_cell": per_cell,
+        }
+
+    def _iter_cache(self):
+        """Yields key and CellStyle of each cached cell"""
+
+        for (tab, row), row_cache in self._attr_cache.iteritems():
+            for col, style in row_cache.iteritems():
+                yield (row, col, tab), style
+
+    def _invalidate_cache(self, attributes):
+        """Removes cached attr_dicts of cells that attributes may change
+
+        Only the rows of the bounding box of each selection are visited if
+        there are fewer of them than cached rows.
+
+        """
+
+        attr_cache = self._attr_cache
+
+        self.changes += 1
+
+        for selection, tab, _ in attributes:
+            if not attr_cache:
+                return
+
+            bbox = get_selection_bbox(selection)
+
+            if bbox is None:
+                continue
+
+            top, left, bottom, right = bbox
+
+            if top is not None and bottom is not None and \
+               bottom - top < len(attr_cache):
+                row_keys = [(tab, row) for row in xrange(top, bottom + 1)
+                            if (tab, row) in attr_cache]
+
+            else:
+                row_keys = [(key_tab, row) for key_tab, row in attr_cache
+                            if key_tab == tab and
+                            (top is None or top <= row) and
+                            (bottom is None or row <= bottom)]
+
+            for row_key in row_keys:
+                if left is None and right is None:
+                    del attr_cache[row_key]
+                    continue
+
+                row_cache = attr_cache[row_key]
+
+                for col in row_cache.keys():
+                    if (left is None or left <= col) and \
+                       (right is None or col <= right):
+                        del row_cache[col]
+
+                if not row_cache:
+                    del attr_cache[row_key]
+
+    def _get_table_index(self, tab):
+        """Returns SelectionIndex for table tab, builds indices if needed"""
+
+        if self._table_indices is None:
+            table_indices = {}
+
+            for pos, (selection, table, _) in enumerate(list.__iter__(self)):
+                if table not in table_indices:
+                    table_indices[table] = SelectionIndex()
+                table_indices[table].add(pos, selection)
+
+            self._table_indices = table_indices
+
+        try:
+            return self._table_indices[tab]
+
+        except KeyError:
+            return
+
+    def get_key_tables(self, attr_key):
+        """Returns set of tables, in which an attribute sets attr_key
+
+        Only attributes that set attr_key to a true value are considered.
+        The sets are kept until the attributes change.
+
+        Parameters
+        ----------
+        attr_key: String
+        \tAttribute key, e.g. "frozen"
+
+        """
+
+        if self._key_tables_changes != self.changes:
+            self._key_tables = {}
+            self._key_tables_changes = self.changes
+
+        try:
+            return self._key_tables[attr_key]
+
+        except KeyError:
+            tables = set(tab for _, tab, attr_dict in list.__iter__(self)
+                         if attr_dict.get(attr_key))
+            self._key_tables[attr_key] = tables
+
+            return tables
+
+    def append(self, value):
+        """Appends attribute and adds it to the table index"""
+
+        list.append(self, value)
+
+        if self._table_indices is not None:
+            selection, tab, _ = value
+            if tab not in self._table_indices:
+                self._table_indices[tab] = SelectionIndex()
+            self._table_indices[tab].add(len(self) - 1, selection)
+
+        self._invalidate_cache([value])
+
+    # List methods that change positions discard the table indices.
+    # Cached attr_dicts are removed for the changed attributes or, for
+    # reordering methods, altogether.
+
+    def pop(self, *args):
+        self._table_indices = None
+        value = list.pop(self, *args)
+        self._invalidate_cache([value])
+        return value
+
+    def extend(self, iterable):
+        self._table_indices = None
+        values = list(iterable)
+        list.extend(self, values)
+        self._invalidate_cache(values)
+
+    def insert(self, index, value):
+        self._table_indices = None
+        list.insert(self, index, value)
+        self._invalidate_cache([value])
+
+    def remove(self, value):
+        self._table_indices = None
+        list.remove(self, value)
+        self._invalidate_cache([value])
+
+    def reverse(self):
+        self.clear_caches()
+        list.reverse(self)
+
+    def sort(self, *args, **kwargs):
+        self.clear_caches()
+        list.sort(self, *args, **kwargs)
+
+    def __setitem__(self, index, value):
+        self.clear_caches()
+        list.__setitem__(self, index, value)
+
+    def __delitem__(self, index):
+        self.clear_caches()
+        list.__delitem__(self, index)
+
+    def __setslice__(self, start, stop, values):
+        self.clear_caches()
+        list.__setslice__(self, start, stop, values)
+
+    def __delslice__(self, start, stop):
+        self.clear_caches()
+        list.__delslice__(self, start, stop)
+
+    def __iadd__(self, values):
+        self.clear_caches()
+        return list.__iadd__(self, values)
+
+    def shift(self, point, number, axis):
+        """Adjusts attributes to inserted or deleted rows, columns or tables
+
+        Selections are changed in place. Cached attr_dicts are moved with
+        their cells. Only cells that are deleted or that move into the
+        deleted range are resolved again.
+
+        Parameters
+        ----------
+        point: Integer
+        \tAt this point the rows, columns or tables are inserted or deleted
+        number: Integer
+        \tNumber of rows, columns or tables to be inserted, negative deletes
+        axis: Integer in 0, 1, 2
+        \tDefines whether rows, columns or tables are affected
+
+        """
+
+        if axis < 2:
+            for selection, _, _ in list.__iter__(self):
+                selection.insert(point, number, axis)
+
+        else:
+            for pos, (selection, tab, attr_dict) in \
+                    enumerate(list.__iter__(self)):
+                if tab > point:
+                    list.__setitem__(self, pos,
+                                     (selection, tab + number, attr_dict))
+
+        self._table_indices = None
+        self.changes += 1
+
+        # Cells up to keep_end are unchanged, cells after move_start move
+        keep_end = min(point, point + number)
+        move_start = max(point, point - number)
+
+        attr_cache = {}
+
+        for key, style in self._iter_cache():
+            if key[axis] > move_start:
+                key = list(key)
+                key[axis] += number
+
+            elif key[axis] > keep_end:
+                continue
+
+            row, col, tab = key
+            attr_cache.setdefault((tab, row), {})[col] = style
+
+        self._attr_cache = attr_cache
+
+    def _set_attributes(self, attributes):
+        """Replaces all attributes by attributes that yield equal formats
+
+        The attribute cache stays valid.
+
+        """
+
+        list.__setslice__(self, 0, len(self), attributes)
+        self._table_indices = None
+
+    def compact(self):
+        """Replaces attributes by a minimal list that yields equal formats
+
+        The replacement is undone together with the last undo step so that
+        the undo operations of earlier steps find the attributes that they
+        have changed.
+
+        Returns number of removed attributes.
+
+        """
+
+        attributes = list(list.__iter__(self))
+
+        compacted_attributes = \
+            get_compacted_attributes(attributes, self.default_cell_attributes,
+                                     self.config_attribute_keys)
+
+        if compacted_attributes == attributes:
+            return 0
+
+        undo_operation = (self._set_attributes, [attributes])
+        redo_operation = (self._set_attributes, [compacted_attributes])
+
+        self.unredo.append_to_last_step(undo_operation, redo_operation)
+
+        self._set_attributes(compacted_attributes)
+
+        return len(attributes) - len(compacted_attributes)
+
+    def undoable_append(self, value):
+        """Appends item to list and provides undo and redo functionality"""
+
+        undo_operation = (self.pop, [])
+        redo_operation = (self.undoable_append, [value])
+
+        self.unredo.append(undo_operation, redo_operation)
+
+        self.unredo.mark()
+
+        self.append(value)
+
+    def __getitem__(self, key):
+        """Returns shared read only attribute dict for a single key"""
+
+        assert not any(type(key_ele) is SliceType for key_ele in key)
+
+        row, col, tab = key
+
+        try:
+            return self._attr_cache[tab, row][col]
+
+        except KeyError:
+            pass
+
+        attributes = {}
+
+        table_index = self._get_table_index(tab)
+
+        if table_index is not None:
+            # Positions are ascending so that the last attribute wins
+            for pos in table_index.get_positions(row, col):
+                attributes.update(list.__getitem__(self, pos)[2])
+
+        style = self._style_pool.get_style(attributes)
+
+        self._attr_cache.setdefault((tab, row), {})[col] = style
+
+        return style
+
+# End of class CellAttributes
+
+
+class ParserMixin(object):
+    """Provides parser methods for DictGrid"""
+
+    def _split_tidy(self, string, maxsplit=None):
+        """Rstrips string for \n and splits string for \t"""
+
+        if maxsplit is None:
+            return string.rstrip("\n").split("\t")
+        else:
+            return string.rstrip("\n").split("\t", maxsplit)
+
+    def _get_key(self, *keystrings):
+        """Returns int key tuple from key string list"""
+
+        return tuple(imap(int, keystrings))
+
+    def parse_to_shape(self, line):
+        """Parses line and adjusts grid shape"""
+
+        self.shape = self._get_key(*self._split_tidy(line))
+
+    def parse_to_grid(self, line):
+        """Parses line and inserts grid data"""
+
+        row, col, tab, code = self._split_tidy(line, maxsplit=3)
+        key = self._get_key(row, col, tab)
+
+        self[key] = unicode(code, encoding='utf-8')
+
+    def parse_to_literal(self, line):
+        """Parses line and inserts literal cell value"""
+
+        row, col, tab, type_name, value_str = \
+            self._split_tidy(unicode(line, encoding='utf-8'), maxsplit=4)
+        key = self._get_key(row, col, tab)
+
+        self[key] = strings_to_literal(type_name, value_str)
+
+    def parse_to_attribute(self, line):
+        """Parses line and appends cell attribute"""
+
+        splitline = self._split_tidy(line)
+
+        selection_data = map(ast.literal_eval, splitline[:5])
+        selection = Selection(*selection_data)
+
+        tab = int(splitline[5])
+
+        attrs = {}
+        for col, ele in enumerate(splitline[6:]):
+            if not (col % 2):
+                # Odd entries are keys
+                key = ast.literal_eval(ele)
+
+            else:
+                # Even cols are values
+                attrs[key] = ast.literal_eval(ele)
+
+        self.cell_attributes.append((selection, tab, attrs))
+
+    def parse_to_height(self, line):
+        """Parses line and inserts row hight"""
+
+        # Split with maxsplit 3
+        row, tab, height = self._split_tidy(line)
+        key = self._get_key(row, tab)
+
+        self.row_heights[key] = float(height)
+
+    def parse_to_width(self, line):
+        """Parses line and inserts column width"""
+
+        # Split with maxsplit 3
+        col, tab, width = self._split_tidy(line)
+        key = self._get_key(col, tab)
+
+        self.col_widths[key] = float(width)
+
+    def parse_to_macro(self, line):
+        """Appends line to macro"""
+
+        self.macros += line
+
+# End of class ParserMixin
+
+
+class StringGeneratorMixin(object):
+    """String generation methods for DictGrid"""
+
+    def grid_to_strings(self):
+        """Yields a string that represents the grid content for saving
+
+        Format
+        ------
+        [shape]
+        rows\tcols\ttabs\n
+        [grid]
+        row\tcol\ttab\tcode\n
+        row\tcol\ttab\tcode\n
+        ...
+        [literals]
+        row\tcol\ttab\ttype\tvalue\n
+        ...
+
+        The literals section is left out if there are no literal cells.
+
+        """
+
+        yield u"[shape]\n"
+        yield u"\t".join(map(unicode, self.shape)) + u"\n"
+
+        yield u"[grid]\n"
+
+        literal_keys = []
+
+        for key in self:
+            code = self[key]
+
+            if is_literal(code):
+                literal_keys.append(key)
+                continue
+
+            key_str = u"\t".join(repr(ele) for ele in key)
+            code_str = unicode(code)
+
+            yield key_str + u"\t" + code_str + u"\n"
+
+        if literal_keys:
+            yield u"[literals]\n"
+
+        for key in literal_keys:
+            key_str = u"\t".join(repr(ele) for ele in key)
+            type_name, value_str = literal_to_strings(self[key])
+
+            yield key_str + u"\t" + type_name + u"\t" + value_str + u"\n"
+
+    def attributes_to_strings(self):
+        """Yields a string that represents the cell attributes for saving
+
+        Format
+        ------
+
+        [attributes]
+        selection[0]\t...\tselection[5]\ttab\tkey\tvalue\t...\tkey\tvalue\n
+        ...
+
+        """
+
+        yield u"[attributes]\n"
+
+        for selection, tab, attr_dict in self.cell_attributes:
+            sel_list = [selection.block_tl, selection.block_br,
+                        selection.rows, selection.cols, selection.cells]
+
+            tab_list = [tab]
+
+            attr_dict_list = []
+            for key in attr_dict:
+                attr_dict_list.append(key)
+                attr_dict_list.append(attr_dict[key])
+
+            line_list = map(repr, sel_list + tab_list + attr_dict_list)
+
+            yield u"\t".join(line_list) + u"\n"
+
+    def heights_to_strings(self):
+        """Yields a string that represents the row heights for saving
+
+        Format
+        ------
+
+        [row_heights]
+        row\ttab\tvalue\n
+        ...
+
+        """
+
+        yield u"[row_heights]\n"
+
+        for row, tab in self.row_heights:
+            height = self.row_heights[(row, tab)]
+            height_strings = map(repr, [row, tab, height])
+            yield u"\t".join(height_strings) + u"\n"
+
+    def widths_to_strings(self):
+        """Yields a string that represents the column widths for saving
+
+        Format
+        ------
+
+        [col_widths]
+        col\ttab\tvalue\n
+        ...
+
+        """
+
+        yield u"[col_widths]\n"
+
+        for col, tab in self.col_widths:
+            width = self.col_widths[(col, tab)]
+            width_strings = map(repr, [col, tab, width])
+            yield u"\t".join(width_strings) + u"\n"
+
+    def macros_to_strings(self):
+        """Yields a string that represents the content for saving
+
+        Format
+        ------
+
+        [macros]
+        Macro code
+
+        """
+
+        yield u"[macros]\n"
+
+        for line in self.macros.split("\n"):
+            yield line + u"\n"
+
+# End of class StringGeneratorMixin
+
+
+class DictGrid(KeyValueStore, ParserMixin, StringGeneratorMixin):
+    """The core data class with all information that is stored in a pys file.
+
+    Besides grid code access via standard dict operations, it provides
+    the following attributes:
+
+    * cell_attributes: Stores cell formatting attributes
+    * macros:          String of all macros
+
+    This class represents layer 1 of the model.
+
+    Parameters
+    ----------
+    shape: n-tuple of integer
+    \tShape of the grid
+
+    """
+
+    def __init__(self, shape):
+        super(DictGrid, self).__init__()
+
+        self.shape = shape
+
+        self.cell_attributes = CellAttributes()
+
+        self.macros = u""
+
+        self.row_heights = CellSizes()  # Keys have the format (row, table)
+        self.col_widths = CellSizes()  # Keys have the format (col, table)
+
+    def __getitem__(self, key):
+
+        shape = self.shape
+
+        for axis, key_ele in enumerate(key):
+            if shape[axis] <= key_ele or key_ele < -shape[axis]:
+                msg = "Grid index {} outside grid shape {}.".format(key, shape)
+                raise IndexError(msg)
+
+        return super(DictGrid, self).__getitem__(key)
+
+    def snapshot(self):
+        """Returns read-only DictGridSnapshot of the current grid
+
+        Unloaded tables are loaded.
+
+        """
+
+        self._load_tables()
+
+        snapshot = DictGridSnapshot(self)
+
+        self._snapshots.append(weakref.ref(snapshot))
+
+        return snapshot
+
+# End of class DictGrid
+
+
+class DictGridSnapshot(KeyValueSnapshot, StringGeneratorMixin):
+    """Read-only copy-on-write snapshot of a DictGrid
+
+    Cells are shared with the grid until they change. Shape, macros,
+    row heights, column widths and cell attributes are copied. The
+    snapshot provides the string generators for saving.
+
+    Parameters
+    ----------
+    dict_grid: DictGrid
+    \tGrid, of which the snapshot is taken
+
+    """
+
+    def __init__(self, dict_grid):
+        KeyValueSnapshot.__init__(self, dict_grid)
+
+        self.shape = dict_grid.shape
+        self.macros = dict_grid.macros
+
+        self.row_heights = dict_grid.row_heights.copy()
+        self.col_widths = dict_grid.col_widths.copy()
+
+        self.cell_attributes = CellAttributes(
+            (copy(selection), tab, attr_dict.copy())
+            for selection, tab, attr_dict in dict_grid.cell_attributes)
+
+# End of class DictGridSnapshot
+
+# -----------------------------------------------------------------------------
+
+
+class CellItems(object):
+    """Sparse iteration over the non-empty cells of a DataArray
+
+    Indexing yields key and value of each non-empty cell, e.g.
+    S.items[:, 0, 0] in cell code yields the results of all non-empty
+    cells in the first column of the first table.
+
+    Parameters
+    ----------
+    data_array: DataArray
+    \tDataArray, whose cells are iterated over
+
+    """
+
+    def __init__(self, data_array):
+        self.data_array = data_array
+
+    def __getitem__(self, key):
+        return self.data_array.iteritems(key)
+
+    __call__ = __getitem__
+
+# End of class CellItems
+
+
+class MaskedCells(object):
+    """Typed access to the results of the cells of a CodeArray
+
+    Indexing returns an int64 or float64 numpy.ma array for numeric
+    results, in which empty cells are masked, e.g.
+    numpy.sum(S.masked[:, 0, 0]) in cell code sums up a sparse column.
+    Other results are returned as by S.
+
+    Parameters
+    ----------
+    code_array: CodeArray
+    \tCodeArray, whose cells are read
+
+    """
+
+    def __init__(self, code_array):
+        self.code_array = code_array
+
+    def __getitem__(self, key):
+        return self.code_array.get_masked_array(key)
+
+    __call__ = __getitem__
+
+# End of class MaskedCells
+
+# -----------------------------------------------------------------------------
+
+
+class DataArray(object):
+    """DataArray provides enhanced grid read/write access.
+
+    Enhancements comprise:
+     * Slicing
+     * Multi-dimensional operations such as insertion and deletion along 1 axis
+     * Undo/redo operations
+
+    This class represents layer 2 of the model.
+
+    Parameters
+    ----------
+    shape: n-tuple of integer
+    \tShape of the grid
+    dict_grid_class: DictGrid subclass, defaults to DictGrid
+    \tClass of the grid store, e.g. a disk based DictGrid
+
+    """
+
+    def __init__(self, shape, dict_grid_class=DictGrid):
+        self.dict_grid = dict_grid_class(shape)
+
+        # Undo and redo management
+        self.unredo = UnRedo()
+        self.dict_grid.cell_attributes.unredo = self.unredo
+
+        # Safe mode
+        self.safe_mode = False
+
+    # Row and column attributes mask
+    # Keys have the format (row, table)
+
+    @property
+    def row_heights(self):
+        """Returns row_heights dict"""
+
+        return self.dict_grid.row_heights
+
+    @property
+    def col_widths(self):
+        """Returns col_widths dict"""
+
+        return self.dict_grid.col_widths
+
+    # Cell attributes mask
+    @property
+    def cell_attributes(self):
+        """Returns cell_attributes list"""
+
+        return self.dict_grid.cell_attributes
+
+    def __iter__(self):
         """Returns iterator over self.dict_grid"""
 
-        return iter(self.dict_grid)
+        return iter(self.dict_grid)
+
+    def _get_macros(self):
+        """Returns macros string"""
+
+        return self.dict_grid.macros
+
+    def _set_macros(self, macros):
+        """Sets  macros string"""
+
+        self.dict_grid.macros = macros
+
+    macros = property(_get_macros, _set_macros)
+
+    def keys(self):
+        """Returns keys in self.dict_grid"""
+
+        return self.dict_grid.keys()
+
+    def pop(self, key):
+        """Pops dict_grid with undo and redo support"""
+
+        # UnRedo support
+
+        try:
+            undo_operation = (self.__setitem__, [key, self.dict_grid[key]])
+            redo_operation = (self.pop, [key])
+
+            self.unredo.append(undo_operation, redo_operation)
+
+            self.unredo.mark()
+
+        except KeyError:
+            # If key not present then unredo is not necessary
+            pass
+
+        # End UnRedo support
+
+        return self.dict_grid.pop(key)
+
+    # Shape mask
+
+    def _get_shape(self):
+        """Returns dict_grid shape"""
+
+        return self.dict_grid.shape
+
+    def _set_shape(self, shape):
+        """Deletes all cells beyond new shape and sets dict_grid shape
+
+        Only the cells beyond the new shape are visited. They are deleted
+        together with the shape change in one undo step.
+
+        """
+
+        # Delete the cells that are beyond new borders
+
+        old_shape = self.shape
+
+        deleted_keys = set()
+
+        for axis, (new_axis, old_axis) in enumerate(zip(shape, old_shape)):
+            if new_axis < old_axis:
+                start = [None] * len(shape)
+                start[axis] = new_axis
+
+                deleted_keys.update(self.dict_grid.iterkeys_in_range(start))
+
+        if deleted_keys:
+            dict_grid = self.dict_grid
+            old_items = dict((key, dict_grid[key]) for key in deleted_keys)
+
+            self._set_items(dict.fromkeys(deleted_keys), old_items)
+
+        # Set dict_grid shape attribute
+
+        self.dict_grid.shape = shape
+
+        # UnRedo support
+
+        undo_operation = (setattr, [self.dict_grid, "shape", old_shape])
+        redo_operation = (setattr, [self.dict_grid, "shape", shape])
+
+        self.unredo.append(undo_operation, redo_operation)
+
+        self.unredo.mark()
+
+        # End UnRedo support
+
+    shape = property(_get_shape, _set_shape)
+
+    # Pickle support
+
+    def __getstate__(self):
+        """Returns dict_grid for pickling
+
+        Note that all persistent data is contained in the DictGrid class
+
+        """
+
+        return {"dict_grid": self.dict_grid}
+
+    def __str__(self):
+        return self.dict_grid.__str__()
+
+    # Slice support
+
+    def __getitem__(self, key):
+        """Adds slicing access to cell code retrieval
+
+        The cells are returned as a generator of generators, of ... of unicode.
+
+        Parameters
+        ----------
+        key: n-tuple of integer or slice
+        \tKeys of the cell code that is returned
+
+        Note
+        ----
+        Classical Excel type addressing (A$1, ...) may be added here
+
+        """
+
+        for key_ele in key:
+            if type(key_ele) is IntType:
+                # Fast path for single cell keys
+                continue
+
+            elif is_slice_like(key_ele):
+                # We have something slice-like here
+
+                return self.cell_array_generator(key)
+
+            elif is_string_like(key_ele):
+                # We have something string-like here
+                msg = "Cell string based access not implemented"
+                raise NotImplementedError(msg)
+
+        # key_ele should be a single cell
+
+        return self.dict_grid[key]
+
+    def __setitem__(self, key, value):
+        """Accepts index and slice keys"""
+
+        single_keys_per_dim = []
+
+        for axis, key_ele in enumerate(key):
+            if is_slice_like(key_ele):
+                # We have something slice-like here
+
+                length = key[axis]
+                slice_range = xrange(*key_ele.indices(length))
+                single_keys_per_dim.append(slice_range)
+
+            elif is_string_like(key_ele):
+                # We have something string-like here
+
+                raise NotImplementedError
+
+            else:
+                # key_ele is a single cell
+
+                single_keys_per_dim.append((key_ele, ))
+
+        single_keys = product(*single_keys_per_dim)
+
+        unredo_mark = False
+
+        for single_key in single_keys:
+            if value or is_literal(value):
+                # UnRedo support
+
+                old_value = DataArray.__getitem__(self, key)
+
+                try:
+                    old_value = unicode(old_value, encoding="utf-8")
+                except TypeError:
+                    pass
+
+                # We seem to have double calls on __setitem__
+                # This hack catches them
+
+                if old_value != value:
+
+                    unredo_mark = True
+
+                    undo_operation = (self.__setitem__, [key, old_value])
+                    redo_operation = (self.__setitem__, [key, value])
+
+                    self.unredo.append(undo_operation, redo_operation)
+
+                    # End UnRedo support
+
+                self.dict_grid[single_key] = value
+            else:
+                # Value is empty --> delete cell
+                try:
+                    self.dict_grid.pop(key)
+
+                except (KeyError, TypeError):
+                    pass
+
+        if unredo_mark:
+            self.unredo.mark()
+
+    def set_many(self, items):
+        """Sets code of many cells in one undo step
+
+        Cells with empty code are deleted. Literal values, e.g. numbers,
+        are stored as literal cells. All keys are checked against the grid
+        shape before any cell is changed.
+
+        Returns number of changed cells.
+
+        Parameters
+        ----------
+        items: Iterable of 2-tuples of key and code or literal
+        \tKeys are 3-tuples of non-negative Integer
+
+        """
+
+        rows, cols, tabs = shape = self.shape
+
+        new_items = {}
+
+        for key, value in items:
+            row, col, tab = key
+
+            if not (0 <= row < rows and 0 <= col < cols and 0 <= tab < tabs):
+                msg = "Grid index {} outside grid shape {}.".format(key,
+                                                                    shape)
+                raise IndexError(msg)
+
+            new_items[key] = value if value or is_literal(value) else None
+
+        dict_grid = self.dict_grid
+        old_items = {}
+
+        for key, value in new_items.items():
+            old_value = dict_grid.get(key)
+
+            if old_value == value and type(old_value) is type(value):
+                del new_items[key]
+
+            else:
+                old_items[key] = old_value
+
+        if new_items:
+            self._set_items(new_items, old_items)
+            self.unredo.mark()
+
+        return len(new_items)
+
+    def _set_items(self, items, old_items):
+        """Sets items in dict_grid, undo restores old_items as a whole
+
+        Parameters
+        ----------
+        items: Dict
+        \tMaps keys to code, None deletes the cell
+        old_items: Dict
+        \tMaps the same keys to the code before the change
+
+        """
+
+        dict_grid = self.dict_grid
+
+        for key, value in items.iteritems():
+            if value is None:
+                dict_grid.pop(key, None)
+
+            else:
+                dict_grid[key] = value
+
+        # Make undoable
+
+        undo_operation = (self._set_items, [old_items, items])
+        redo_operation = (self._set_items, [items, old_items])
+
+        self.unredo.append(undo_operation, redo_operation)
+
+    def cell_array_generator(self, key):
+        """Generator traversing cells specified in key
+
+        Parameters
+        ----------
+        key: Iterable of Integer or slice
+        \tThe key specifies the cell keys of the generator
+
+        """
+
+        for i, key_ele in enumerate(key):
+
+            # Get first element of key that is a slice
+            if type(key_ele) is SliceType:
+                slc_keys = xrange(*key_ele.indices(self.dict_grid.shape[i]))
+                key_list = list(key)
+
+                key_list[i] = None
+
+                has_subslice = any(type(ele) is SliceType for ele in key_list)
+
+                for slc_key in slc_keys:
+                    key_list[i] = slc_key
+
+                    if has_subslice:
+                        # If there is a slice left yield generator
+                        yield self.cell_array_generator(key_list)
+
+                    else:
+                        # No slices? Yield value
+                        yield self[tuple(key_list)]
+
+                break
+
+    def _get_populated_keys(self, key):
+        """Returns list of keys of non-empty cells in key
+
+        The keys are ordered as in cell_array_generator.
+
+        Parameters
+        ----------
+        key: Iterable of Integer or slice
+        \tThe key specifies the cells
+
+        """
+
+        start = []
+        stop = []
+        anchors = []
+
+        for axis, key_ele in enumerate(key):
+            if type(key_ele) is SliceType:
+                first, last, step = key_ele.indices(self.shape[axis])
+
+                if step > 0:
+                    lower, upper = first, last
+                else:
+                    lower, upper = last + 1, first + 1
+
+                if lower >= upper:
+                    return []
+
+                start.append(lower)
+                stop.append(upper)
+                anchors.append((axis, first, step))
+
+            elif is_string_like(key_ele):
+                msg = "Cell string based access not implemented"
+                raise NotImplementedError(msg)
+
+            else:
+                start.append(key_ele)
+                stop.append(key_ele + 1)
+
+        keys = [cell_key for cell_key in
+                self.dict_grid.iterkeys_in_range(start, stop)
+                if all((cell_key[axis] - first) % step == 0
+                       for axis, first, step in anchors)]
+
+        signs = [1] * len(start)
+
+        for axis, __, step in anchors:
+            if step < 0:
+                signs[axis] = -1
+
+        keys.sort(key=lambda cell_key: [ele * sign for ele, sign
+                                        in zip(cell_key, signs)])
+
+        return keys
+
+    def iteritems(self, key=None):
+        """Yields key and value of each non-empty cell in key
+
+        The cost depends on the number of non-empty cells and not on the
+        number of cells in key. Cells are yielded in the order of
+        cell_array_generator.
+
+        Parameters
+        ----------
+        key: Iterable of Integer or slice, defaults to None
+        \tThe key specifies the cells, None means all cells
+
+        """
+
+        if key is None:
+            key = (slice(None),) * len(self.shape)
+
+        for cell_key in self._get_populated_keys(key):
+            yield cell_key, self[cell_key]
+
+    @property
+    def items(self):
+        """CellItems for sparse iteration, e.g. items[:, 0, 0]"""
+
+        return CellItems(self)
+
+    def _adjust_shape(self, amount, axis):
+        """Changes shape along axis by amount"""
+
+        new_shape = list(self.shape)
+        new_shape[axis] += amount
+
+        self.shape = tuple(new_shape)
+
+    def _set_cell_attributes(self, value):
+        """Setter for cell_atributes"""
+
+        while len(self.cell_attributes):
+            self.cell_attributes.pop()
+        self.cell_attributes.extend(value)
+
+    def _adjust_cell_attributes(self, insertion_point, no_to_insert, axis):
+        """Adjusts cell attributes on insertion/deletion"""
+
+        assert axis in [0, 1, 2]
+
+        self.cell_attributes.shift(insertion_point, no_to_insert, axis)
+
+        # Make undoable
+
+        undo_operation = (self._adjust_cell_attributes,
+                          [insertion_point, -no_to_insert, axis])
+        redo_operation = (self._adjust_cell_attributes,
+                          [insertion_point, no_to_insert, axis])
+
+        self.unredo.append(undo_operation, redo_operation)
+
+    def _get_cell_sizes(self, axis):
+        """Returns list of CellSizes and their axes that axis shifts"""
+
+        if axis == 0:
+            return [(self.row_heights, 0)]
+
+        elif axis == 1:
+            return [(self.col_widths, 0)]
+
+        return [(self.row_heights, 1), (self.col_widths, 1)]
+
+    def _insert_cell_sizes(self, insertion_point, no_to_insert, axis,
+                           items=None):
+        """Inserts rows/cols/tabs into row heights and col widths
+
+        No size is moved. The insertion is undone as a whole.
+
+        Parameters
+        ----------
+        insertion_point: Integer
+        \tPoint on axis, before which insertion takes place
+        no_to_insert: Integer >= 0
+        \tNumber of rows/cols/tabs that are inserted
+        axis: Integer
+        \tSpecifies number of dimension, i.e. 0 == row, 1 == col, ...
+        items: List of dict, defaults to None
+        \tSizes that are set after insertion for each of _get_cell_sizes
+
+        """
+
+        cell_sizes_list = self._get_cell_sizes(axis)
+
+        for i, (cell_sizes, sizes_axis) in enumerate(cell_sizes_list):
+            cell_sizes.insert(insertion_point, no_to_insert, sizes_axis)
+
+            if items:
+                cell_sizes.update(items[i])
+
+        # Make undoable
+
+        undo_operation = (self._delete_cell_sizes,
+                          [insertion_point, no_to_insert, axis])
+        redo_operation = (self._insert_cell_sizes,
+                          [insertion_point, no_to_insert, axis, items])
+
+        self.unredo.append(undo_operation, redo_operation)
+
+    def _delete_cell_sizes(self, deletion_point, no_to_delete, axis):
+        """Deletes rows/cols/tabs from row heights and col widths
+
+        Only the deleted sizes are touched. The deletion is undone as a
+        whole.
+
+        Parameters
+        ----------
+        deletion_point: Integer
+        \tFirst row/col/tab that is deleted
+        no_to_delete: Integer >= 0
+        \tNumber of rows/cols/tabs that are deleted
+        axis: Integer
+        \tSpecifies number of dimension, i.e. 0 == row, 1 == col, ...
+
+        """
+
+        items = [cell_sizes.delete(deletion_point, no_to_delete, sizes_axis)
+                 for cell_sizes, sizes_axis in self._get_cell_sizes(axis)]
+
+        # Make undoable
+
+        undo_operation = (self._insert_cell_sizes,
+                          [deletion_point, no_to_delete, axis, items])
+        redo_operation = (self._delete_cell_sizes,
+                          [deletion_point, no_to_delete, axis])
+
+        self.unredo.append(undo_operation, redo_operation)
+
+    def _insert_grid(self, insertion_point, no_to_insert, axis, items=None):
+        """Inserts empty rows/cols/tabs into dict_grid and sets items
+
+        No cell is moved. The insertion is undone as a whole.
+
+        Parameters
+        ----------
+        insertion_point: Integer
+        \tPoint on axis, before which insertion takes place
+        no_to_insert: Integer >= 0
+        \tNumber of rows/cols/tabs that are inserted
+        axis: Integer
+        \tSpecifies number of dimension, i.e. 0 == row, 1 == col, ...
+        items: Dict, defaults to None
+        \tItems that are set after insertion, e.g. cells of undone deletion
+
+        """
+
+        self.dict_grid.insert(insertion_point, no_to_insert, axis)
+
+        if items:
+            self.dict_grid.update(items)
+
+        # Make undoable
+
+        undo_operation = (self._delete_grid,
+                          [insertion_point, no_to_insert, axis])
+        redo_operation = (self._insert_grid,
+                          [insertion_point, no_to_insert, axis, items])
+
+        self.unredo.append(undo_operation, redo_operation)
+
+    def _delete_grid(self, deletion_point, no_to_delete, axis):
+        """Deletes rows/cols/tabs from dict_grid
+
+        Only the deleted cells are touched. The deletion is undone as a
+        whole.
+
+        Parameters
+        ----------
+        deletion_point: Integer
+        \tFirst row/col/tab that is deleted
+        no_to_delete: Integer >= 0
+        \tNumber of rows/cols/tabs that are deleted
+        axis: Integer
+        \tSpecifies number of dimension, i.e. 0 == row, 1 == col, ...
+
+        """
+
+        items = self.dict_grid.delete(deletion_point, no_to_delete, axis)
+
+        # Make undoable
+
+        undo_operation = (self._insert_grid,
+                          [deletion_point, no_to_delete, axis, items])
+        redo_operation = (self._delete_grid,
+                          [deletion_point, no_to_delete, axis])
+
+        self.unredo.append(undo_operation, redo_operation)
+
+    def insert(self, insertion_point, no_to_insert, axis):
+        """Inserts no_to_insert rows/cols/tabs/... before insertion_point
+
+        Parameters
+        ----------
+
+        insertion_point: Integer
+        \tPont on axis, before which insertion takes place
+        no_to_insert: Integer >= 0
+        \tNumber of rows/cols/tabs that shall be inserted
+        axis: Integer
+        \tSpecifies number of dimension, i.e. 0 == row, 1 == col, ...
+
+        """
+
+        if not 0 <= axis <= len(self.shape):
+            raise ValueError("Axis not in grid dimensions")
 
-    def _get_macros(self):
-        """Returns macros string"""
+        if insertion_point > self.shape[axis] or \
+           insertion_point <= -self.shape[axis]:
+            raise IndexError("Insertion point not in grid")
 
-        return self.dict_grid.macros
+        self._insert_grid(insertion_point, no_to_insert, axis)
 
-    def _set_macros(self, macros):
-        """Sets  macros string"""
+        self._insert_cell_sizes(insertion_point, no_to_insert, axis)
 
-        self.dict_grid.macros = macros
+        self._adjust_cell_attributes(insertion_point, no_to_insert, axis)
 
-    macros = property(_get_macros, _set_macros)
+        self._adjust_shape(no_to_insert, axis)
 
-    def keys(self):
-        """Returns keys in self.dict_grid"""
+    def delete(self, deletion_point, no_to_delete, axis):
+        """Deletes no_to_delete rows/cols/... starting with deletion_point
 
-        return self.dict_grid.keys()
+        Axis specifies number of dimension, i.e. 0 == row, 1 == col, ...
 
-    def pop(self, key):
-        """Pops dict_grid with undo and redo support"""
+        """
 
-        # UnRedo support
+        if no_to_delete < 0:
+            raise ValueError("Cannot delete negative number of rows/cols/...")
+
+        if not 0 <= axis <= len(self.shape):
+            raise ValueError("Axis not in grid dimensions")
+
+        if deletion_point > self.shape[axis] or \
+           deletion_point <= -self.shape[axis]:
+            raise IndexError("Deletion point not in grid")
+
+        self._delete_grid(deletion_point, no_to_delete, axis)
+
+        self._delete_cell_sizes(deletion_point, no_to_delete, axis)
+
+        self._adjust_cell_attributes(deletion_point, -no_to_delete, axis)
+
+        self._adjust_shape(-no_to_delete, axis)
+
+    def set_row_height(self, row, tab, height):
+        """Sets row height"""
 
         try:
-            undo_operation = (self.__setitem__, [key, self.dict_grid[key]])
-            redo_operation = (self.pop, [key])
+            old_height = self.row_heights[(row, tab)]
 
-            self.unredo.append(undo_operation, redo_operation)
+        except KeyError:
+            old_height = None
 
-            self.unredo.mark()
+        if height is None:
+            self.row_heights.pop((row, tab))
+
+        else:
+            self.row_heights[(row, tab)] = height
+
+        # Make undoable
+
+        undo_operation = (self.set_row_height, [row, tab, old_height])
+        redo_operation = (self.set_row_height, [row, tab, height])
+
+        self.unredo.append(undo_operation, redo_operation)
+
+    def set_col_width(self, col, tab, width):
+        """Sets column width"""
+
+        try:
+            old_width = self.col_widths[(col, tab)]
 
         except KeyError:
-            # If key not present then unredo is not necessary
-            pass
+            old_width = None
 
-        # End UnRedo support
+        if width is None:
+            self.col_widths.pop((col, tab))
 
-        return self.dict_grid.pop(key)
+        else:
+            self.col_widths[(col, tab)] = width
 
-    # Shape mask
+        # Make undoable
 
-    def _get_shape(self):
-        """Returns dict_grid shape"""
+        undo_operation = (self.set_col_width, [col, tab, old_width])
+        redo_operation = (self.set_col_width, [col, tab, width])
 
-        return self.dict_grid.shape
+        self.unredo.append(undo_operation, redo_operation)
 
-    def _set_shape(self, shape):
-        """Deletes all cells beyond new shape and sets dict_grid shape"""
+    # Element access via call
 
-        # Delete each cell that is beyond new borders
+    __call__ = __getitem__
 
-        old_shape = self.shape
+# End of class DataArray
 
-        if any(new_axis < old_axis
-               for new_axis, old_axis in zip(shape, old_shape)):
-            for key in self.dict_grid.keys():
-                if any(key_ele >= new_axis
-                       for key_ele, new_axis in zip(key, shape)):
-                    self.pop(key)
+# -----------------------------------------------------------------------------
 
-        # Set dict_grid shape attribute
 
-        self.dict_grid.shape = shape
+class CodeArray(DataArray):
+    """CodeArray provides objects when accessing cells via __getitem__
 
-        # UnRedo support
+    Cell code can be accessed via function call
 
-        undo_operation = (setattr, [self.dict_grid, "shape", old_shape])
-        redo_operation = (setattr, [self.dict_grid, "shape", shape])
+    This class represents layer 3 of the model.
 
-        self.unredo.append(undo_operation, redo_operation)
+    Parameters
+    ----------
+    shape: n-tuple of integer
+    \tShape of the grid
+    dict_grid_class: DictGrid subclass, defaults to DictGrid
+    \tClass of the grid store, e.g. a disk based DictGrid
 
-        self.unredo.mark()
+    """
 
-        # End UnRedo support
+    operators = ["+", "-", "*", "**", "/", "//",
+             "%", "<<", ">>", "&", "|", "^", "~",
+             "<", ">", "<=", ">=", "==", "!=", "<>",
+            ]
 
-    shape = property(_get_shape, _set_shape)
+    # Maximum number of compiled code objects in code_cache
+    max_code_cache_size = 100000
 
-    # Pickle support
+    # Maximum number of cells that _set_items invalidates one by one.
+    # Beyond, the whole result cache is reset.
+    max_invalidated_cells = 10000
 
-    def __getstate__(self):
-        """Returns dict_grid for pickling
+    def __init__(self, shape, dict_grid_class=DictGrid):
+        DataArray.__init__(self, shape, dict_grid_class)
 
-        Note that all persistent data is contained in the DictGrid class
+        # Cache for results from __getitem__ calls
+        self.result_cache = ResultCache(
+            max_entries=config["max_result_cache_entries"],
+            max_bytes=config["max_result_cache_bytes"])
+
+        # Cache for frozen objects
+        self.frozen_cache = {}
+
+        # Records which cells each cell evaluation reads
+        self.dependencies = DependencyTracker()
+
+        # Cache for compiled cell code. Maps code string to tuple of
+        # global variable name and code object
+        self.code_cache = {}
+
+        # Maps code string to code object for the keys of the cells
+        # that the code reads, see dependencies.get_reference_code
+        self.reference_cache = {}
+
+        # CellProfiler that records cell evaluations, None if disabled
+        self.profiler = None
+
+        # Maximum number of tables with cells in memory, None if unlimited
+        self.max_loaded_tables = config["max_loaded_tables"]
+
+        # Number of changes of cell code, cell positions and macros
+        self.code_changes = 0
+
+    def __setitem__(self, key, value):
+        """Sets cell code and invalidates dependent results"""
+
+        if any(type(key_ele) is SliceType for key_ele in key):
+            DataArray.__setitem__(self, key, value)
+
+            self.code_changes += 1
+
+            # Reset result cache
+            self.result_cache.clear()
+            self.dependencies.clear()
+
+            return
+
+        old_code = DataArray.__getitem__(self, key)
+
+        DataArray.__setitem__(self, key, value)
+
+        # Prevent unchanged cells from being recalculated on cursor movement
+        # Falsy literals such as 0 are present, equal values of another
+        # type such as True for 1 are changes.
+
+        is_old_present = bool(old_code) or is_literal(old_code)
+        is_present = bool(value) or is_literal(value)
+
+        if not is_old_present and not is_present or \
+           is_old_present and is_present and old_code == value and \
+           type(old_code) is type(value):
+            return
+
+        self.code_cache.pop(old_code, None)
+        self.reference_cache.pop(old_code, None)
+
+        self._invalidate(key, [old_code, value])
+
+    def __call__(self, key):
+        """Returns cell code and records the read for dependency tracking
+
+        Literal cells are returned as code that evaluates to their value.
 
         """
 
-        return {"dict_grid": self.dict_grid}
+        self.dependencies.add_read(key)
 
-    def __str__(self):
-        return self.dict_grid.__str__()
+        code = DataArray.__getitem__(self, key)
 
-    # Slice support
+        if is_literal(code):
+            return literal_to_code(code)
 
-    def __getitem__(self, key):
-        """Adds slicing access to cell code retrieval
+        return code
 
-        The cells are returned as a generator of generators, of ... of unicode.
+    def pop(self, key):
+        """Pops dict_grid with undo and redo support"""
+
+        code = DataArray.pop(self, key)
+
+        self._invalidate(key, [code])
+
+        return code
+
+    def iteritems(self, key=None):
+        """Yields key and result of each non-empty cell in key
+
+        The read of key is recorded so that results, which depend on the
+        non-empty cells in key, are invalidated if a cell in key changes.
 
         Parameters
         ----------
-        key: n-tuple of integer or slice
-        \tKeys of the cell code that is returned
+        key: Iterable of Integer or slice, defaults to None
+        \tThe key specifies the cells, None means all cells
 
-        Note
-        ----
-        Classical Excel type addressing (A$1, ...) may be added here
+        """
+
+        if key is None:
+            key = (slice(None),) * len(self.shape)
+
+        self.dependencies.add_read(tuple(key))
+
+        return DataArray.iteritems(self, key)
+
+    @property
+    def masked(self):
+        """MaskedCells for typed slices, e.g. masked[:, 0, 0]"""
+
+        return MaskedCells(self)
+
+    def get_masked_array(self, key):
+        """Returns results of key with empty cells masked for numeric results
+
+        The read of key is recorded as by __getitem__. Single cell keys
+        and reads in safe mode are passed to __getitem__.
+
+        Parameters
+        ----------
+        key: Tuple of Integer or slice
+        \tKey of the cells that are read
 
         """
 
-        for key_ele in key:
-            if is_slice_like(key_ele):
-                # We have something slice-like here
+        if self.safe_mode or \
+           all(type(key_ele) is not SliceType for key_ele in key):
+            return self[key]
 
-                return self.cell_array_generator(key)
+        self.dependencies.add_read(key)
 
-            elif is_string_like(key_ele):
-                # We have something string-like here
-                msg = "Cell string based access not implemented"
-                raise NotImplementedError(msg)
+        return self._get_slice_array(key, masked=True)
 
-        # key_ele should be a single cell
+    def _set_items(self, items, old_items):
+        """Sets items in dict_grid and invalidates dependent results once"""
 
-        return self.dict_grid[key]
+        DataArray._set_items(self, items, old_items)
 
-    def __setitem__(self, key, value):
-        """Accepts index and slice keys"""
+        self.code_changes += 1
 
-        single_keys_per_dim = []
+        has_assignment = False
 
-        for axis, key_ele in enumerate(key):
-            if is_slice_like(key_ele):
-                # We have something slice-like here
+        for code in chain(items.itervalues(), old_items.itervalues()):
+            if code and is_string_like(code) and not is_literal(code) and \
+               "=" in code and self._has_assignment(code.split("=")):
+                has_assignment = True
+                break
 
-                length = key[axis]
-                slice_range = xrange(*key_ele.indices(length))
-                single_keys_per_dim.append(slice_range)
+        if has_assignment or len(items) > self.max_invalidated_cells:
+            self.result_cache.clear()
+            self.dependencies.clear()
 
-            elif is_string_like(key_ele):
-                # We have something string-like here
+            return
 
-                raise NotImplementedError
+        result_cache = self.result_cache
 
-            else:
-                # key_ele is a single cell
+        for invalid_key in self.dependencies.invalidate_many(items,
+                                                             self.shape):
+            result_cache.pop(invalid_key)
 
-                single_keys_per_dim.append((key_ele, ))
+    def _insert_grid(self, insertion_point, no_to_insert, axis, items=None):
+        """Inserts into dict_grid and resets results of moved cells"""
 
-        single_keys = product(*single_keys_per_dim)
+        DataArray._insert_grid(self, insertion_point, no_to_insert, axis,
+                               items)
 
-        unredo_mark = False
+        self.code_changes += 1
 
-        for single_key in single_keys:
-            if value:
-                # UnRedo support
+        self._shift_frozen_cache(insertion_point, no_to_insert, axis)
 
-                old_value = self(key)
+        self.result_cache.clear()
+        self.dependencies.clear()
 
-                try:
-                    old_value = unicode(old_value, encoding="utf-8")
-                except TypeError:
-                    pass
+    def _delete_grid(self, deletion_point, no_to_delete, axis):
+        """Deletes from dict_grid and resets results of moved cells"""
 
-                # We seem to have double calls on __setitem__
-                # This hack catches them
+        DataArray._delete_grid(self, deletion_point, no_to_delete, axis)
 
-                if old_value != value:
+        self.code_changes += 1
 
-                    unredo_mark = True
+        self._shift_frozen_cache(deletion_point, -no_to_delete, axis)
 
-                    undo_operation = (self.__setitem__, [key, old_value])
-                    redo_operation = (self.__setitem__, [key, value])
+        self.result_cache.clear()
+        self.dependencies.clear()
 
-                    self.unredo.append(undo_operation, redo_operation)
+    def _shift_frozen_cache(self, point, amount, axis):
+        """Moves frozen results at or after point by amount along axis
 
-                    # End UnRedo support
+        Results of deleted cells, i.e. for negative amount cells from
+        point to point - amount, are removed.
 
-                self.dict_grid[single_key] = value
-            else:
-                # Value is empty --> delete cell
-                try:
-                    self.dict_grid.pop(key)
+        """
 
-                except (KeyError, TypeError):
-                    pass
+        shifted_items = []
 
-        if unredo_mark:
-            self.unredo.mark()
+        for key in self.frozen_cache.keys():
+            if key[axis] >= point:
+                result = self.frozen_cache.pop(key)
 
-    def cell_array_generator(self, key):
-        """Generator traversing cells specified in key
+                if amount >= 0 or key[axis] >= point - amount:
+                    new_key = list(key)
+                    new_key[axis] += amount
+                    shifted_items.append((tuple(new_key), result))
+
+        self.frozen_cache.update(shifted_items)
+
+    def activate_table(self, tab):
+        """Marks table as used and unloads tables that have not been used
+
+        Cells and cached results of tables beyond max_loaded_tables are
+        removed from memory. The cells are loaded back when they are
+        accessed. Returns list of unloaded tables.
 
         Parameters
         ----------
-        key: Iterable of Integer or slice
-        \tThe key specifies the cell keys of the generator
+        tab: Integer
+        \tTable that is used, e.g. displayed
 
         """
 
-        for i, key_ele in enumerate(key):
+        self.dict_grid.touch_table(tab)
 
-            # Get first element of key that is a slice
-            if type(key_ele) is SliceType:
-                slc_keys = xrange(*key_ele.indices(self.dict_grid.shape[i]))
-                key_list = list(key)
+        if self.max_loaded_tables is None:
+            return []
 
-                key_list[i] = None
+        unloaded_tables = \
+            self.dict_grid.unload_tables(self.max_loaded_tables)
 
-                has_subslice = any(type(ele) is SliceType for ele in key_list)
+        for unloaded_tab in unloaded_tables:
+            self.result_cache.pop_table(unloaded_tab)
 
-                for slc_key in slc_keys:
-                    key_list[i] = slc_key
+        return unloaded_tables
 
-                    if has_subslice:
-                        # If there is a slice left yield generator
-                        yield self.cell_array_generator(key_list)
+    def _invalidate(self, key, codes):
+        """Removes results of key and of its dependents from result cache
 
-                    else:
-                        # No slices? Yield value
-                        yield self[tuple(key_list)]
+        The whole result cache is reset if one of the codes is a global
+        assignment because other cells may access the global variable.
 
-                break
+        Parameters
+        ----------
+        key: Tuple of Integer
+        \tKey of the changed cell
+        codes: List of strings
+        \tOld and new code of the changed cell
 
-    def _adjust_shape(self, amount, axis):
-        """Changes shape along axis by amount"""
+        """
 
-        new_shape = list(self.shape)
-        new_shape[axis] += amount
+        self.code_changes += 1
 
-        self.shape = tuple(new_shape)
+        for code in codes:
+            if code and is_string_like(code) and not is_literal(code) and \
+               self._has_assignment(code.split("=")):
+                self.result_cache.clear()
+                self.dependencies.clear()
 
-    def _set_cell_attributes(self, value):
-        """Setter for cell_atributes"""
+                return
 
-        while len(self.cell_attributes):
-            self.cell_attributes.pop()
-        self.cell_attributes.extend(value)
+        result_cache = self.result_cache
 
-    def _adjust_cell_attributes(self, insertion_point, no_to_insert, axis):
-        """Adjusts cell attributes on insertion/deletion"""
+        for invalid_key in self.dependencies.invalidate(key, self.shape):
+            result_cache.pop(invalid_key)
 
-        assert axis in [0, 1, 2]
+    def __getitem__(self, key):
+        """Returns _eval_cell"""
 
-        if axis < 2:
-            # Adjust selections
-            for selection, _, _ in self.cell_attributes:
-                selection.insert(insertion_point, no_to_insert, axis)
+        self.dependencies.add_read(key)
 
-            self.cell_attributes._attr_cache.clear()
+        is_cell_key = all(type(k) is not SliceType for k in key)
 
-            # Adjust row heights and col widths
-            cell_sizes = self.col_widths if axis else self.row_heights
+        if is_cell_key:
+            # Literal cells are not evaluated
+            value = self.dict_grid[key]
 
-            new_sizes = {}
+            if is_literal(value):
+                return value
 
-            for pos, tab in cell_sizes:
-                if pos > insertion_point:
-                    new_sizes[(pos + no_to_insert, tab)] = \
-                        cell_sizes[(pos, tab)]
-                    cell_sizes[(pos, tab)] = None
+            # Frozen cell handling
+            frozen_res = self.cell_attributes[key]["frozen"]
+            if frozen_res:
+                if key in self.frozen_cache:
+                    return self.frozen_cache[key]
                 else:
-                    new_sizes[(pos, tab)] = cell_sizes[(pos, tab)]
+                    # Frozen cache is empty.
+                    # Maybe we have a reload without the frozen cache
+                    result = self._eval_cell(key)
+                    self.frozen_cache[key] = result
+                    return result
 
-            cell_sizes.update(new_sizes)
+        # Normal cell handling
 
-        elif axis == 2:
-            # Adjust tabs
-            new_tabs = []
-            for _, old_tab, _ in self.cell_attributes:
-                new_tabs.append(old_tab + no_to_insert \
-                                if old_tab > insertion_point else old_tab)
+        try:
+            result = self.result_cache[key]
 
-            for i, new_tab in new_tabs:
-                self.cell_attributes[i][1] = new_tab
+            if self.profiler is not None and is_cell_key:
+                self.profiler.add_hit(key)
 
-            self.cell_attributes._attr_cache.clear()
+        except KeyError:
+            code = self(key)
 
-        else:
-            raise ValueError("Axis must be in [0, 1, 2]")
+            if code is None:
+                return
 
-        # Make undoable
+            if not self.dependencies.stack and not is_generator_like(code):
+                # Outermost evaluation of a single cell
+                self._eval_precursors(key)
 
-        undo_operation = (self._adjust_cell_attributes,
-                          [insertion_point, -no_to_insert, axis])
-        redo_operation = (self._adjust_cell_attributes,
-                          [insertion_point, no_to_insert, axis])
+            result = self._eval_cell(key)
+            self.result_cache[key] = result
 
-        self.unredo.append(undo_operation, redo_operation)
+        if type(result) is CycleError and self.dependencies.stack and \
+           self.dependencies.stack[-1] is not None:
+            # Cells that read a cell in a cycle get the cycle error
+            raise result
 
-    def insert(self, insertion_point, no_to_insert, axis):
-        """Inserts no_to_insert rows/cols/tabs/... before insertion_point
+        return result
+
+    def _get_precursors(self, key):
+        """Returns keys of the cells that the code of key reads statically
+
+        Only reads of single cells with keys that are integer expressions
+        of X, Y, Z, R, C, T and integer literals are found.
+        Keys outside the grid are left out.
 
         Parameters
         ----------
-
-        insertion_point: Integer
-        \tPont on axis, before which insertion takes place
-        no_to_insert: Integer >= 0
-        \tNumber of rows/cols/tabs that shall be inserted
-        axis: Integer
-        \tSpecifies number of dimension, i.e. 0 == row, 1 == col, ...
+        key: Tuple of Integer
+        \tKey of the cell, whose code is analyzed
 
         """
 
-        if not 0 <= axis <= len(self.shape):
-            raise ValueError("Axis not in grid dimensions")
+        code = DataArray.__getitem__(self, key)
 
-        if insertion_point > self.shape[axis] or \
-           insertion_point <= -self.shape[axis]:
-            raise IndexError("Insertion point not in grid")
+        if not is_string_like(code) or is_literal(code):
+            return []
 
-        new_keys = {}
+        try:
+            reference_code = self.reference_cache[code]
 
-        for key in copy(self.dict_grid):
-            if key[axis] >= insertion_point:
-                new_key = list(key)
-                new_key[axis] += no_to_insert
+        except KeyError:
+            expression = self._split_assignment(code)[1]
+            reference_code = get_reference_code(expression)
 
-                new_keys[tuple(new_key)] = self.pop(key)
+            if len(self.reference_cache) >= self.max_code_cache_size:
+                self.reference_cache.clear()
 
-        self._adjust_shape(no_to_insert, axis)
+            self.reference_cache[code] = reference_code
 
-        for key in new_keys:
-            self[key] = new_keys[key]
+        if reference_code is None:
+            return []
 
-        self._adjust_cell_attributes(insertion_point, no_to_insert, axis)
+        row, col, tab = key
+        key_env = {'X': row, 'Y': col, 'Z': tab, 'R': row, 'C': col, 'T': tab}
 
-    def delete(self, deletion_point, no_to_delete, axis):
-        """Deletes no_to_delete rows/cols/... starting with deletion_point
+        shape = self.shape
 
-        Axis specifies number of dimension, i.e. 0 == row, 1 == col, ...
+        return [precursor for precursor in eval(reference_code, key_env)
+                if all(0 <= ele < length
+                       for ele, length in zip(precursor, shape))]
 
-        """
+    def _eval_precursors(self, key):
+        """Evaluates uncached precursors of key bottom-up
 
-        if no_to_delete < 0:
-            raise ValueError("Cannot delete negative number of rows/cols/...")
+        Precursors are found via _get_precursors transitively. An iterative
+        depth first search orders them so that each precursor is evaluated
+        after its own precursors. Therefore, long reference chains are
+        evaluated without deep recursion. Static cycles are skipped here.
+        They are detected when the cells are evaluated.
 
-        if not 0 <= axis <= len(self.shape):
-            raise ValueError("Axis not in grid dimensions")
+        Parameters
+        ----------
+        key: Tuple of Integer
+        \tKey of the cell that is going to be evaluated
 
-        if deletion_point > self.shape[axis] or \
-           deletion_point <= -self.shape[axis]:
-            raise IndexError("Deletion point not in grid")
+        """
 
-        # Store all keys that are moved here because dict iteration is unsorted
-        new_key_values = {}
+        dict_grid = self.dict_grid
+        result_cache = self.result_cache
 
-        # Note that the loop goes over a list that copies all dict keys
-        for key in self.dict_grid.keys():
-            if deletion_point <= key[axis] < deletion_point + no_to_delete:
-                self.pop(key)
+        visited = set([key])
+        stack = [(key, iter(self._get_precursors(key)))]
+        order = []
 
-            elif key[axis] >= deletion_point + no_to_delete:
-                new_key = list(key)
-                new_key[axis] -= no_to_delete
+        while stack:
+            node, precursors = stack[-1]
 
-                new_key_values[tuple(new_key)] = self.pop(key)
+            for precursor in precursors:
+                if precursor not in visited and precursor in dict_grid and \
+                   precursor not in result_cache:
+                    visited.add(precursor)
+                    stack.append((precursor,
+                                  iter(self._get_precursors(precursor))))
+                    break
 
-        self._adjust_cell_attributes(deletion_point, -no_to_delete, axis)
+            else:
+                stack.pop()
+                order.append(node)
 
-        self._adjust_shape(-no_to_delete, axis)
+        # The last node is key itself
+        order.pop()
 
-        # Now re-insert moved keys
+        # Precursors are no reads of the cell that is evaluated
+        self.dependencies.push(None)
 
-        for key in new_key_values:
-            self[key] = new_key_values[key]
+        try:
+            for precursor in order:
+                self[precursor]
 
-    def set_row_height(self, row, tab, height):
-        """Sets row height"""
+        finally:
+            self.dependencies.pop()
 
-        try:
-            old_height = self.row_heights[(row, tab)]
+    def _get_slice_array(self, key, masked=False):
+        """Returns numpy array of the results of the cells in slice key
 
-        except KeyError:
-            old_height = None
+        If all results are numeric then an int64 or float64 array is
+        returned. Otherwise, e. g. if there are empty cells, an object
+        array is returned. With masked, empty cells of numeric results
+        are masked instead.
 
-        if height is None:
-            self.row_heights.pop((row, tab))
+        Cells are evaluated as by __getitem__. Empty, literal and cached
+        cells are read directly. Frozen cells are read via __getitem__.
 
-        else:
-            self.row_heights[(row, tab)] = height
+        Parameters
+        ----------
+        key: Tuple of Integer or slice
+        \tKey that contains at least one slice
+        masked: Bool, defaults to False
+        \tReturn numpy.ma array for numeric results with empty cells
 
-        # Make undoable
+        """
 
-        undo_operation = (self.set_row_height, [row, tab, old_height])
-        redo_operation = (self.set_row_height, [row, tab, height])
+        axis_keys = []
+        shape = []
 
-        self.unredo.append(undo_operation, redo_operation)
+        for key_ele, length in zip(key, self.shape):
+            if type(key_ele) is SliceType:
+                indices = xrange(*key_ele.indices(length))
+                axis_keys.append(indices)
+                shape.append(len(indices))
 
-    def set_col_width(self, col, tab, width):
-        """Sets column width"""
+            else:
+                axis_keys.append([key_ele])
 
-        try:
-            old_width = self.col_widths[(col, tab)]
+        if 0 in shape:
+            # Nested lists end at the first empty axis
+            return numpy.empty(shape[:shape.index(0) + 1], dtype="O")
 
-        except KeyError:
-            old_width = None
+        stack = self.dependencies.stack
 
-        if width is None:
-            self.col_widths.pop((col, tab))
+        # Cell that reads the slice, None if it is read from outside
+        reader = stack[-1] if stack else None
 
-        else:
-            self.col_widths[(col, tab)] = width
+        # Precursors are evaluated for slices that no cell reads
+        is_outermost = not stack
 
-        # Make undoable
+        # Reads of slice cells are covered by the slice dependency
+        self.dependencies.push(None)
 
-        undo_operation = (self.set_col_width, [col, tab, old_width])
-        redo_operation = (self.set_col_width, [col, tab, width])
+        try:
+            results = self._get_slice_results(product(*axis_keys), reader,
+                                              is_outermost)
 
-        self.unredo.append(undo_operation, redo_operation)
+        finally:
+            self.dependencies.pop()
 
-    # Element access via call
+        array = self._get_typed_array(results, masked)
 
-    __call__ = __getitem__
+        if array is None:
+            # Fallback to object array
+            nested_results = results
 
-# End of class DataArray
+            for length in reversed(shape[1:]):
+                nested_results = [nested_results[i:i + length] for i in
+                                  xrange(0, len(nested_results), length)]
 
-# -----------------------------------------------------------------------------
+            return numpy.array(nested_results, dtype="O")
 
+        return array.reshape(shape)
 
-class CodeArray(DataArray):
-    """CodeArray provides objects when accessing cells via __getitem__
+    def _get_slice_results(self, cell_keys, reader, is_outermost):
+        """Returns list of the results of the cells with cell_keys
 
-    Cell code can be accessed via function call
+        Empty cells give None. __getitem__ is bypassed for each cell that
+        is not frozen.
 
-    This class represents layer 3 of the model.
+        Parameters
+        ----------
+        cell_keys: Iterable of Tuple of Integer
+        \tKeys of the cells of the slice
+        reader: Tuple of Integer or None
+        \tKey of the cell that reads the slice, None if none
+        is_outermost: Bool
+        \tEvaluate precursors of uncached cells first
 
-    """
+        """
 
-    operators = ["+", "-", "*", "**", "/", "//",
-             "%", "<<", ">>", "&", "|", "^", "~",
-             "<", ">", "<=", ">=", "==", "!=", "<>",
-            ]
+        dict_grid = self.dict_grid
+        result_cache = self.result_cache
+        profiler = self.profiler
+        frozen_tables = self.cell_attributes.get_key_tables("frozen")
 
-    # Cache for results from __getitem__ calls
-    result_cache = {}
+        results = []
 
-    # Cache for frozen objects
-    frozen_cache = {}
+        for cell_key in cell_keys:
+            value = dict_grid.get(cell_key)
 
-    def __setitem__(self, key, value):
-        """Sets cell code and resets result cache"""
+            if value is None or is_literal(value):
+                results.append(value)
+                continue
 
-        # Prevent unchanged cells from being recalculated on cursor movement
+            if cell_key[2] in frozen_tables and \
+               self.cell_attributes[cell_key]["frozen"]:
+                results.append(self[cell_key])
+                continue
 
-        repr_key = repr(key)
+            try:
+                result = result_cache[cell_key]
 
-        unchanged = (repr_key in self.result_cache and \
-                     value == self(key)) or \
-                    ((value is None or value == "") and \
-                     repr_key not in self.result_cache)
+                if profiler is not None:
+                    profiler.add_hit(cell_key)
 
-        DataArray.__setitem__(self, key, value)
+            except KeyError:
+                if is_outermost:
+                    self._eval_precursors(cell_key)
 
-        if not unchanged:
-            # Reset result cache
-            self.result_cache = {}
+                result = self._eval_cell(cell_key)
+                result_cache[cell_key] = result
 
-    def __getitem__(self, key):
-        """Returns _eval_cell"""
+            if type(result) is CycleError and reader is not None:
+                # Cells that read a cell in a cycle get the cycle error
+                raise result
 
-        # Frozen cell handling
-        if all(type(k) is not SliceType for k in key):
-            frozen_res = self.cell_attributes[key]["frozen"]
-            if frozen_res:
-                if repr(key) in self.frozen_cache:
-                    return self.frozen_cache[repr(key)]
-                else:
-                    # Frozen cache is empty.
-                    # Maybe we have a reload without the frozen cache
-                    result = self._eval_cell(key)
-                    self.frozen_cache[repr(key)] = result
-                    return result
+            results.append(result)
 
-        # Normal cell handling
+        return results
 
-        if repr(key) in self.result_cache:
-            return self.result_cache[repr(key)]
+    @staticmethod
+    def _get_typed_array(results, masked=False):
+        """Returns 1D int64 or float64 array or None if results not numeric
 
-        elif self(key) is not None:
-            result = self._eval_cell(key)
-            self.result_cache[repr(key)] = result
+        None is returned for empty results unless masked is True.
+
+        Parameters
+        ----------
+        results: List
+        \tCell results, None for empty cells
+        masked: Bool, defaults to False
+        \tReturn numpy.ma array, in which empty results are masked
+
+        """
 
-            return result
+        types = set(imap(type, results))
+        has_empty_cells = NoneType in types
+        types.discard(NoneType)
 
-    def _make_nested_list(self, gen):
-        """Makes nested list from generator for creating numpy.array"""
+        if not types or has_empty_cells and not masked:
+            return
 
-        res = []
+        dtype = numpy.int64
 
-        for ele in gen:
-            if ele is None:
-                res.append(None)
+        for result_type in types:
+            if result_type in (IntType, LongType) or \
+               issubclass(result_type, numpy.signedinteger):
+                continue
 
-            elif not is_string_like(ele) and is_generator_like(ele):
-                # Nested generator
-                res.append(self._make_nested_list(ele))
+            elif result_type is FloatType or \
+                 issubclass(result_type, numpy.floating):
+                dtype = numpy.float64
 
             else:
-                res.append(ele)
+                return
 
-        return res
+        try:
+            if has_empty_cells:
+                mask = [result is None for result in results]
+                data = [0 if result is None else result for result in results]
+                return numpy.ma.array(data, mask=mask, dtype=dtype)
+
+            return numpy.array(results, dtype=dtype)
+
+        except OverflowError:
+            return
 
     def _has_assignment(self, code):
         """Returns True iif  code is a global assignment
@@ -985,15 +3397,139 @@ class CodeArray(DataArray):
 
         return env
 
-    def _eval_cell(self, key):
-        """Evaluates one cell"""
+    def _split_assignment(self, code):
+        """Returns tuple of global variable name and expression string
 
-        # Set up environment for evaluation
+        The global variable name is None if code is no global assignment.
+
+        Parameters
+        ----------
+        code: String
+        \tCell code
+
+        """
+
+        # If only 1 term in front of the "=" --> global
+
+        split_exp = code.split("=")
+
+        if self._has_assignment(split_exp):
+            return split_exp[0].strip(), "=".join(split_exp[1:])
+
+        return None, code
+
+    def _get_code_object(self, code):
+        """Returns tuple of global variable name and compiled expression
+
+        The global variable name is None if code is no global assignment.
+        Code objects are cached by code string so that all cells with
+        identical code share one code object.
+        If the expression cannot be compiled then the expression string is
+        returned instead so that the error is raised on evaluation.
+
+        Parameters
+        ----------
+        code: String
+        \tCell code
+
+        """
+
+        try:
+            return self.code_cache[code]
+
+        except KeyError:
+            pass
+
+        glob_var, expression = self._split_assignment(code)
+
+        try:
+            code_object = compile(expression, "<string>", "eval")
+
+        except Exception:
+            return glob_var, expression
+
+        if len(self.code_cache) >= self.max_code_cache_size:
+            self.code_cache.clear()
+
+        self.code_cache[code] = glob_var, code_object
+
+        return glob_var, code_object
+
+    @staticmethod
+    def _has_nested_scopes(expression):
+        """Returns True if expression contains lambdas or generators
+
+        Nested scopes do not see the local namespace of the expression.
+        Therefore, they require the magic variables as globals.
+
+        Parameters
+        ----------
+        expression: Code object or string
+        \tCompiled cell expression
+
+        """
+
+        try:
+            consts = expression.co_consts
+
+        except AttributeError:
+            return False
+
+        return any(type(const) is CodeType for const in consts)
+
+    def _get_eval_namespaces(self, key, expression):
+        """Returns tuple of globals and locals for evaluating one cell
+
+        The module globals are shared by all cells. The magic variables
+        are provided in a small per cell locals dict that overlays them.
+        Only expressions with nested scopes get a copy of the globals
+        that is updated with the magic variables.
+
+        Parameters
+        ----------
+        key: Tuple of Integer
+        \tKey of the cell that is evaluated
+        expression: Code object or string
+        \tCompiled cell expression
+
+        """
 
         env_dict = {'X': key[0], 'Y': key[1], 'Z': key[2], 'bz2': bz2,
                     'base64': base64, 'chart': chart,
                     'R': key[0], 'C': key[1], 'T': key[2], 'S': self}
-        env = self._get_updated_environment(env_dict=env_dict)
+
+        if self._has_nested_scopes(expression):
+            return self._get_updated_environment(env_dict=env_dict), {}
+
+        return globals(), env_dict
+
+    def _eval_cell(self, key):
+        """Evaluates one cell and records the evaluation if profiling
+
+        Slice reads are not recorded. The evaluations of their cells are
+        recorded for each cell.
+
+        """
+
+        profiler = self.profiler
+
+        if profiler is None or \
+           any(type(key_ele) is SliceType for key_ele in key):
+            return self._eval_cell_code(key)
+
+        result = None
+        profiler.start(key)
+
+        try:
+            result = self._eval_cell_code(key)
+
+        finally:
+            profiler.stop(key, result)
+
+        return result
+
+    def _eval_cell_code(self, key):
+        """Evaluates the code of one cell"""
 
         code = self(key)
 
@@ -1010,24 +3546,26 @@ class CodeArray(DataArray):
         elif is_generator_like(code):
             # We have a generator object
 
-            return numpy.array(self._make_nested_list(code), dtype="O")
-
-        # If only 1 term in front of the "=" --> global
-
-        split_exp = code.split("=")
+            return self._get_slice_array(key)
 
-        if self._has_assignment(split_exp):
-            glob_var = split_exp[0].strip()
-            expression = "=".join(split_exp[1:])
+        glob_var, expression = self._get_code_object(code)
 
+        if glob_var is not None:
             # Delete result cache because assignment changes results
             self.result_cache.clear()
-        else:
-            glob_var = None
-            expression = code
+
+        env, local_env = self._get_eval_namespaces(key, expression)
+
+        if self.dependencies.is_evaluating(key):
+            raise CycleError(self.dependencies.get_cycle(key))
+
+        self.dependencies.push(key)
 
         try:
-            result = eval(expression, env, {})
+            result = eval(expression, env, local_env)
+
+        except CycleError, err:
+            result = err
 
         except AttributeError, err:
             # Attribute Error includes RunTimeError
@@ -1036,8 +3574,8 @@ class CodeArray(DataArray):
         except Exception, err:
             result = Exception(err)
 
-        # Change back cell value for evaluation from other cells
-        self.dict_grid[key] = code
+        finally:
+            self.dependencies.pop()
 
         if glob_var is not None:
             globals().update({glob_var: result})
@@ -1051,10 +3589,11 @@ class CodeArray(DataArray):
         modules = [charts, bz2, base64, re, ast, sys, wx, numpy]
         
         for module in modules:
-            reload(module)
+            if module is not None:
+                reload(module)
 
-    def clear_globals(self):
-        """Clears all newly assigned globals"""
+    def get_user_globals(self):
+        """Returns dict of the globals that macros and cells have assigned"""
 
         base_keys = ['cStringIO', 'IntType', 'KeyValueStore', 'UnRedo',
                      'is_generator_like', 'StringGeneratorMixin',
@@ -1062,12 +3601,43 @@ class CodeArray(DataArray):
                      '__package__', 're', 'config', '__doc__', 'SliceType',
                      'CellAttributes', 'product', 'ast', '__builtins__',
                      '__file__', 'chart', 'sys', 'is_slice_like', '__name__',
-                     'copy', 'imap', 'wx', 'ifilter', 'Selection', 'DictGrid',
-                     'numpy', 'CodeArray', 'DataArray']
+                     'copy', 'imap', 'wx', 'Selection', 'DictGrid',
+                     'numpy', 'CodeArray', 'DataArray', 'DependencyTracker',
+                     'CodeType', 'ResultCache', 'CycleError',
+                     'get_reference_code', 'LongType', 'FloatType',
+                     'NoneType', 'FONT_NORMAL', 'get_color_int',
+                     'bisect_left', 'bisect_right',
+                     '_rebuild_key_value_store',
+                     'CellSizes', 'IndexMap', 'pack_key', 'unpack_key',
+                     'chain', 'CellItems', 'MaskedCells', 'deepcopy',
+                     'weakref', 'MISSING',
+                     'KeyValueSnapshot', 'DictGridSnapshot', 'datetime',
+                     'is_literal', 'literal_to_code', 'literal_to_strings',
+                     'strings_to_literal', 'OrderedDict', 'pickle',
+                     'tempfile', 'SelectionIndex',
+                     'get_compacted_attributes', 'get_selection_bbox',
+                     'StylePool']
+
+        return dict(item for item in globals().iteritems()
+                    if item[0] not in base_keys)
+
+    def set_user_globals(self, user_globals):
+        """Assigns globals, e.g. user globals of another process
+
+        Parameters
+        ----------
+        user_globals: Dict
+        \tMaps names of global variables to values
+
+        """
+
+        globals().update(user_globals)
+
+    def clear_globals(self):
+        """Clears all newly assigned globals"""
 
-        for key in globals().keys():
-            if key not in base_keys:
-                globals().pop(key)
+        for key in self.get_user_globals():
+            globals().pop(key)
 
     def execute_macros(self):
         """Executes all macros and returns result string
@@ -1108,6 +3678,8 @@ class CodeArray(DataArray):
         code_out.close()
         code_err.close()
 
+        self.code_changes += 1
+
         # Reset result cache
         self.result_cache.clear()
 
@@ -1116,35 +3688,6 @@ class CodeArray(DataArray):
 
         return outstring
 
-    def _sorted_keys(self, keys, startkey, reverse=False):
-        """Generator that yields sorted keys starting with startkey
-
-        Parameters
-        ----------
-
-        keys: Iterable of tuple/list
-        \tKey sequence that is sorted
-        startkey: Tuple/list
-        \tFirst key to be yielded
-        reverse: Bool
-        \tSort direction reversed if True
-
-        """
-
-        tuple_key = lambda t: t[::-1]
-        if reverse:
-            tuple_cmp = lambda t: t[::-1] > startkey[::-1]
-        else:
-            tuple_cmp = lambda t: t[::-1] < startkey[::-1]
-
-        searchkeys = sorted(keys, key=tuple_key, reverse=reverse)
-        searchpos = sum(1 for _ in ifilter(tuple_cmp, searchkeys))
-
-        searchkeys = searchkeys[searchpos:] + searchkeys[:searchpos]
-
-        for key in searchkeys:
-            yield key
-
     def _string_match(self, datastring, findstring, flags=None):
         """
         Returns position of findstring in datastring or None if not found.
@@ -1208,7 +3751,7 @@ class CodeArray(DataArray):
 
         reverse = "UP" in flags
 
-        for key in self._sorted_keys(self.keys(), startkey, reverse=reverse):
+        for key in self.dict_grid.iterkeys_sorted(startkey, reverse=reverse):
             code = self(key)
             res_str = unicode(self[key])
 
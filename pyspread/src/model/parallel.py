@@ -0,0 +1,498 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright 2011 Martin Manns
+# Distributed under the terms of the GNU General Public License
+
+# --------------------------------------------------------------------
+# pyspread is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# pyspread is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with pyspread.  If not, see <http://www.gnu.org/licenses/>.
+# --------------------------------------------------------------------
+
+"""
+
+Parallel
+========
+
+Parallel contains the Recalculation class that evaluates cells of a
+CodeArray in a pool of worker processes.
+
+Only cells without side effects are evaluated in parallel. These are
+expressions that call no functions but the builtins in PURE_BUILTINS.
+Global assignment cells, frozen cells and cells that call other
+functions, e.g. functions from the macros, are left to the normal
+evaluation. Literal cells are not evaluated at all.
+
+Each worker process holds its own CodeArray with the cell code, the
+picklable global variables, e.g. the values of global assignment cells,
+and the frozen results of the main process. Macros are not executed in
+the workers. The worker CodeArray refuses to evaluate cells with side
+effects that other cells read. The reading cells are left to the normal
+evaluation as well. Cells are handed out in groups of cells that have read
+each other in their last evaluation so that shared precedents are
+mostly computed once. Picklable results that are no exceptions and the
+reads of each cell are sent back and merged into the result cache and
+the dependency tracker.
+
+A Recalculation merges the results that are ready on each call of
+merge_ready so that the GUI can merge them in idle time. The results
+are dropped if cells or macros change before they are merged.
+
+"""
+
+import ast
+import cPickle as pickle
+from multiprocessing import Pool, cpu_count
+from types import SliceType
+
+from dependencies import get_key
+from literals import is_literal
+from model import CodeArray
+from src.lib.selection import Selection
+
+# Builtins without side effects that parallel cells may call
+PURE_BUILTINS = frozenset([
+    "abs", "all", "any", "bool", "complex", "dict", "divmod", "enumerate",
+    "float", "frozenset", "int", "len", "list", "long", "max", "min",
+    "pow", "range", "repr", "reversed", "round", "set", "slice", "sorted",
+    "str", "sum", "tuple", "unicode", "xrange", "zip",
+])
+
+# Globals that each CodeArray sets itself
+_ENVIRONMENT_NAMES = frozenset(["S", "X", "Y", "Z", "R", "C", "T"])
+
+# CodeArray of a worker process
+_worker_code_array = None
+
+
+def get_assignment_keys(code_array):
+    """Returns list of keys of global assignment cells
+
+    Parameters
+    ----------
+    code_array: CodeArray
+    \tCodeArray that is searched
+
+    """
+
+    return [key for key, code in code_array.dict_grid.iteritems()
+            if not is_literal(code) and
+            code_array._get_code_object(code)[0] is not None]
+
+
+def is_pure_code(code, shadowed_names=()):
+    """Returns True if code is an expression without side effects
+
+    The expression may read cells and variables but it may only call
+    the builtins in PURE_BUILTINS.
+
+    Parameters
+    ----------
+    code: String
+    \tCell code
+    shadowed_names: Container, defaults to ()
+    \tNames of globals that shadow builtins
+
+    """
+
+    try:
+        tree = ast.parse(code.strip(), mode="eval")
+
+    except (SyntaxError, TypeError, ValueError):
+        return False
+
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Call):
+            func = node.func
+
+            if not isinstance(func, ast.Name) or \
+               func.id not in PURE_BUILTINS or func.id in shadowed_names:
+                return False
+
+        elif isinstance(node, (ast.Lambda, ast.GeneratorExp)):
+            # Their code runs later and their results cannot be pickled
+            return False
+
+    return True
+
+
+class ImpureCellError(Exception):
+    """Raised if a worker is about to evaluate a cell with side effects"""
+
+    pass
+
+# End of class ImpureCellError
+
+
+class WorkerCodeArray(CodeArray):
+    """CodeArray of a worker process that evaluates only pure cells
+
+    Cells that are not in pure_keys raise ImpureCellError when they are
+    evaluated. Cells that read them get the error as result or raise it
+    while their precursors are evaluated.
+
+    Parameters
+    ----------
+    shape: 3-tuple of Integer
+    \tShape of the grid
+    pure_keys: Set of Tuple of Integer
+    \tKeys of the cells without side effects
+
+    """
+
+    def __init__(self, shape, pure_keys):
+        CodeArray.__init__(self, shape)
+
+        self.pure_keys = pure_keys
+
+    def _eval_cell(self, key):
+        """Evaluates cell if it is pure, raises ImpureCellError otherwise"""
+
+        if all(type(key_ele) is not SliceType for key_ele in key) and \
+           key not in self.pure_keys:
+            raise ImpureCellError(key)
+
+        return CodeArray._eval_cell(self, key)
+
+# End of class WorkerCodeArray
+
+
+def _get_pickled_globals(code_array):
+    """Returns dict of names and pickled values of the user globals
+
+    Globals that cannot be pickled are left out.
+
+    """
+
+    pickled_globals = {}
+
+    for name, value in code_array.get_user_globals().iteritems():
+        if name in _ENVIRONMENT_NAMES:
+            continue
+
+        try:
+            pickled_globals[name] = \
+                pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+
+        except Exception:
+            pass
+
+    return pickled_globals
+
+
+def _init_worker(shape, cells, pure_keys, pickled_globals, frozen_results):
+    """Sets up the CodeArray of a worker process
+
+    Parameters
+    ----------
+    shape: 3-tuple of Integer
+    \tShape of the grid
+    cells: Dict
+    \tMaps keys to cell code
+    pure_keys: Set of Tuple of Integer
+    \tKeys of the cells that the worker may evaluate
+    pickled_globals: Dict
+    \tMaps names of global variables to pickled values
+    frozen_results: Dict
+    \tMaps keys of frozen cells to their pickled results
+
+    """
+
+    global _worker_code_array
+
+    code_array = WorkerCodeArray(shape, pure_keys)
+    code_array.dict_grid.update(cells)
+
+    user_globals = {}
+
+    for name, pickled_value in pickled_globals.iteritems():
+        try:
+            user_globals[name] = pickle.loads(pickled_value)
+
+        except Exception:
+            # E.g. functions from macros that the worker does not know
+            pass
+
+    code_array.set_user_globals(user_globals)
+
+    if frozen_results:
+        frozen_cells = []
+
+        for key, pickled_result in frozen_results.iteritems():
+            code_array.frozen_cache[key] = pickle.loads(pickled_result)
+            frozen_cells.append(key)
+
+        for tab in set(key[2] for key in frozen_cells):
+            cells = [key[:2] for key in frozen_cells if key[2] == tab]
+            selection = Selection([], [], [], [], cells)
+            code_array.cell_attributes.append((selection, tab,
+                                               {"frozen": True}))
+
+    _worker_code_array = code_array
+
+
+def _eval_cells(keys):
+    """Evaluates cells in a worker process
+
+    Returns list of tuples of key, pickled result and list of hashable
+    keys that the cell has read. Cells with unpicklable results or with
+    exceptions as results are left out. This includes cells that read
+    cells with side effects.
+
+    Parameters
+    ----------
+    keys: List of Tuple of Integer
+    \tKeys of the cells that are evaluated
+
+    """
+
+    code_array = _worker_code_array
+    precedents = code_array.dependencies.precedents
+
+    results = []
+
+    for key in keys:
+        try:
+            result = code_array[key]
+
+        except ImpureCellError:
+            # Raised while the precursors of key are evaluated
+            continue
+
+        if isinstance(result, Exception):
+            # E.g. a global that is missing in the worker
+            continue
+
+        try:
+            pickled_result = pickle.dumps(result, pickle.HIGHEST_PROTOCOL)
+
+        except Exception:
+            continue
+
+        results.append((key, pickled_result, list(precedents.get(key, ()))))
+
+    return results
+
+
+def _get_chunks(groups, no_chunks):
+    """Returns at most no_chunks lists of keys with similar length
+
+    Parameters
+    ----------
+    groups: List of lists of keys
+    \tGroups of keys that are not split up
+    no_chunks: Integer
+    \tMaximum number of chunks
+
+    """
+
+    chunks = [[] for __ in xrange(no_chunks)]
+
+    for group in sorted(groups, key=len, reverse=True):
+        min(chunks, key=len).extend(group)
+
+    return [chunk for chunk in chunks if chunk]
+
+
+class Recalculation(object):
+    """Evaluates the cells of a CodeArray without side effects in parallel
+
+    The pool is started on initialization. Global assignment cells and
+    frozen cells are evaluated before in the main process.
+
+    Parameters
+    ----------
+    code_array: CodeArray
+    \tCodeArray that is recalculated
+    processes: Integer or None, defaults to None
+    \tNumber of worker processes, None uses the number of CPUs
+
+    Attributes
+    ----------
+    no_results: Integer
+    \tNumber of results that have been merged
+    done: Boolean
+    \tTrue if all results are merged or dropped
+
+    """
+
+    def __init__(self, code_array, processes=None):
+        self.code_array = code_array
+
+        self.no_results = 0
+        self.done = True
+
+        self._pool = None
+        self._pending = []
+
+        if code_array.safe_mode:
+            return
+
+        if processes is None:
+            processes = cpu_count()
+
+        # Global assignments change the globals of the main process
+        assignment_keys = get_assignment_keys(code_array)
+
+        for key in assignment_keys:
+            code_array[key]
+
+        cell_attributes = code_array.cell_attributes
+        result_cache = code_array.result_cache
+        dict_grid = code_array.dict_grid
+
+        # Frozen cells are evaluated once in the main process
+        frozen_results = {}
+
+        for key in dict_grid.iterkeys():
+            if cell_attributes[key]["frozen"]:
+                try:
+                    frozen_results[key] = pickle.dumps(
+                        code_array[key], pickle.HIGHEST_PROTOCOL)
+
+                except Exception:
+                    pass
+
+        user_globals = code_array.get_user_globals()
+
+        assignment_keys = set(assignment_keys)
+        pure_keys = set(key for key, code in dict_grid.iteritems()
+                        if key not in assignment_keys and
+                        not is_literal(code) and
+                        not cell_attributes[key]["frozen"] and
+                        is_pure_code(code, user_globals))
+
+        keys = [key for key in pure_keys if key not in result_cache]
+
+        if not keys:
+            return
+
+        groups = code_array.dependencies.get_groups(keys)
+        chunks = _get_chunks(groups, 4 * processes)
+
+        # Copy with logical keys, dict(dict_grid) copies physical keys
+        initargs = code_array.shape, dict(dict_grid.iteritems()), \
+            pure_keys, _get_pickled_globals(code_array), frozen_results
+
+        self._code_changes = code_array.code_changes
+
+        self._pool = Pool(processes, _init_worker, initargs)
+        self._pending = [self._pool.apply_async(_eval_cells, [chunk])
+                         for chunk in chunks]
+        self._pool.close()
+
+        self.done = False
+
+    def _finish(self):
+        """Stops the pool"""
+
+        self._pool.terminate()
+        self._pool.join()
+
+        self._pending = []
+        self.done = True
+
+    def _merge(self, results):
+        """Merges results and reads of cells into the CodeArray"""
+
+        result_cache = self.code_array.result_cache
+        dependencies = self.code_array.dependencies
+
+        for key, pickled_result, precedents in results:
+            if key in result_cache:
+                # Evaluated in the main process meanwhile
+                continue
+
+            result_cache[key] = pickle.loads(pickled_result)
+
+            dependencies.push(key)
+
+            for precedent in precedents:
+                dependencies.add_read(get_key(precedent))
+
+            dependencies.pop()
+
+            self.no_results += 1
+
+    def merge_ready(self, block=False):
+        """Merges results that are ready and returns their number
+
+        Results are dropped if cells or macros have changed since the
+        recalculation has started.
+
+        Parameters
+        ----------
+        block: Bool, defaults to False
+        \tWait for all results
+
+        """
+
+        if self.done:
+            return 0
+
+        if self.code_array.code_changes != self._code_changes:
+            self._finish()
+            return 0
+
+        no_results = self.no_results
+
+        try:
+            pending = []
+
+            for async_result in self._pending:
+                if block or async_result.ready():
+                    self._merge(async_result.get())
+
+                else:
+                    pending.append(async_result)
+
+            self._pending = pending
+
+        except Exception:
+            self._finish()
+            raise
+
+        if not self._pending:
+            self._finish()
+
+        return self.no_results - no_results
+
+    def cancel(self):
+        """Stops the workers and drops the results that are not merged"""
+
+        if not self.done:
+            self._finish()
+
+# End of class Recalculation
+
+
+def recalculate(code_array, processes=None):
+    """Evaluates all cells without side effects of code_array in parallel
+
+    Returns number of cells whose results are merged into the result
+    cache. Nothing is evaluated in safe mode. Blocks until all results
+    are merged.
+
+    Parameters
+    ----------
+    code_array: CodeArray
+    \tCodeArray that is recalculated
+    processes: Integer or None, defaults to None
+    \tNumber of worker processes, None uses the number of CPUs
+
+    """
+
+    recalculation = Recalculation(code_array, processes)
+    recalculation.merge_ready(block=True)
+
+    return recalculation.no_results
@@ -0,0 +1,175 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright 2011 Martin Manns
+# Distributed under the terms of the GNU General Public License
+
+# --------------------------------------------------------------------
+# pyspread is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# pyspread is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with pyspread.  If not, see <http://www.gnu.org/licenses/>.
+# --------------------------------------------------------------------
+
+"""
+
+Profiler
+========
+
+Profiler contains the CellProfiler class that records how long the
+evaluation of each cell takes.
+
+Profiling is enabled by setting the profiler attribute of a CodeArray
+to a CellProfiler and disabled by setting it to None.
+
+"""
+
+import csv
+from timeit import default_timer
+
+from cache import get_size
+
+# Column names of report rows
+REPORT_COLUMNS = ["key", "calls", "self_time", "total_time", "cache_hits",
+                  "result_size"]
+
+
+class CellProfiler(object):
+    """Records evaluation time, calls, result size and cache hits per cell
+
+    Total time is the wall time of an evaluation including the
+    evaluation of the cells that it reads. Self time excludes nested
+    cell evaluations so that the self times of all cells add up to the
+    overall evaluation time.
+
+    """
+
+    def __init__(self):
+        # Maps key to list of calls, self time, total time, cache hits
+        # and size of the last result
+        self.stats = {}
+
+        # Start time and time spent in nested evaluations of each
+        # running evaluation
+        self._running = []
+
+    def _get_stats(self, key):
+        """Returns stats list of key and creates it if not present"""
+
+        try:
+            return self.stats[key]
+
+        except KeyError:
+            stats = self.stats[key] = [0, 0.0, 0.0, 0, 0]
+            return stats
+
+    def start(self, key):
+        """Marks start of evaluation of key"""
+
+        self._running.append([default_timer(), 0.0])
+
+    def stop(self, key, result):
+        """Marks end of evaluation of key and records it
+
+        Parameters
+        ----------
+        key: Tuple of Integer
+        \tKey of the evaluated cell
+        result: Object
+        \tResult of the evaluation
+
+        """
+
+        start_time, nested_time = self._running.pop()
+        total_time = default_timer() - start_time
+
+        if self._running:
+            self._running[-1][1] += total_time
+
+        stats = self._get_stats(key)
+        stats[0] += 1
+        stats[1] += total_time - nested_time
+        stats[2] += total_time
+        stats[4] = get_size(result)
+
+    def add_hit(self, key):
+        """Records result cache hit of key"""
+
+        self._get_stats(key)[3] += 1
+
+    def clear(self):
+        """Removes all records"""
+
+        self.stats.clear()
+        self._running = []
+
+    def get_report(self, sort_column="self_time"):
+        """Returns list of report rows sorted descending by sort_column
+
+        Each row is a tuple with the elements of REPORT_COLUMNS.
+
+        Parameters
+        ----------
+        sort_column: String in REPORT_COLUMNS, defaults to "self_time"
+        \tColumn that the rows are sorted by
+
+        """
+
+        sort_index = REPORT_COLUMNS.index(sort_column)
+
+        rows = [(key,) + tuple(stats)
+                for key, stats in self.stats.iteritems()]
+        rows.sort(key=lambda row: row[sort_index], reverse=True)
+
+        return rows
+
+    def get_total_time(self):
+        """Returns overall evaluation time, i.e. the sum of all self times"""
+
+        return sum(stats[1] for stats in self.stats.itervalues())
+
+    def write_csv(self, outfile, codes=None, sort_column="self_time"):
+        """Writes report to file as CSV with header line
+
+        Parameters
+        ----------
+        outfile: File
+        \tFile that is written to
+        codes: Dict like object, defaults to None
+        \tMaps keys to cell code, which is added as last column
+        sort_column: String in REPORT_COLUMNS, defaults to "self_time"
+        \tColumn that the rows are sorted by
+
+        """
+
+        writer = csv.writer(outfile)
+
+        header = REPORT_COLUMNS[:]
+        if codes is not None:
+            header.append("code")
+
+        writer.writerow(header)
+
+        for row in self.get_report(sort_column):
+            line = [" ".join(map(str, row[0]))] + list(row[1:])
+
+            if codes is not None:
+                code = codes.get(row[0])
+
+                if code is None:
+                    line.append("")
+
+                else:
+                    line.append(unicode(code).encode("utf-8"))
+
+            writer.writerow(line)
+
+# End of class CellProfiler
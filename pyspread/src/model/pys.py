@@ -0,0 +1,195 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright 2011 Martin Manns
+# Distributed under the terms of the GNU General Public License
+
+# --------------------------------------------------------------------
+# pyspread is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# pyspread is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with pyspread.  If not, see <http://www.gnu.org/licenses/>.
+# --------------------------------------------------------------------
+
+"""
+
+Pys
+===
+
+Pys contains the reader and the writer of pys files. The GUI and the
+batch functions share them.
+
+The generators parse or write one line per step so that callers can
+show progress or abort long loads and saves. Files are opened and
+closed by the caller.
+
+Provides
+--------
+
+ * get_file_version: Returns version of pys file after checking header
+ * iter_read: Parses lines of pys file into DictGrid
+ * iter_write: Writes DictGrid to pys file
+ * read_pys: Reads complete pys file into DictGrid
+ * write_pys: Writes complete pys file
+
+"""
+
+FILE_HEADER = "[Pyspread save file version]"
+FILE_VERSION = "0.1"
+
+
+def get_file_version(infile):
+    """Returns version string of infile
+
+    The header line and the version line are read. Raises ValueError if
+    the header is missing.
+
+    Parameters
+    ----------
+    infile: File
+    \tpys file at its start
+
+    """
+
+    if infile.readline().strip() != FILE_HEADER:
+        raise ValueError("File format unsupported.")
+
+    return infile.readline().strip()
+
+
+def get_section_readers(dict_grid):
+    """Returns dict that maps section headers to parsers of dict_grid"""
+
+    return {
+        "[shape]": dict_grid.parse_to_shape,
+        "[grid]": dict_grid.parse_to_grid,
+        "[literals]": dict_grid.parse_to_literal,
+        "[attributes]": dict_grid.parse_to_attribute,
+        "[row_heights]": dict_grid.parse_to_height,
+        "[col_widths]": dict_grid.parse_to_width,
+        "[macros]": dict_grid.parse_to_macro,
+    }
+
+
+def get_output_generators(dict_grid):
+    """Returns list of section headers and generators of their lines"""
+
+    return [
+        ("[grid]", dict_grid.grid_to_strings()),
+        ("[attributes]", dict_grid.attributes_to_strings()),
+        ("[row_heights]", dict_grid.heights_to_strings()),
+        ("[col_widths]", dict_grid.widths_to_strings()),
+        ("[macros]", dict_grid.macros_to_strings()),
+    ]
+
+
+def iter_read(infile, dict_grid):
+    """Parses the lines of infile after the version line into dict_grid
+
+    Yields the section header of each parsed line, None for empty lines
+    and for section headers. Raises ValueError if a line precedes the
+    first section header.
+
+    Parameters
+    ----------
+    infile: File
+    \tpys file after its version line
+    dict_grid: DictGrid
+    \tGrid that the content is added to
+
+    """
+
+    section_readers = get_section_readers(dict_grid)
+
+    section = None
+
+    for line in infile:
+        stripped_line = line.decode("utf-8").strip()
+
+        if not stripped_line:
+            yield
+
+        elif stripped_line in section_readers:
+            section = stripped_line
+            parser = section_readers[section]
+            yield
+
+        elif section is None:
+            raise ValueError("No section parser present.")
+
+        else:
+            parser(line)
+            yield section
+
+
+def iter_write(outfile, dict_grid):
+    """Writes header and content of dict_grid to outfile
+
+    Yields section header and number of each written line of a section.
+    The section lines include their header line.
+
+    Parameters
+    ----------
+    outfile: File
+    \tpys file that is written
+    dict_grid: DictGrid or DictGridSnapshot
+    \tGrid that is saved
+
+    """
+
+    outfile.write(FILE_HEADER + "\n")
+    outfile.write(FILE_VERSION + "\n")
+
+    for section, generator in get_output_generators(dict_grid):
+        for cycle, line in enumerate(generator):
+            outfile.write(line.encode("utf-8"))
+            yield section, cycle
+
+
+def read_pys(infile, dict_grid):
+    """Reads pys file into dict_grid
+
+    Raises ValueError if the file format or version is unsupported.
+
+    Parameters
+    ----------
+    infile: File
+    \tpys file at its start
+    dict_grid: DictGrid
+    \tGrid that the content is added to
+
+    """
+
+    version = get_file_version(infile)
+
+    if version != FILE_VERSION:
+        msg = "File version {} unsupported (not {}).".format(version,
+                                                             FILE_VERSION)
+        raise ValueError(msg)
+
+    for __ in iter_read(infile, dict_grid):
+        pass
+
+
+def write_pys(outfile, dict_grid):
+    """Writes dict_grid to pys file
+
+    Parameters
+    ----------
+    outfile: File
+    \tpys file that is written
+    dict_grid: DictGrid or DictGridSnapshot
+    \tGrid that is saved
+
+    """
+
+    for __ in iter_write(outfile, dict_grid):
+        pass
@@ -0,0 +1,228 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright 2011 Martin Manns
+# Distributed under the terms of the GNU General Public License
+
+# --------------------------------------------------------------------
+# pyspread is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# pyspread is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with pyspread.  If not, see <http://www.gnu.org/licenses/>.
+# --------------------------------------------------------------------
+
+"""
+
+Scheduler
+=========
+
+Scheduler contains the EvaluationScheduler class that decides, which
+cells are evaluated while the grid is drawn and which cells are
+deferred to idle time.
+
+"""
+
+from collections import deque
+from timeit import default_timer
+
+
+class EvaluationScheduler(object):
+    """Evaluates visible cells first and other cells in idle time
+
+    While the grid is drawn, uncached cells are evaluated directly until
+    the draw budget is used up. Cells that have been slow once and all
+    cells after the budget is used up are queued instead. Queued cells
+    are evaluated in idle time via step. When no visible cells are
+    queued, step fills in the off-screen cells of the last table.
+
+    A running cell evaluation cannot be interrupted. cancel only drops
+    queued work.
+
+    Parameters
+    ----------
+    code_array: CodeArray
+    \tCodeArray, whose cells are evaluated
+
+    """
+
+    # Cells that take longer to evaluate in seconds are slow
+    slow_cell_time = 0.05
+
+    # Evaluation time in seconds, after which drawing stops evaluating
+    draw_budget = 0.2
+
+    def __init__(self, code_array):
+        self.code_array = code_array
+
+        # Keys of slow cells
+        self.slow_keys = set()
+
+        # Queued visible cells
+        self.pending = deque()
+        self.pending_keys = set()
+
+        # Table, whose off-screen cells are filled in
+        self.background_tab = None
+        self.background_keys = None
+
+        # Evaluation time that has been spent while drawing
+        self.draw_time = 0.0
+
+    def is_ready(self, key):
+        """Returns True if the result of key is available without evaluation
+
+        Parameters
+        ----------
+        key: Tuple of Integer
+        \tCell key
+
+        """
+
+        code_array = self.code_array
+
+        return code_array.safe_mode or \
+            key not in code_array.dict_grid or \
+            key in code_array.result_cache or \
+            key in code_array.frozen_cache
+
+    def get_result(self, key):
+        """Returns tuple of ready state and cell result
+
+        If ready state is False then the key is queued and the result is
+        None.
+
+        Parameters
+        ----------
+        key: Tuple of Integer
+        \tCell key
+
+        """
+
+        if self.is_ready(key):
+            return True, self.code_array[key]
+
+        if key in self.slow_keys or self.draw_time > self.draw_budget:
+            self.schedule(key)
+            return False, None
+
+        return True, self._evaluate(key)
+
+    def _evaluate(self, key):
+        """Evaluates cell, records slow cells and returns result"""
+
+        start = default_timer()
+        result = self.code_array[key]
+        duration = default_timer() - start
+
+        self.draw_time += duration
+
+        if duration > self.slow_cell_time:
+            self.slow_keys.add(key)
+        else:
+            self.slow_keys.discard(key)
+
+        return result
+
+    def schedule(self, key):
+        """Queues visible cell for evaluation in idle time"""
+
+        if key not in self.pending_keys:
+            self.pending.append(key)
+            self.pending_keys.add(key)
+
+        if self.background_tab != key[2]:
+            self.background_tab = key[2]
+            self.background_keys = None
+
+    def cancel(self):
+        """Drops all queued cells and stops filling in off-screen cells"""
+
+        self.pending.clear()
+        self.pending_keys.clear()
+
+        self.background_tab = None
+        self.background_keys = None
+
+    def has_pending(self):
+        """Returns True if there are cells left for step"""
+
+        return bool(self.pending) or self.background_tab is not None
+
+    def _next_key(self):
+        """Returns next queued key or None if nothing is left
+
+        The second element of the returned tuple is True for visible cells.
+
+        """
+
+        if self.pending:
+            key = self.pending.popleft()
+            self.pending_keys.discard(key)
+
+            return key, True
+
+        if self.background_tab is None:
+            return None, False
+
+        if self.background_keys is None:
+            tab = self.background_tab
+            dict_grid = self.code_array.dict_grid
+            keys = dict_grid.iterkeys_in_range((None, None, tab),
+                                               (None, None, tab + 1))
+            self.background_keys = iter(list(keys))
+
+        for key in self.background_keys:
+            if not self.is_ready(key):
+                return key, False
+
+        self.background_tab = None
+        self.background_keys = None
+
+        return None, False
+
+    def step(self, time_budget=0.05):
+        """Evaluates queued cells for about time_budget seconds
+
+        Returns list of keys of visible cells that have been evaluated.
+        At least one cell is evaluated if cells are queued. The draw
+        budget is reset.
+
+        Parameters
+        ----------
+        time_budget: Float, defaults to 0.05
+        \tTime in seconds, after which no further cell is evaluated
+
+        """
+
+        self.draw_time = 0.0
+
+        start = default_timer()
+        evaluated_keys = []
+
+        while True:
+            key, is_visible = self._next_key()
+
+            if key is None:
+                break
+
+            self._evaluate(key)
+
+            if is_visible:
+                evaluated_keys.append(key)
+
+            if default_timer() - start > time_budget:
+                break
+
+        self.draw_time = 0.0
+
+        return evaluated_keys
+
+# End of class EvaluationScheduler
@@ -0,0 +1,138 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright 2011 Martin Manns
+# Distributed under the terms of the GNU General Public License
+
+# --------------------------------------------------------------------
+# pyspread is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# pyspread is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with pyspread.  If not, see <http://www.gnu.org/licenses/>.
+# --------------------------------------------------------------------
+
+"""
+
+Styles
+======
+
+Styles contains the resolved cell attributes. Cells with equal
+attributes share one immutable CellStyle, which the StylePool provides.
+
+Provides
+--------
+
+ * CellStyle: Immutable dict of all attributes of a cell
+ * StylePool: Interns CellStyles
+
+"""
+
+import sys
+
+
+class CellStyle(dict):
+    """Immutable dict of all attributes of a cell
+
+    CellStyles are shared by many cells. Therefore, they are read only.
+
+    """
+
+    __slots__ = ()
+
+    def _immutable(self, *args, **kwargs):
+        """Raises TypeError for each change"""
+
+        raise TypeError("CellStyle objects are immutable")
+
+    __setitem__ = __delitem__ = _immutable
+    clear = pop = popitem = setdefault = update = _immutable
+
+    def __reduce__(self):
+        """Copies and pickles without changing the new CellStyle"""
+
+        return CellStyle, (dict(self),)
+
+# End of class CellStyle
+
+
+class StylePool(object):
+    """Interns CellStyles so that cells with equal attributes share one
+
+    Parameters
+    ----------
+    default_attributes: Dict
+    \tAttributes of cells without cell attributes
+
+    """
+
+    def __init__(self, default_attributes):
+        self.default_attributes = default_attributes
+
+        # Maps frozenset of attribute items that differ from the defaults
+        # to CellStyle
+        self._styles = {}
+
+    def __len__(self):
+        """Returns number of interned CellStyles"""
+
+        return len(self._styles)
+
+    def clear(self):
+        """Removes all interned CellStyles"""
+
+        self._styles.clear()
+
+    def get_style(self, attributes):
+        """Returns shared CellStyle of the defaults updated by attributes
+
+        Parameters
+        ----------
+        attributes: Dict
+        \tAttributes that are changed from the default attributes
+
+        """
+
+        default_attributes = self.default_attributes
+
+        changed_items = [item for item in attributes.iteritems()
+                         if item[0] not in default_attributes or
+                         default_attributes[item[0]] != item[1]]
+
+        try:
+            style_key = frozenset(changed_items)
+            return self._styles[style_key]
+
+        except KeyError:
+            pass
+
+        except TypeError:
+            # Attributes with unhashable values are not interned
+            style_key = None
+
+        style_dict = dict(default_attributes)
+        style_dict.update(changed_items)
+        style = CellStyle(style_dict)
+
+        if style_key is not None:
+            self._styles[style_key] = style
+
+        return style
+
+    def get_memory_size(self):
+        """Returns estimated bytes of the interned CellStyles"""
+
+        getsizeof = sys.getsizeof
+
+        return getsizeof(self._styles) + \
+            sum(getsizeof(style_key) + getsizeof(style)
+                for style_key, style in self._styles.iteritems())
+
+# End of class StylePool
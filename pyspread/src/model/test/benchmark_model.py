@@ -0,0 +1,139 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Benchmark for cell evaluation in model.py
+
+Compares the per cell overhead of evaluating with a copy of the module
+globals against the shared globals with a per cell overlay.
+
+Usage: python benchmark_model.py [number of cells]
+
+"""
+
+# --------------------------------------------------------------------
+# pyspread is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# pyspread is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Foobar.  If not, see <http://www.gnu.org/licenses/>.
+# --------------------------------------------------------------------
+
+import os
+import sys
+from timeit import default_timer
+
+import numpy
+
+TESTPATH = "/".join(os.path.realpath(__file__).split("/")[:-1]) + "/"
+sys.path.insert(0, TESTPATH)
+sys.path.insert(0, TESTPATH + "/../../..")
+sys.path.insert(0, TESTPATH + "/../..")
+
+from src.model.model import CodeArray
+
+
+def get_code_array(no_cells):
+    """Returns CodeArray with no_cells cells in the first column"""
+
+    code_array = CodeArray((no_cells, 2, 1))
+
+    for row in xrange(no_cells):
+        code_array[row, 0, 0] = "X * 2 + Y"
+
+    return code_array
+
+
+def eval_copy(code_array, keys, code_object):
+    """Evaluates code_object for keys with a copy of the globals per cell"""
+
+    for key in keys:
+        env_dict = {'X': key[0], 'Y': key[1], 'Z': key[2], 'S': code_array}
+        env = code_array._get_updated_environment(env_dict=env_dict)
+        eval(code_object, env, {})
+
+
+def eval_overlay(code_array, keys, code_object):
+    """Evaluates code_object for keys with shared globals and an overlay"""
+
+    for key in keys:
+        env, local_env = code_array._get_eval_namespaces(key, code_object)
+        eval(code_object, env, local_env)
+
+
+def eval_grid(code_array, keys, code_object):
+    """Evaluates all cells of code_array via CodeArray.__getitem__"""
+
+    code_array.result_cache.clear()
+
+    for key in keys:
+        code_array[key]
+
+
+def sum_object_slice(code_array, keys, code_object):
+    """Sums first column via a list and an object array"""
+
+    key = slice(0, len(keys)), 0, 0
+    gen = code_array.cell_array_generator(key)
+    numpy.sum(numpy.array(list(gen), dtype="O"))
+
+
+def sum_typed_slice(code_array, keys, code_object):
+    """Sums first column via the typed slice array"""
+
+    numpy.sum(code_array._get_slice_array((slice(0, len(keys)), 0, 0)))
+
+
+def timed(func, *args):
+    """Returns best wall clock time of func(*args) in 3 runs"""
+
+    timings = []
+
+    for __ in xrange(3):
+        start = default_timer()
+        func(*args)
+        timings.append(default_timer() - start)
+
+    return min(timings)
+
+
+def main(no_cells=10000):
+    """Prints per cell timings of the benchmarks"""
+
+    code_array = get_code_array(no_cells)
+    keys = [(row, 0, 0) for row in xrange(no_cells)]
+    code_object = code_array._get_code_object("X * 2 + Y")[1]
+
+    # Macros that define many names enlarge the globals
+    many_globals = "for i in xrange(1000): globals()['var%d' % i] = i"
+
+    for macros in ["", many_globals]:
+        code_array.macros = macros
+        code_array.execute_macros()
+
+        print "Macros: {0!r}, {1} globals".format(
+            macros, len(code_array._get_updated_environment()))
+
+        for name, func in [("globals copy per cell", eval_copy),
+                           ("shared globals + overlay", eval_overlay),
+                           ("full cell evaluation", eval_grid),
+                           ("sum of object slice", sum_object_slice),
+                           ("sum of typed slice", sum_typed_slice)]:
+            duration = timed(func, code_array, keys, code_object)
+            print "  {0:<26} {1:8.2f} us/cell".format(
+                name, 1e6 * duration / no_cells)
+
+        code_array.clear_globals()
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        main(int(sys.argv[1]))
+    else:
+        main()
@@ -0,0 +1,290 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Unit test for attrindex.py"""
+
+# --------------------------------------------------------------------
+# pyspread is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# pyspread is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Foobar.  If not, see <http://www.gnu.org/licenses/>.
+# --------------------------------------------------------------------
+
+import os
+import random
+import sys
+
+import py.test as pytest
+
+TESTPATH = "/".join(os.path.realpath(__file__).split("/")[:-1]) + "/"
+sys.path.insert(0, TESTPATH)
+sys.path.insert(0, TESTPATH + "/../../..")
+sys.path.insert(0, TESTPATH + "/../..")
+
+from src.lib.selection import Selection
+from src.model.attrindex import SelectionIndex, selection_covers
+from src.model.attrindex import get_compacted_attributes, get_selection_bbox
+
+
+def _get_random_selection(rand):
+    """Returns random Selection for a 200 x 200 area"""
+
+    def get_cell():
+        return rand.randint(0, 199), rand.randint(0, 199)
+
+    block_tl, block_br = [], []
+    for _ in xrange(rand.randint(0, 2)):
+        (top, left), (bottom, right) = get_cell(), get_cell()
+        block_tl.append((min(top, bottom), min(left, right)))
+        block_br.append((max(top, bottom), max(left, right)))
+
+    rows = [rand.randint(0, 199) for _ in xrange(rand.randint(0, 1))]
+    cols = [rand.randint(0, 199) for _ in xrange(rand.randint(0, 1))]
+    cells = [get_cell() for _ in xrange(rand.randint(0, 3))]
+
+    return Selection(block_tl, block_br, rows, cols, cells)
+
+
+class TestSelectionIndex(object):
+    """Unit tests for SelectionIndex"""
+
+    def setup_method(self, method):
+        """Creates empty SelectionIndex"""
+
+        self.index = SelectionIndex()
+
+    param_get_positions = [
+        {'selection': Selection([(3, 4)], [(5, 6)], [], [], []),
+         'inside': [(3, 4), (5, 6), (4, 5)], 'outside': [(2, 4), (5, 7)]},
+        {'selection': Selection([(0, 0)], [(1000, 1000)], [], [], []),
+         'inside': [(0, 0), (1000, 1000)], 'outside': [(1001, 0)]},
+        {'selection': Selection([(None, 2)], [(10 ** 6, 3)], [], [], []),
+         'inside': [(0, 2), (10 ** 6, 3)], 'outside': [(0, 4)]},
+        {'selection': Selection([], [], [7], [8], [(1, 1)]),
+         'inside': [(7, 0), (0, 8), (1, 1)], 'outside': [(1, 2), (8, 7)]},
+        {'selection': Selection([(5, 5)], [(4, 4)], [], [], []),
+         'inside': [], 'outside': [(4, 4), (5, 5)]},
+    ]
+
+    @pytest.mark.parametrize("selection, inside, outside",
+                             [(param['selection'], param['inside'],
+                               param['outside'])
+                              for param in param_get_positions])
+    def test_get_positions(self, selection, inside, outside):
+        """Unit test for get_positions"""
+
+        self.index.add(3, selection)
+
+        for row, col in inside:
+            assert self.index.get_positions(row, col) == [3]
+
+        for row, col in outside:
+            assert self.index.get_positions(row, col) == []
+
+    def test_get_positions_order(self):
+        """Positions are unique and ascending"""
+
+        self.index.add(0, Selection([(0, 0)], [(9, 9)], [2], [], [(2, 2)]))
+        self.index.add(1, Selection([], [], [], [2], []))
+        self.index.add(2, Selection([(2, 2)], [(2, 2)], [], [], []))
+
+        assert self.index.get_positions(2, 2) == [0, 1, 2]
+        assert self.index.get_positions(2, 3) == [0]
+        assert self.index.get_positions(3, 2) == [0, 1]
+
+    def test_get_positions_random(self):
+        """Index lookups equal tests of each selection"""
+
+        rand = random.Random(4)
+
+        selections = [_get_random_selection(rand) for _ in xrange(50)]
+
+        for pos, selection in enumerate(selections):
+            self.index.add(pos, selection)
+
+        for _ in xrange(500):
+            row, col = rand.randint(0, 220), rand.randint(0, 220)
+
+            positions = [pos for pos, selection in enumerate(selections)
+                         if (row, col) in selection]
+
+            assert self.index.get_positions(row, col) == positions
+
+    param_get_block_positions = [
+        {'block': (0, 0, 1, 1), 'res': [0, 1]},
+        {'block': (5, 5, 9, 9), 'res': [0, 2]},
+        {'block': (0, 100, 50, 200), 'res': [1, 3]},
+        {'block': (100, 0, 200, 1), 'res': [3]},
+        {'block': (10, 10, 20, 20), 'res': []},
+    ]
+
+    @pytest.mark.parametrize("block, res",
+                             [(param['block'], param['res'])
+                              for param in param_get_block_positions])
+    def test_get_block_positions(self, block, res):
+        """Unit test for get_block_positions"""
+
+        self.index.add(0, Selection([(5, 5)], [(6, 6)], [], [], [(1, 1)]))
+        self.index.add(1, Selection([], [], [0], [], []))
+        self.index.add(2, Selection([], [], [], [9], []))
+        self.index.add(3, Selection([(40, None)], [(10 ** 6, 150)],
+                                    [], [], []))
+
+        assert self.index.get_block_positions(*block) == res
+
+    def test_get_block_positions_random(self):
+        """Block lookups contain the positions of all cells of the block"""
+
+        rand = random.Random(5)
+
+        selections = [_get_random_selection(rand) for _ in xrange(50)]
+
+        for pos, selection in enumerate(selections):
+            self.index.add(pos, selection)
+
+        for _ in xrange(50):
+            top, left = rand.randint(0, 220), rand.randint(0, 220)
+            bottom = top + rand.randint(0, 40)
+            right = left + rand.randint(0, 40)
+
+            positions = set()
+            for row in xrange(top, bottom + 1):
+                for col in xrange(left, right + 1):
+                    positions.update(self.index.get_positions(row, col))
+
+            assert self.index.get_block_positions(top, left, bottom,
+                                                  right) == sorted(positions)
+
+
+param_get_selection_bbox = [
+    {'selection': Selection([(3, 4)], [(5, 6)], [], [], [(1, 9)]),
+     'res': (1, 4, 5, 9)},
+    {'selection': Selection([], [], [2, 7], [], []),
+     'res': (2, None, 7, None)},
+    {'selection': Selection([(None, 4)], [(5, 6)], [], [3], []),
+     'res': (None, 3, None, 6)},
+    {'selection': Selection([], [], [], [], []), 'res': None},
+]
+
+
+@pytest.mark.parametrize("selection, res",
+                         [(param['selection'], param['res'])
+                          for param in param_get_selection_bbox])
+def test_get_selection_bbox(selection, res):
+    """Unit test for get_selection_bbox"""
+
+    assert get_selection_bbox(selection) == res
+
+
+param_selection_covers = [
+    {'selection': Selection([(0, 0)], [(9, 9)], [], [], []),
+     'other': Selection([(2, 2)], [(3, 9)], [], [], [(0, 9)]), 'res': True},
+    {'selection': Selection([(0, 0)], [(9, 9)], [], [], []),
+     'other': Selection([(2, 2)], [(3, 10)], [], [], []), 'res': False},
+    {'selection': Selection([], [], [4], [7], []),
+     'other': Selection([(4, 0)], [(4, 99)], [4], [], [(5, 7)]),
+     'res': True},
+    {'selection': Selection([(0, 0)], [(9, 9)], [], [], []),
+     'other': Selection([], [], [4], [], []), 'res': False},
+    {'selection': Selection([], [], [], [], [(1, 1)]),
+     'other': Selection([], [], [], [], [[1, 1]]), 'res': True},
+    {'selection': Selection([], [], [], [], []),
+     'other': Selection([], [], [], [], []), 'res': True},
+]
+
+
+@pytest.mark.parametrize("selection, other, res",
+                         [(param['selection'], param['other'], param['res'])
+                          for param in param_selection_covers])
+def test_selection_covers(selection, other, res):
+    """Unit test for selection_covers"""
+
+    assert selection_covers(selection, other) == res
+
+
+def _get_attr_dict(attributes, defaults, row, col, tab):
+    """Returns attribute dict of a cell by testing each attribute"""
+
+    attr_dict = dict(defaults)
+
+    for selection, table, attrs in attributes:
+        if table == tab and (row, col) in selection:
+            attr_dict.update(attrs)
+
+    return attr_dict
+
+
+def test_get_compacted_attributes():
+    """Overridden attributes and default values are removed"""
+
+    defaults = {"fontweight": 0, "bgcolor": 1}
+
+    selection_1 = Selection([(0, 0)], [(9, 9)], [], [], [])
+    selection_2 = Selection([(2, 2)], [(3, 3)], [], [], [])
+
+    attributes = [(selection_1, 0, {"fontweight": 1}),
+                  (selection_2, 0, {"bgcolor": 5, "fontweight": 0}),
+                  (selection_1, 1, {"bgcolor": 1}),
+                  (selection_1, 0, {"fontweight": 0}),
+                  (selection_2, 0, {"bgcolor": 1}),
+                  (selection_2, 0, {"fontweight": 1})]
+
+    compacted_attributes = \
+        get_compacted_attributes(attributes, defaults, ["bgcolor"])
+
+    assert compacted_attributes == \
+        [(selection_1, 1, {"bgcolor": 1}),
+         (selection_2, 0, {"bgcolor": 1, "fontweight": 1})]
+
+    # Attribute dicts are not changed
+    assert attributes[1][2] == {"bgcolor": 5, "fontweight": 0}
+
+    # Toggling a format leaves no attributes
+    attributes = [(selection_1, 0, {"fontweight": 1}),
+                  (selection_1, 0, {"fontweight": 0})] * 5
+
+    assert get_compacted_attributes(attributes, defaults) == []
+
+
+def test_get_compacted_attributes_random():
+    """Compacted attributes yield the same attribute dicts for all cells"""
+
+    rand = random.Random(7)
+
+    defaults = {"a": 0, "b": 0, "c": 0}
+
+    attributes = []
+    for _ in xrange(300):
+        selection = _get_random_selection(rand)
+        selection.block_tl = [(top // 10, left // 10)
+                              for top, left in selection.block_tl]
+        selection.block_br = [(bottom // 10, right // 10)
+                              for bottom, right in selection.block_br]
+        selection.rows = [row // 10 for row in selection.rows]
+        selection.cols = [col // 10 for col in selection.cols]
+        selection.cells = [(row // 10, col // 10)
+                           for row, col in selection.cells]
+
+        keys = rand.sample(sorted(defaults), rand.randint(1, 2))
+        attr_dict = dict((key, rand.randint(0, 1)) for key in keys)
+
+        attributes.append((selection, rand.randint(0, 1), attr_dict))
+
+    compacted_attributes = get_compacted_attributes(attributes, defaults)
+
+    assert len(compacted_attributes) < len(attributes)
+
+    for row in xrange(22):
+        for col in xrange(22):
+            for tab in xrange(2):
+                assert _get_attr_dict(attributes, defaults, row, col, tab) == \
+                    _get_attr_dict(compacted_attributes, defaults, row, col,
+                                   tab)
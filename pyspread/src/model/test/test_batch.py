@@ -0,0 +1,148 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Unit test for batch.py"""
+
+# --------------------------------------------------------------------
+# pyspread is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# pyspread is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Foobar.  If not, see <http://www.gnu.org/licenses/>.
+# --------------------------------------------------------------------
+
+import bz2
+import os
+import sys
+
+import py.test as pytest
+
+TESTPATH = "/".join(os.path.realpath(__file__).split("/")[:-1]) + "/"
+sys.path.insert(0, TESTPATH)
+sys.path.insert(0, TESTPATH + "/../../..")
+sys.path.insert(0, TESTPATH + "/../..")
+
+from src.model.model import CodeArray
+from src.model.batch import load_pys, save_pys, recalculate_all
+from src.model.batch import get_literal_code, get_value_array
+from src.model.batch import get_table_keys, export_csv
+
+
+class TestBatch(object):
+    """Unit tests for batch functions"""
+
+    def setup_method(self, method):
+        """Creates CodeArray with macros, values and failing cells"""
+
+        self.code_array = code_array = CodeArray((10, 5, 2))
+
+        code_array.macros = u"def double(x):\n    return 2 * x"
+
+        for row in xrange(3):
+            code_array[row, 0, 0] = unicode(row)
+            code_array[row, 1, 0] = u"double(S[X, 0, Z])"
+
+        code_array[0, 2, 0] = u"u'\xe4'"
+        code_array[1, 1, 1] = u"1 / 0"
+        code_array[2, 0, 1] = u"offset = 5"
+
+        self.pys_filepath = TESTPATH + "test_batch.pys"
+        self.csv_filepath = TESTPATH + "test_batch.csv"
+
+    def teardown_method(self, method):
+        self.code_array.clear_globals()
+
+        for filepath in [self.pys_filepath, self.csv_filepath]:
+            if os.path.exists(filepath):
+                os.remove(filepath)
+
+    def test_save_load_pys(self):
+        """Saved files are loaded with cells and macros"""
+
+        save_pys(self.code_array, self.pys_filepath)
+        code_array = load_pys(self.pys_filepath)
+
+        assert code_array.shape == (10, 5, 2)
+        assert code_array.macros.strip() == self.code_array.macros
+        assert dict(code_array.dict_grid) == dict(self.code_array.dict_grid)
+
+    def test_load_pys_unsupported(self):
+        """Unsupported files raise ValueError"""
+
+        outfile = bz2.BZ2File(self.pys_filepath, "wb")
+        outfile.write("[Pyspread save file version]\n0.0\n")
+        outfile.close()
+
+        pytest.raises(ValueError, load_pys, self.pys_filepath)
+
+    def test_recalculate_all(self):
+        """Failed cells are returned"""
+
+        code_array = self.code_array
+
+        assert len(recalculate_all(code_array)) == 4
+
+        code_array.execute_macros()
+
+        assert recalculate_all(code_array) == [(1, 1, 1)]
+        assert code_array.result_cache[2, 1, 0] == 4
+
+    param_get_literal_code = [
+        {'result': 1, 'res': u"1"},
+        {'result': u"a", 'res': u"u'a'"},
+        {'result': [1, (2.5, None)], 'res': u"[1, (2.5, None)]"},
+        {'result': ValueError("a"), 'res': None},
+        {'result': object(), 'res': None},
+    ]
+
+    @pytest.mark.parametrize("result, res", [(p["result"], p["res"])
+                                             for p in param_get_literal_code])
+    def test_get_literal_code(self, result, res):
+        """Unit test for get_literal_code"""
+
+        assert get_literal_code(result) == res
+
+    def test_get_value_array(self):
+        """Results replace code except for assignments and failed cells"""
+
+        code_array = self.code_array
+        code_array.execute_macros()
+
+        value_array = get_value_array(code_array)
+
+        assert value_array.dict_grid[2, 1, 0] == u"4"
+        assert value_array.dict_grid[0, 2, 0] == u"u'\\xe4'"
+        assert value_array.dict_grid[1, 1, 1] == u"1 / 0"
+        assert value_array.dict_grid[2, 0, 1] == u"offset = 5"
+        assert value_array.macros == code_array.macros
+
+    def test_get_table_keys(self):
+        """Keys span from the first to the last non-empty cell"""
+
+        keys = get_table_keys(self.code_array, 0)
+
+        assert len(keys) == 3
+        assert keys[2] == [(2, 0, 0), (2, 1, 0), (2, 2, 0)]
+
+        assert get_table_keys(CodeArray((10, 5, 2)), 0) == []
+
+    def test_export_csv(self):
+        """Results are written as utf-8 encoded CSV"""
+
+        code_array = self.code_array
+        code_array.execute_macros()
+
+        export_csv(code_array, self.csv_filepath, 0)
+
+        csv_file = open(self.csv_filepath)
+        lines = csv_file.read().splitlines()
+        csv_file.close()
+
+        assert lines == ["0,0,\xc3\xa4", "1,2,", "2,4,"]
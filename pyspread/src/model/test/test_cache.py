@@ -0,0 +1,182 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Unit test for cache.py"""
+
+# --------------------------------------------------------------------
+# pyspread is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# pyspread is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Foobar.  If not, see <http://www.gnu.org/licenses/>.
+# --------------------------------------------------------------------
+
+import os
+import sys
+
+import numpy
+
+TESTPATH = "/".join(os.path.realpath(__file__).split("/")[:-1]) + "/"
+sys.path.insert(0, TESTPATH)
+sys.path.insert(0, TESTPATH + "/../../..")
+sys.path.insert(0, TESTPATH + "/../..")
+
+from src.model.cache import get_size, ResultCache
+
+
+def test_get_size():
+    """Unit test for get_size"""
+
+    array = numpy.zeros((1000, 100))
+
+    assert get_size(array) >= array.nbytes
+    assert get_size(1) > 0
+    assert get_size("a" * 1000) > get_size("a")
+
+
+class TestResultCache(object):
+    """Unit test for ResultCache"""
+
+    def setup_method(self, method):
+        """Creates empty ResultCache"""
+
+        self.cache = ResultCache(max_entries=3)
+
+    def test_getitem(self):
+        """Unit test for __getitem__"""
+
+        cache = self.cache
+        cache[0, 0, 0] = 5
+
+        assert cache[0, 0, 0] == 5
+
+        try:
+            cache[1, 0, 0]
+            raise AssertionError("KeyError expected")
+
+        except KeyError:
+            pass
+
+        assert cache.hits == 1
+        assert cache.misses == 1
+
+    def test_slice_keys(self):
+        """Slice keys are stored as hashable keys"""
+
+        cache = self.cache
+        key = (slice(0, 5), 0, 0)
+
+        cache[key] = [1, 2]
+
+        assert key in cache
+        assert cache[key] == [1, 2]
+        assert cache.pop(key) == [1, 2]
+        assert key not in cache
+
+    def test_max_entries(self):
+        """Least recently used results are evicted first"""
+
+        cache = self.cache
+
+        for row in xrange(3):
+            cache[row, 0, 0] = row
+
+        # Mark (0, 0, 0) as most recently used
+        cache[0, 0, 0]
+
+        cache[3, 0, 0] = 3
+
+        assert len(cache) == 3
+        assert (0, 0, 0) in cache
+        assert (1, 0, 0) not in cache
+        assert cache.evictions == 1
+
+    def test_max_bytes(self):
+        """Large results are evicted or not cached at all"""
+
+        array = numpy.zeros(1000)
+        cache = ResultCache(max_bytes=2 * get_size(array))
+
+        cache[0, 0, 0] = array
+        cache[1, 0, 0] = array.copy()
+        cache[2, 0, 0] = array.copy()
+
+        assert (0, 0, 0) not in cache
+        assert len(cache) == 2
+        assert cache.nbytes <= cache.max_bytes
+
+        cache[3, 0, 0] = numpy.zeros(10000)
+
+        assert (3, 0, 0) not in cache
+        assert len(cache) == 2
+
+    def test_pop(self):
+        """Unit test for pop"""
+
+        cache = self.cache
+        cache[0, 0, 0] = "Test"
+
+        assert cache.pop((0, 0, 0)) == "Test"
+        assert cache.pop((0, 0, 0)) is None
+        assert cache.nbytes == 0
+
+    def test_pop_table(self):
+        """Only results of single cells of the table are removed"""
+
+        cache = self.cache
+        cache[0, 0, 1] = 1
+        cache[0, 0, 2] = 2
+        cache[slice(0, 2), 0, 1] = [1]
+
+        assert cache.pop_table(1) == 1
+        assert (0, 0, 1) not in cache
+        assert len(cache) == 2
+
+    def test_clear(self):
+        """Unit test for clear"""
+
+        cache = self.cache
+        cache[0, 0, 0] = 1
+        cache.clear()
+
+        assert len(cache) == 0
+        assert cache.nbytes == 0
+
+    def test_set_limits(self):
+        """Unit test for set_limits"""
+
+        cache = self.cache
+
+        for row in xrange(3):
+            cache[row, 0, 0] = row
+
+        cache.set_limits(max_entries=1)
+
+        assert len(cache) == 1
+        assert (2, 0, 0) in cache
+
+    def test_get_stats(self):
+        """Unit test for get_stats and reset_stats"""
+
+        cache = self.cache
+        cache[0, 0, 0] = 1
+        cache[0, 0, 0]
+
+        stats = cache.get_stats()
+
+        assert stats["entries"] == 1
+        assert stats["hits"] == 1
+        assert stats["misses"] == 0
+        assert stats["evictions"] == 0
+        assert stats["bytes"] == cache.nbytes
+
+        cache.reset_stats()
+
+        assert cache.get_stats()["hits"] == 0
@@ -0,0 +1,210 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Unit test for dependencies.py"""
+
+# --------------------------------------------------------------------
+# pyspread is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# pyspread is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Foobar.  If not, see <http://www.gnu.org/licenses/>.
+# --------------------------------------------------------------------
+
+import os
+import sys
+
+TESTPATH = "/".join(os.path.realpath(__file__).split("/")[:-1]) + "/"
+sys.path.insert(0, TESTPATH)
+sys.path.insert(0, TESTPATH + "/../../..")
+sys.path.insert(0, TESTPATH + "/../..")
+
+from src.model.dependencies import get_hashable_key, get_key
+from src.model.dependencies import slice_key_contains, get_reference_code
+from src.model.dependencies import CycleError
+from src.model.dependencies import DependencyTracker
+
+
+def test_get_hashable_key():
+    """Unit test for get_hashable_key"""
+
+    assert get_hashable_key((1, 2, 3)) == (1, 2, 3)
+    assert get_hashable_key((slice(1, 5), 2, 3)) == ((1, 5, None), 2, 3)
+
+    hash(get_hashable_key((slice(None), slice(2, None, 3), 0)))
+
+
+def test_get_key():
+    """Unit test for get_key"""
+
+    for key in [(1, 2, 3), (slice(1, 5), 2, 3), (slice(None, 4, 2), 1, 0)]:
+        assert get_key(get_hashable_key(key)) == key
+
+
+def test_get_reference_code():
+    """Unit test for get_reference_code"""
+
+    env = {'X': 5, 'Y': 1, 'Z': 0, 'R': 5, 'C': 1, 'T': 0}
+
+    code = get_reference_code("S[X-1, Y, Z] + S[0, 2*C, T] + S[-X, Y, 0]")
+    assert sorted(eval(code, env)) == [(-5, 1, 0), (0, 2, 0), (4, 1, 0)]
+
+    # Dynamic keys and slices are not found
+    assert get_reference_code("S[int('1'), 0, 0] + sum(S[0:5, 0, 0])") is None
+    assert get_reference_code("S[X / 2, Y, Z]") is None
+
+    assert get_reference_code("1 +") is None
+
+
+def test_cycle_error():
+    """Unit test for CycleError"""
+
+    err = CycleError([(0, 0, 0), (1, 0, 0), (0, 0, 0)])
+
+    assert err.cycle[1] == (1, 0, 0)
+    assert str(err) == \
+        "Cycle detected: (0, 0, 0) -> (1, 0, 0) -> (0, 0, 0)"
+
+
+def test_slice_key_contains():
+    """Unit test for slice_key_contains"""
+
+    shape = (100, 10, 3)
+
+    assert slice_key_contains((slice(0, 10), 0, 0), (5, 0, 0), shape)
+    assert not slice_key_contains((slice(0, 10), 0, 0), (10, 0, 0), shape)
+    assert not slice_key_contains((slice(0, 10), 0, 0), (5, 1, 0), shape)
+    assert slice_key_contains((slice(None), slice(None), 2), (99, 9, 2),
+                              shape)
+    assert not slice_key_contains((slice(0, 10, 2), 0, 0), (5, 0, 0), shape)
+    assert slice_key_contains((slice(-10, None), 0, 0), (95, 0, 0), shape)
+    assert slice_key_contains((slice(9, 0, -3), 0, 0), (3, 0, 0), shape)
+    assert not slice_key_contains((slice(9, 0, -3), 0, 0), (0, 0, 0), shape)
+
+
+class TestDependencyTracker(object):
+    """Unit tests for DependencyTracker"""
+
+    def setup_method(self, method):
+        """Creates tracker with a chain (0, 0, 0) <- (1, 0, 0) <- (2, 0, 0)"""
+
+        self.tracker = DependencyTracker()
+        self.shape = (100, 10, 3)
+
+        for reader, key in [((1, 0, 0), (0, 0, 0)),
+                            ((2, 0, 0), (1, 0, 0))]:
+            self.tracker.push(reader)
+            self.tracker.add_read(key)
+            self.tracker.pop()
+
+    def test_add_read(self):
+        """Unit test for add_read"""
+
+        tracker = self.tracker
+
+        assert tracker.dependents[(0, 0, 0)] == set([(1, 0, 0)])
+        assert tracker.precedents[(2, 0, 0)] == set([(1, 0, 0)])
+
+        # Reads outside of evaluations are not recorded
+        tracker.add_read((5, 5, 0))
+        assert (5, 5, 0) not in tracker.dependents
+
+        # Reads while None is on top of the stack are not recorded
+        tracker.push(None)
+        tracker.add_read((5, 5, 0))
+        tracker.pop()
+        assert (5, 5, 0) not in tracker.dependents
+
+    def test_get_cycle(self):
+        """Unit test for is_evaluating and get_cycle"""
+
+        tracker = self.tracker
+
+        for key in [(0, 0, 0), None, (1, 0, 0), (2, 0, 0)]:
+            tracker.push(key)
+
+        assert tracker.is_evaluating((1, 0, 0))
+        assert tracker.get_cycle((1, 0, 0)) == \
+            [(1, 0, 0), (2, 0, 0), (1, 0, 0)]
+
+        for __ in xrange(4):
+            tracker.pop()
+
+        assert not tracker.is_evaluating((1, 0, 0))
+
+    def test_invalidate(self):
+        """Unit test for invalidate"""
+
+        tracker = self.tracker
+
+        assert sorted(tracker.invalidate((0, 0, 0), self.shape)) == \
+            [(0, 0, 0), (1, 0, 0), (2, 0, 0)]
+        assert tracker.dependents == {}
+        assert tracker.precedents == {}
+
+        self.setup_method(None)
+        assert sorted(tracker.invalidate((2, 0, 0), self.shape)) == \
+            [(2, 0, 0)]
+
+    def test_invalidate_many(self):
+        """Unit test for invalidate_many"""
+
+        tracker = self.tracker
+
+        invalid_keys = tracker.invalidate_many([(1, 0, 0), (0, 0, 0)],
+                                               self.shape)
+
+        assert sorted(invalid_keys) == [(0, 0, 0), (1, 0, 0), (2, 0, 0)]
+        assert tracker.dependents == {}
+
+    def test_invalidate_slice(self):
+        """Unit test for invalidate with slice reads"""
+
+        tracker = self.tracker
+
+        slice_key = (slice(0, 10), 1, 0)
+
+        tracker.push((20, 0, 0))
+        tracker.add_read(slice_key)
+        tracker.pop()
+
+        assert tracker.invalidate((50, 1, 0), self.shape) == [(50, 1, 0)]
+
+        invalid_keys = tracker.invalidate((5, 1, 0), self.shape)
+        assert (20, 0, 0) in invalid_keys
+        assert slice_key in invalid_keys
+        assert tracker.slice_keys == {}
+
+    def test_get_groups(self):
+        """Unit test for get_groups"""
+
+        tracker = self.tracker
+
+        # Two readers of one slice are connected via the slice
+        for reader in [(10, 0, 0), (11, 0, 0)]:
+            tracker.push(reader)
+            tracker.add_read((slice(0, 10), 1, 0))
+            tracker.pop()
+
+        keys = [(0, 0, 0), (1, 0, 0), (2, 0, 0), (10, 0, 0), (11, 0, 0),
+                (12, 0, 0)]
+
+        groups = sorted(sorted(group) for group in tracker.get_groups(keys))
+
+        assert groups == [[(0, 0, 0), (1, 0, 0), (2, 0, 0)],
+                          [(10, 0, 0), (11, 0, 0)], [(12, 0, 0)]]
+
+    def test_clear(self):
+        """Unit test for clear"""
+
+        self.tracker.clear()
+
+        assert self.tracker.dependents == {}
+        assert self.tracker.precedents == {}
@@ -0,0 +1,222 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Unit test for diskstore.py"""
+
+# --------------------------------------------------------------------
+# pyspread is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# pyspread is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Foobar.  If not, see <http://www.gnu.org/licenses/>.
+# --------------------------------------------------------------------
+
+from copy import copy
+import cPickle as pickle
+import os
+import random
+import sys
+
+import py.test as pytest
+
+TESTPATH = "/".join(os.path.realpath(__file__).split("/")[:-1]) + "/"
+sys.path.insert(0, TESTPATH)
+sys.path.insert(0, TESTPATH + "/../../..")
+sys.path.insert(0, TESTPATH + "/../..")
+
+from src.model.model import KeyValueStore, CodeArray
+from src.model.diskstore import DiskKeyValueStore, DiskDictGrid
+
+
+class TestDiskKeyValueStore(object):
+    """Unit tests for DiskKeyValueStore"""
+
+    def setup_method(self, method):
+        """Creates DiskKeyValueStore with few small pages"""
+
+        self.k_v_store = DiskKeyValueStore()
+        self.k_v_store.page_rows = 4
+        self.k_v_store.max_pages = 3
+
+    def _fill(self):
+        """Fills store with cells on two tables"""
+
+        for row in xrange(10):
+            for col in xrange(3):
+                for tab in xrange(2):
+                    self.k_v_store[row, col, tab] = row
+
+    def test_dict_interface(self):
+        """Store behaves like a dict with default value None"""
+
+        k_v_store = self.k_v_store
+
+        assert k_v_store[1, 2, 3] is None
+        assert not k_v_store
+
+        self._fill()
+        k_v_store[0, 0, 0] = u"\xe4"
+
+        assert len(k_v_store) == 60
+        assert k_v_store[0, 0, 0] == u"\xe4"
+        assert k_v_store[9, 2, 1] == 9
+        assert (9, 2, 1) in k_v_store
+        assert (10, 2, 1) not in k_v_store
+        assert k_v_store.get((0, "a", 0), 3) == 3
+        assert sorted(set(k_v_store.values()))[:2] == [0, 1]
+
+        assert k_v_store.pop((9, 2, 1)) == 9
+        assert k_v_store.pop((9, 2, 1), None) is None
+        pytest.raises(KeyError, k_v_store.pop, (9, 2, 1))
+
+        del k_v_store[8, 2, 1]
+        pytest.raises(KeyError, k_v_store.__delitem__, (8, 2, 1))
+
+        key, value = k_v_store.popitem()
+
+        assert key not in k_v_store
+        assert len(k_v_store) == 57
+
+        k_v_store.clear()
+
+        assert len(k_v_store) == 0
+        assert list(k_v_store) == []
+
+    def test_random(self):
+        """Store matches KeyValueStore after random operations"""
+
+        k_v_store = self.k_v_store
+        res = KeyValueStore()
+        rand = random.Random(7)
+
+        for __ in xrange(500):
+            key = rand.randint(0, 20), rand.randint(0, 3), rand.randint(0, 1)
+            operation = rand.random()
+
+            if operation < 0.6:
+                k_v_store[key] = res[key] = rand.randint(0, 5)
+
+            elif operation < 0.9:
+                assert k_v_store.pop(key, None) == res.pop(key, None)
+
+            else:
+                point, number = rand.randint(0, 20), rand.randint(1, 3)
+                axis = rand.randint(0, 2)
+
+                if operation < 0.95:
+                    k_v_store.insert(point, number, axis)
+                    res.insert(point, number, axis)
+
+                else:
+                    assert k_v_store.delete(point, number, axis) == \
+                        res.delete(point, number, axis)
+
+            assert len(k_v_store) == len(res)
+            assert k_v_store[key] == res[key]
+
+        assert k_v_store == res
+        assert list(k_v_store.iterkeys_sorted()) == \
+            list(res.iterkeys_sorted())
+        assert sorted(k_v_store.iterkeys_in_range((3, 1, None),
+                                                  (15, 3, None))) == \
+            sorted(res.iterkeys_in_range((3, 1, None), (15, 3, None)))
+
+    def test_copy_pickle(self):
+        """Copies and unpickled stores have their own database"""
+
+        self._fill()
+
+        for k_v_store in [copy(self.k_v_store),
+                          pickle.loads(pickle.dumps(self.k_v_store))]:
+            assert type(k_v_store) is DiskKeyValueStore
+
+            k_v_store.pop((0, 0, 0))
+
+            assert len(k_v_store) == 59
+            assert len(self.k_v_store) == 60
+
+    def test_snapshot(self):
+        """Snapshot keeps the items at snapshot time"""
+
+        self._fill()
+
+        k_v_store = self.k_v_store
+        items = dict(k_v_store.iteritems())
+        snapshot = k_v_store.snapshot()
+
+        k_v_store[0, 0, 0] = "changed"
+        k_v_store[20, 0, 0] = "new"
+        k_v_store.pop((9, 2, 1))
+        k_v_store.insert(0, 2, 0)
+
+        assert dict(snapshot.iteritems()) == items
+        assert snapshot[0, 0, 0] == 0
+
+        k_v_store.clear()
+
+        assert dict(snapshot.iteritems()) == items
+
+    def test_get_memory_report(self):
+        """Unit test for get_memory_report"""
+
+        self._fill()
+
+        report = self.k_v_store.get_memory_report()
+
+        assert report["cells"] == 60
+        assert sorted(report["tables"]) == [0, 1]
+        assert 0 < report["memory"] < report["total"]
+
+
+class TestDiskDictGrid(object):
+    """Unit tests for CodeArray with DiskDictGrid"""
+
+    def setup_method(self, method):
+        """Creates CodeArray on disk"""
+
+        self.code_array = CodeArray((100, 10, 3), DiskDictGrid)
+
+    def test_code_array(self):
+        """Cells are evaluated, inserted, deleted and undone"""
+
+        code_array = self.code_array
+
+        code_array[0, 0, 0] = u"1"
+        code_array[1, 0, 0] = u"S[0, 0, 0] + 1"
+
+        assert code_array[1, 0, 0] == 2
+        pytest.raises(IndexError, code_array.__getitem__, (100, 0, 0))
+
+        code_array.insert(1, 5, 0)
+
+        assert code_array[6, 0, 0] == 2
+        assert code_array(((6, 0, 0))) == u"S[0, 0, 0] + 1"
+
+        code_array.delete(0, 1, 0)
+
+        assert code_array[0, 0, 0] is None
+
+        code_array.unredo.undo()
+
+        assert code_array[6, 0, 0] == 2
+        assert code_array.dict_grid.keys() == [(0, 0, 0), (6, 0, 0)]
+
+    def test_evaluation_writes(self):
+        """Evaluations do not write to the database"""
+
+        code_array = self.code_array
+
+        code_array[0, 0, 0] = u"1"
+        code_array[1, 0, 0] = u"S[0, 0, 0] + 1"
+
+        total_changes = code_array.dict_grid._connection.total_changes
+
+        assert code_array[1, 0, 0] == 2
+        assert code_array.dict_grid._connection.total_changes == total_changes
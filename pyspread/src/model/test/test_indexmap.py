@@ -0,0 +1,259 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Unit test for indexmap.py"""
+
+# --------------------------------------------------------------------
+# pyspread is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# pyspread is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Foobar.  If not, see <http://www.gnu.org/licenses/>.
+# --------------------------------------------------------------------
+
+import os
+import pickle
+import random
+import sys
+
+import py.test as pytest
+
+TESTPATH = "/".join(os.path.realpath(__file__).split("/")[:-1]) + "/"
+sys.path.insert(0, TESTPATH)
+sys.path.insert(0, TESTPATH + "/../../..")
+sys.path.insert(0, TESTPATH + "/../..")
+
+from src.model.indexmap import CellSizes, IndexMap
+
+# Number of logical indices that are compared with a plain list
+SIZE = 50
+
+
+class TestIndexMap(object):
+    """Unit tests for IndexMap"""
+
+    def setup_method(self, method):
+        """Creates identity IndexMap and list of its physical indices"""
+
+        self.index_map = IndexMap()
+        self.physical = range(SIZE)
+
+    def _insert(self, index, number):
+        """Inserts into index map and list of physical indices"""
+
+        self.index_map.insert(index, number)
+        self.physical[index:index] = [None] * number
+
+    def _delete(self, index, number):
+        """Deletes from index map and list of physical indices"""
+
+        self.index_map.delete(index, number)
+        del self.physical[index:index + number]
+
+    def _check(self):
+        """Compares index map with list of physical indices"""
+
+        index_map = self.index_map
+        inserted = set()
+
+        for index, physical in enumerate(self.physical):
+            if physical is None:
+                physical = index_map.to_physical(index)
+                assert physical not in inserted
+                inserted.add(physical)
+
+            else:
+                assert index_map.to_physical(index) == physical
+
+            assert index_map.to_logical(physical) == index
+
+    def test_identity(self):
+        """Unit test for is_identity and negative indices"""
+
+        index_map = self.index_map
+
+        assert index_map.is_identity
+        assert index_map.to_physical(-3) == -3
+        assert index_map.to_logical(-3) == -3
+
+        self._insert(0, 1)
+
+        assert not index_map.is_identity
+        assert index_map.to_physical(-3) == -3
+
+        self._delete(0, 1)
+
+        assert index_map.is_identity
+
+    param_insert_delete = [
+        {'ops': [("insert", 10, 5)]},
+        {'ops': [("delete", 10, 5)]},
+        {'ops': [("insert", 0, 3), ("delete", 2, 4), ("insert", 20, 1)]},
+        {'ops': [("delete", 0, 10), ("insert", 5, 10), ("delete", 7, 6)]},
+    ]
+
+    @pytest.mark.parametrize("ops", [p["ops"] for p in param_insert_delete])
+    def test_insert_delete(self, ops):
+        """Index map matches list after insertions and deletions"""
+
+        for operation, index, number in ops:
+            getattr(self, "_" + operation)(index, number)
+            self._check()
+
+    def test_random(self):
+        """Index map matches list after random operations"""
+
+        rand = random.Random(42)
+
+        for __ in xrange(200):
+            index = rand.randint(0, len(self.physical) - 1)
+            number = rand.randint(1, 5)
+
+            if rand.random() < 0.5 or len(self.physical) < 20:
+                self._insert(index, number)
+
+            else:
+                self._delete(index, number)
+
+            self._check()
+
+    def test_to_logical_deleted(self):
+        """Deleted physical indices raise KeyError"""
+
+        self._delete(3, 2)
+
+        pytest.raises(KeyError, self.index_map.to_logical, 4)
+
+    def test_undo(self):
+        """Deleting inserted indices restores the runs"""
+
+        runs = self.index_map.get_runs()
+
+        self._insert(4, 3)
+        self._insert(1, 2)
+        self._delete(1, 2)
+        self._delete(4, 3)
+
+        assert self.index_map.get_runs() == runs
+
+    param_get_physical_ranges = [
+        {'start': 0, 'stop': None},
+        {'start': 3, 'stop': 30},
+        {'start': 12, 'stop': None},
+        {'start': 40, 'stop': 10},
+    ]
+
+    @pytest.mark.parametrize("start, stop",
+                             [(p["start"], p["stop"])
+                              for p in param_get_physical_ranges])
+    def test_get_physical_ranges(self, start, stop):
+        """Ranges contain the physical indices of the logical range"""
+
+        self._insert(5, 4)
+        self._delete(15, 3)
+
+        ranges = self.index_map.get_physical_ranges(start, stop)
+
+        # The last physical index of the list is SIZE - 1
+        logical = [physical - offset
+                   for first, last, offset in ranges
+                   for physical in xrange(first, SIZE if last is None
+                                          else last)]
+
+        if stop is None:
+            stop = len(self.physical)
+
+        assert logical == range(start, stop)
+
+    def test_get_physical_ranges_negative(self):
+        """Negative indices are not mapped"""
+
+        self._insert(0, 2)
+
+        ranges = self.index_map.get_physical_ranges(-5, 1)
+
+        assert ranges[0] == (-5, 0, 0)
+        assert len(ranges) == 2
+
+
+class TestCellSizes(object):
+    """Unit tests for CellSizes"""
+
+    def setup_method(self, method):
+        """Creates CellSizes with sizes in two tables"""
+
+        self.sizes = {(0, 0): 10.0, (3, 0): 20.0, (5, 0): 30.0, (3, 1): 40.0}
+        self.cell_sizes = CellSizes(self.sizes)
+
+    param_insert_delete = [
+        {'point': 3, 'number': 2, 'axis': 0},
+        {'point': 0, 'number': 1, 'axis': 1},
+        {'point': 6, 'number': 4, 'axis': 0},
+    ]
+
+    @pytest.mark.parametrize("point, number, axis",
+                             [(p["point"], p["number"], p["axis"])
+                              for p in param_insert_delete])
+    def test_insert_delete(self, point, number, axis):
+        """Sizes move with their rows and deleted sizes are returned"""
+
+        cell_sizes = self.cell_sizes
+
+        def shift(key, amount):
+            """Returns key shifted by amount if at or after point"""
+
+            key = list(key)
+            if key[axis] >= point:
+                key[axis] += amount
+            return tuple(key)
+
+        cell_sizes.insert(point, number, axis)
+
+        inserted_sizes = dict((shift(key, number), size)
+                              for key, size in self.sizes.iteritems())
+
+        assert cell_sizes == inserted_sizes
+        assert sorted(cell_sizes) == sorted(inserted_sizes)
+
+        deleted_sizes = cell_sizes.delete(point, number, axis)
+
+        assert deleted_sizes == {}
+        assert cell_sizes == self.sizes
+
+        deleted_sizes = cell_sizes.delete(point, number, axis)
+
+        assert all(point <= key[axis] < point + number
+                   for key in deleted_sizes)
+        assert len(cell_sizes) + len(deleted_sizes) == len(self.sizes)
+
+    def test_dict_interface(self):
+        """Logical keys are used for access, copies and pickling"""
+
+        cell_sizes = self.cell_sizes
+        cell_sizes.insert(1, 2, 0)
+
+        assert cell_sizes[5, 0] == 20.0
+        assert (3, 0) not in cell_sizes
+        assert cell_sizes.get((3, 0)) is None
+        assert cell_sizes.pop((7, 0)) == 30.0
+
+        with pytest.raises(KeyError):
+            cell_sizes[3, 0]
+
+        copied_sizes = cell_sizes.copy()
+        cell_sizes[0, 0] = 0.0
+
+        assert copied_sizes[0, 0] == 10.0
+        assert pickle.loads(pickle.dumps(cell_sizes)) == cell_sizes
+
+        cell_sizes.clear()
+
+        assert cell_sizes == {}
+        assert cell_sizes.index_maps[0].is_identity
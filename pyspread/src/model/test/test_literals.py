@@ -0,0 +1,116 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Unit test for literals.py"""
+
+# --------------------------------------------------------------------
+# pyspread is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# pyspread is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Foobar.  If not, see <http://www.gnu.org/licenses/>.
+# --------------------------------------------------------------------
+
+import cPickle as pickle
+import datetime
+import math
+import os
+import sys
+
+import py.test as pytest
+import numpy
+
+TESTPATH = "/".join(os.path.realpath(__file__).split("/")[:-1]) + "/"
+sys.path.insert(0, TESTPATH)
+sys.path.insert(0, TESTPATH + "/../../..")
+sys.path.insert(0, TESTPATH + "/../..")
+
+from src.model.literals import TextLiteral, is_literal, to_literal
+from src.model.literals import literal_to_code, literal_to_strings
+from src.model.literals import strings_to_literal
+
+param_literals = [
+    {'value': True},
+    {'value': 0},
+    {'value': -2 ** 70},
+    {'value': 3.14},
+    {'value': float("inf")},
+    {'value': 1 - 2j},
+    {'value': TextLiteral(u"a\tb\nc\\d \xe4")},
+    {'value': TextLiteral(u"")},
+    {'value': datetime.date(2015, 3, 1)},
+    {'value': datetime.datetime(2015, 3, 1, 12, 30)},
+    {'value': datetime.datetime(2015, 3, 1, 12, 30, 0, 5)},
+    {'value': datetime.time(23, 59, 1)},
+]
+
+
+@pytest.mark.parametrize("value", [param["value"]
+                                   for param in param_literals])
+def test_literal_to_strings(value):
+    """Literals are restored from their save file strings"""
+
+    type_name, value_str = literal_to_strings(value)
+
+    assert "\t" not in value_str and "\n" not in value_str
+
+    result = strings_to_literal(type_name, value_str)
+
+    assert result == value
+    assert type(result) is type(value) or type(value) is long
+
+
+@pytest.mark.parametrize("value", [param["value"]
+                                   for param in param_literals])
+def test_literal_to_code(value):
+    """Code of literals evaluates to the literal"""
+
+    code = literal_to_code(value)
+
+    assert type(code) is unicode
+    assert eval(code, {"datetime": datetime}) == value
+
+
+def test_literal_to_code_nan():
+    """Code of nan evaluates to nan"""
+
+    assert math.isnan(eval(literal_to_code(float("nan"))))
+
+
+def test_to_literal():
+    """Unit test for to_literal"""
+
+    text = to_literal(u"1 + 1")
+
+    assert type(text) is TextLiteral
+    assert text == u"1 + 1"
+    assert to_literal(2.5) == 2.5
+    assert to_literal("code") is None
+    assert to_literal(numpy.float64(1.0)) is None
+    assert to_literal([1]) is None
+
+
+def test_is_literal():
+    """Code strings are no literals"""
+
+    assert is_literal(TextLiteral(u"a"))
+    assert is_literal(0)
+    assert not is_literal(u"a")
+    assert not is_literal("a")
+    assert not is_literal(None)
+
+
+def test_pickle():
+    """Text literals stay text literals when pickled"""
+
+    for protocol in [0, 2]:
+        text = pickle.loads(pickle.dumps(TextLiteral(u"a"), protocol))
+
+        assert type(text) is TextLiteral
@@ -0,0 +1,205 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Unit test for parallel.py"""
+
+# --------------------------------------------------------------------
+# pyspread is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# pyspread is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Foobar.  If not, see <http://www.gnu.org/licenses/>.
+# --------------------------------------------------------------------
+
+import os
+import sys
+
+import py.test as pytest
+
+TESTPATH = "/".join(os.path.realpath(__file__).split("/")[:-1]) + "/"
+sys.path.insert(0, TESTPATH)
+sys.path.insert(0, TESTPATH + "/../../..")
+sys.path.insert(0, TESTPATH + "/../..")
+
+from src.lib.selection import Selection
+from src.model.model import CodeArray
+from src.model.parallel import get_assignment_keys, _get_chunks, recalculate
+from src.model.parallel import is_pure_code, Recalculation
+from src.model.parallel import ImpureCellError, WorkerCodeArray
+
+
+def test_get_chunks():
+    """Unit test for _get_chunks"""
+
+    groups = [[1, 2, 3], [4], [5, 6], [7]]
+
+    chunks = _get_chunks(groups, 2)
+
+    assert sorted(map(len, chunks)) == [3, 4]
+    assert sorted(sum(chunks, [])) == range(1, 8)
+
+    assert len(_get_chunks(groups, 10)) == 4
+
+
+param_is_pure_code = [
+    {'code': u"S[X, 0, Z] + offset", 'res': True},
+    {'code': u"sum(S[0:5, 0, 0]) / max(1, len(S[0:5, 0, 0]))", 'res': True},
+    {'code': u"[x ** 2 for x in xrange(10)]", 'res': True},
+    {'code': u"double(X)", 'res': False},
+    {'code': u"S[0, 0, 0].append(1)", 'res': False},
+    {'code': u"open('file').read()", 'res': False},
+    {'code': u"lambda x: x", 'res': False},
+    {'code': u"1 +", 'res': False},
+]
+
+
+@pytest.mark.parametrize("code, res", [(param['code'], param['res'])
+                                       for param in param_is_pure_code])
+def test_is_pure_code(code, res):
+    """Unit test for is_pure_code"""
+
+    assert is_pure_code(code) == res
+
+
+def test_is_pure_code_shadowed():
+    """Builtins that are shadowed by globals are no pure calls"""
+
+    assert not is_pure_code(u"sum(S[0:5, 0, 0])", {"sum": None})
+
+
+def test_worker_code_array():
+    """Worker CodeArrays refuse to evaluate cells that are not pure"""
+
+    code_array = WorkerCodeArray((10, 2, 1), set([(1, 0, 0), (2, 0, 0)]))
+
+    code_array[0, 0, 0] = u"open('file')"
+    code_array[1, 0, 0] = u"S[0, 0, 0]"
+    code_array[2, 0, 0] = u"sum(S[3:5, 0, 0])"
+    code_array[3, 0, 0] = 1
+    code_array[4, 0, 0] = u"2"
+
+    pytest.raises(ImpureCellError, code_array.__getitem__, (0, 0, 0))
+    pytest.raises(ImpureCellError, code_array.__getitem__, (1, 0, 0))
+    assert isinstance(code_array[2, 0, 0], Exception)
+
+    code_array.pure_keys.add((4, 0, 0))
+    code_array.result_cache.clear()
+
+    assert code_array[2, 0, 0] == 3
+
+
+class TestRecalculate(object):
+    """Unit test for recalculate"""
+
+    def setup_method(self, method):
+        """Creates CodeArray with independent and dependent cells"""
+
+        self.code_array = code_array = CodeArray((100, 10, 2))
+
+        code_array.macros = "def double(x):\n    return 2 * x"
+
+        for row in xrange(20):
+            code_array[row, 0, 0] = "2 * X"
+            code_array[row, 1, 0] = "S[X, 0, Z] + offset"
+            code_array[row, 2, 0] = "double(X)"
+
+        code_array[0, 0, 1] = "offset = 1"
+        code_array[1, 0, 1] = "lambda x: x"
+
+    def teardown_method(self, method):
+        self.code_array.clear_globals()
+
+    def test_get_assignment_keys(self):
+        """Unit test for get_assignment_keys"""
+
+        assert get_assignment_keys(self.code_array) == [(0, 0, 1)]
+
+    def test_recalculate(self):
+        """Results are merged into the result cache"""
+
+        code_array = self.code_array
+        code_array.execute_macros()
+
+        no_results = recalculate(code_array, processes=2)
+
+        # Cells that call macros and the lambda are not evaluated
+        assert no_results == 40
+        assert (1, 0, 1) not in code_array.result_cache
+        assert (0, 2, 0) not in code_array.result_cache
+
+        for row in xrange(20):
+            assert code_array.result_cache[row, 1, 0] == 2 * row + 1
+
+        # Merged reads invalidate dependent results
+        code_array[5, 0, 0] = "0"
+
+        assert (5, 1, 0) not in code_array.result_cache
+        assert code_array[5, 1, 0] == 1
+
+    def test_impure_precursors(self):
+        """Cells that read cells with side effects are not evaluated"""
+
+        code_array = self.code_array
+
+        code_array[0, 3, 0] = u"__import__('os').getpid()"
+        code_array[1, 3, 0] = u"S[0, 3, 0]"
+        code_array[2, 3, 0] = u"S[1, 3, 0] + 1"
+
+        code_array.execute_macros()
+
+        recalculate(code_array, processes=2)
+
+        for row in xrange(3):
+            assert (row, 3, 0) not in code_array.result_cache
+
+        assert code_array[2, 3, 0] == os.getpid() + 1
+
+    def test_frozen_cells(self):
+        """Frozen results are sent to the workers and not evaluated again"""
+
+        code_array = self.code_array
+
+        code_array[0, 3, 0] = "1"
+        code_array[0, 4, 0] = "S[0, 3, 0] * 10"
+        code_array.cell_attributes.append(
+            (Selection([], [], [], [], [(0, 3)]), 0, {"frozen": True}))
+
+        code_array.execute_macros()
+
+        # Frozen result that differs from the result of the code
+        code_array.frozen_cache[0, 3, 0] = 5
+
+        recalculate(code_array, processes=2)
+
+        assert code_array.result_cache[0, 4, 0] == 50
+
+    def test_merge_ready(self):
+        """Results are dropped if cells change before they are merged"""
+
+        code_array = self.code_array
+        code_array.execute_macros()
+
+        recalculation = Recalculation(code_array, processes=2)
+        assert not recalculation.done
+
+        code_array[5, 0, 0] = "0"
+
+        assert recalculation.merge_ready(block=True) == 0
+        assert recalculation.done
+        assert (7, 1, 0) not in code_array.result_cache
+
+    def test_recalculate_safe_mode(self):
+        """Nothing is evaluated in safe mode"""
+
+        code_array = self.code_array
+        code_array.safe_mode = True
+
+        assert recalculate(code_array, processes=2) == 0
+        assert len(code_array.result_cache) == 0
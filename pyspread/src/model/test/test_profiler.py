@@ -0,0 +1,141 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Unit test for profiler.py"""
+
+# --------------------------------------------------------------------
+# pyspread is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# pyspread is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Foobar.  If not, see <http://www.gnu.org/licenses/>.
+# --------------------------------------------------------------------
+
+import cStringIO
+import csv
+import os
+import sys
+
+TESTPATH = "/".join(os.path.realpath(__file__).split("/")[:-1]) + "/"
+sys.path.insert(0, TESTPATH)
+sys.path.insert(0, TESTPATH + "/../../..")
+sys.path.insert(0, TESTPATH + "/../..")
+
+from src.model.model import CodeArray
+from src.model.profiler import CellProfiler
+
+
+class TestCellProfiler(object):
+    """Unit tests for CellProfiler"""
+
+    def setup_method(self, method):
+        """Creates CodeArray with a slow cell that is read by other cells"""
+
+        self.code_array = code_array = CodeArray((100, 10, 1))
+
+        code_array[0, 0, 0] = u"__import__('time').sleep(0.02) or 1"
+        code_array[1, 0, 0] = u"S[0, 0, 0] + 1"
+        code_array[2, 0, 0] = u"S[0, 0, 0] + S[1, 0, 0]"
+
+        code_array.profiler = CellProfiler()
+
+    def test_disabled(self):
+        """Nothing is recorded without profiler"""
+
+        profiler = self.code_array.profiler
+        self.code_array.profiler = None
+
+        assert self.code_array[2, 0, 0] == 3
+        assert profiler.stats == {}
+
+    def test_stats(self):
+        """Calls and cache hits are counted and self times add up"""
+
+        code_array = self.code_array
+        profiler = code_array.profiler
+
+        assert code_array[2, 0, 0] == 3
+
+        calls, self_time, total_time, hits, size = profiler.stats[0, 0, 0]
+
+        assert calls == 1
+        assert hits == 2
+        assert self_time >= 0.02
+        assert size > 0
+
+        calls, self_time, total_time, hits, size = profiler.stats[2, 0, 0]
+
+        assert calls == 1
+        assert self_time < 0.02
+        assert self_time <= total_time
+
+    def test_slice_read(self):
+        """Slice reads are evaluated and only their cells are recorded"""
+
+        code_array = self.code_array
+        profiler = code_array.profiler
+
+        code_array[3, 0, 0] = u"sum(S[0:3, 0, 0])"
+
+        assert code_array[3, 0, 0] == 6
+        assert list(code_array[1:3, 0, 0]) == [2, 3]
+
+        assert all(type(key_ele) is int
+                   for key in profiler.stats for key_ele in key)
+        assert profiler.stats[3, 0, 0][0] == 1
+
+    def test_get_report(self):
+        """Slowest cell comes first"""
+
+        code_array = self.code_array
+
+        code_array[2, 0, 0]
+
+        report = code_array.profiler.get_report()
+
+        assert len(report) == 3
+        assert report[0][0] == (0, 0, 0)
+
+        report = code_array.profiler.get_report("cache_hits")
+
+        assert report[0][0] == (0, 0, 0)
+        assert report[0][4] == 2
+
+        total_time = code_array.profiler.get_total_time()
+        assert total_time == sum(row[2] for row in report)
+
+    def test_write_csv(self):
+        """Report is written with header and code"""
+
+        code_array = self.code_array
+
+        code_array[2, 0, 0]
+
+        outfile = cStringIO.StringIO()
+        code_array.profiler.write_csv(outfile, code_array.dict_grid)
+
+        outfile.seek(0)
+        rows = list(csv.reader(outfile))
+
+        assert rows[0][0] == "key"
+        assert rows[0][-1] == "code"
+        assert len(rows) == 4
+        assert rows[1][0] == "0 0 0"
+        assert rows[1][-1] == code_array((0, 0, 0))
+
+    def test_clear(self):
+        """Unit test for clear"""
+
+        code_array = self.code_array
+
+        code_array[2, 0, 0]
+        code_array.profiler.clear()
+
+        assert code_array.profiler.stats == {}
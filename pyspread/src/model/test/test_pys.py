@@ -0,0 +1,113 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Unit test for pys.py"""
+
+# --------------------------------------------------------------------
+# pyspread is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# pyspread is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Foobar.  If not, see <http://www.gnu.org/licenses/>.
+# --------------------------------------------------------------------
+
+from StringIO import StringIO
+import os
+import sys
+
+import py.test as pytest
+
+TESTPATH = "/".join(os.path.realpath(__file__).split("/")[:-1]) + "/"
+sys.path.insert(0, TESTPATH)
+sys.path.insert(0, TESTPATH + "/../../..")
+sys.path.insert(0, TESTPATH + "/../..")
+
+from src.lib.selection import Selection
+from src.model.model import DictGrid
+from src.model.pys import FILE_HEADER, get_file_version, iter_read
+from src.model.pys import iter_write, read_pys, write_pys
+
+
+class TestPys(object):
+    """Unit tests for the pys reader and writer"""
+
+    def setup_method(self, method):
+        """Creates DictGrid with content in each section"""
+
+        self.dict_grid = dict_grid = DictGrid((10, 5, 2))
+
+        dict_grid[0, 0, 0] = u"1 + 1"
+        dict_grid[1, 2, 1] = u"u'\xe4'"
+        dict_grid[2, 0, 0] = 2.5
+
+        selection = Selection([], [], [], [], [(0, 0)])
+        dict_grid.cell_attributes.append((selection, 0, {"bgcolor": 0}))
+
+        dict_grid.row_heights[1, 0] = 40.0
+        dict_grid.col_widths[2, 1] = 80.0
+        dict_grid.macros = u"a = 1"
+
+    def _write(self, dict_grid):
+        """Returns StringIO at the start of the pys content of dict_grid"""
+
+        outfile = StringIO()
+        write_pys(outfile, dict_grid)
+        outfile.seek(0)
+
+        return outfile
+
+    def test_write_read(self):
+        """Written content is read back"""
+
+        dict_grid = DictGrid((1, 1, 1))
+        read_pys(self._write(self.dict_grid), dict_grid)
+
+        assert dict_grid.shape == (10, 5, 2)
+        assert dict(dict_grid.iteritems()) == \
+            dict(self.dict_grid.iteritems())
+        assert dict_grid.cell_attributes[0, 0, 0]["bgcolor"] == 0
+        assert dict_grid.row_heights == {(1, 0): 40.0}
+        assert dict_grid.col_widths == {(2, 1): 80.0}
+        assert dict_grid.macros.strip() == u"a = 1"
+
+    def test_iter_write(self):
+        """Lines are numbered per section"""
+
+        steps = list(iter_write(StringIO(), self.dict_grid))
+
+        assert steps[0] == ("[grid]", 0)
+        assert ("[row_heights]", 1) in steps
+        assert steps[-1][0] == "[macros]"
+
+    def test_iter_read(self):
+        """Sections of parsed lines are yielded"""
+
+        infile = self._write(self.dict_grid)
+        get_file_version(infile)
+
+        sections = [section for section in iter_read(infile, self.dict_grid)
+                    if section is not None]
+
+        assert sections[0] == "[shape]"
+        assert sections.count("[literals]") == 1
+
+    param_unsupported = [
+        {'content': "[Pyspread file]\n0.1\n"},
+        {'content': FILE_HEADER + "\n0.0\n"},
+        {'content': FILE_HEADER + "\n0.1\n1\t1\t1\n"},
+    ]
+
+    @pytest.mark.parametrize("content", [p["content"]
+                                         for p in param_unsupported])
+    def test_read_unsupported(self, content):
+        """Unsupported files raise ValueError"""
+
+        pytest.raises(ValueError, read_pys, StringIO(content),
+                      DictGrid((1, 1, 1)))
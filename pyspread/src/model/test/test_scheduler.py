@@ -0,0 +1,104 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Unit test for scheduler.py"""
+
+# --------------------------------------------------------------------
+# pyspread is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# pyspread is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Foobar.  If not, see <http://www.gnu.org/licenses/>.
+# --------------------------------------------------------------------
+
+import os
+import sys
+
+TESTPATH = "/".join(os.path.realpath(__file__).split("/")[:-1]) + "/"
+sys.path.insert(0, TESTPATH)
+sys.path.insert(0, TESTPATH + "/../../..")
+sys.path.insert(0, TESTPATH + "/../..")
+
+from src.model.model import CodeArray
+from src.model.scheduler import EvaluationScheduler
+
+
+class TestEvaluationScheduler(object):
+    """Unit test for EvaluationScheduler"""
+
+    def setup_method(self, method):
+        """Creates scheduler for a CodeArray with a slow cell"""
+
+        self.code_array = CodeArray((100, 10, 2))
+        self.scheduler = EvaluationScheduler(self.code_array)
+
+        self.code_array[0, 0, 0] = "1 + 1"
+        self.code_array[1, 0, 0] = "__import__('time').sleep(0.06) or 3"
+        self.code_array[50, 0, 0] = "50"
+        self.code_array[0, 0, 1] = "'other table'"
+
+    def test_get_result(self):
+        """Unit test for get_result"""
+
+        scheduler = self.scheduler
+
+        assert scheduler.get_result((0, 0, 0)) == (True, 2)
+        assert scheduler.get_result((5, 5, 0)) == (True, None)
+
+        # Slow cells are evaluated once and deferred afterwards
+        assert scheduler.get_result((1, 0, 0)) == (True, 3)
+        assert (1, 0, 0) in scheduler.slow_keys
+
+        self.code_array[1, 0, 0] = "__import__('time').sleep(0.06) or 4"
+
+        assert scheduler.get_result((1, 0, 0)) == (False, None)
+        assert list(scheduler.pending) == [(1, 0, 0)]
+
+    def test_draw_budget(self):
+        """Cells are deferred when the draw budget is used up"""
+
+        scheduler = self.scheduler
+        scheduler.draw_time = scheduler.draw_budget + 1
+
+        assert scheduler.get_result((0, 0, 0)) == (False, None)
+
+        # Ready results are always returned
+        scheduler.step()
+        assert scheduler.get_result((0, 0, 0)) == (True, 2)
+
+    def test_step(self):
+        """Visible cells are evaluated first, then off-screen cells"""
+
+        scheduler = self.scheduler
+        scheduler.schedule((50, 0, 0))
+
+        assert scheduler.step(time_budget=0) == [(50, 0, 0)]
+        assert (50, 0, 0) in self.code_array.result_cache
+        assert scheduler.has_pending()
+
+        while scheduler.has_pending():
+            assert scheduler.step() == []
+
+        assert (0, 0, 0) in self.code_array.result_cache
+        assert (1, 0, 0) in self.code_array.result_cache
+
+        # Off-screen cells of other tables are not filled in
+        assert (0, 0, 1) not in self.code_array.result_cache
+
+    def test_cancel(self):
+        """Unit test for cancel"""
+
+        scheduler = self.scheduler
+        scheduler.schedule((50, 0, 0))
+        scheduler.cancel()
+
+        assert not scheduler.has_pending()
+        assert scheduler.step() == []
+        assert (50, 0, 0) not in self.code_array.result_cache
@@ -0,0 +1,125 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Unit test for styles.py"""
+
+# --------------------------------------------------------------------
+# pyspread is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# pyspread is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Foobar.  If not, see <http://www.gnu.org/licenses/>.
+# --------------------------------------------------------------------
+
+from copy import copy, deepcopy
+import cPickle as pickle
+import os
+import sys
+
+import py.test as pytest
+
+TESTPATH = "/".join(os.path.realpath(__file__).split("/")[:-1]) + "/"
+sys.path.insert(0, TESTPATH)
+sys.path.insert(0, TESTPATH + "/../../..")
+sys.path.insert(0, TESTPATH + "/../..")
+
+from src.model.styles import CellStyle, StylePool
+
+
+class TestCellStyle(object):
+    """Unit tests for CellStyle"""
+
+    def setup_method(self, method):
+        """Creates CellStyle"""
+
+        self.style = CellStyle({"a": 1, "b": 2})
+
+    param_immutable = [
+        {'func': lambda style: style.__setitem__("a", 2)},
+        {'func': lambda style: style.__delitem__("a")},
+        {'func': lambda style: style.update(a=2)},
+        {'func': lambda style: style.setdefault("c", 3)},
+        {'func': lambda style: style.pop("a")},
+        {'func': lambda style: style.popitem()},
+        {'func': lambda style: style.clear()},
+    ]
+
+    @pytest.mark.parametrize("func", [param['func']
+                                      for param in param_immutable])
+    def test_immutable(self, func):
+        """Changes raise TypeError"""
+
+        with pytest.raises(TypeError):
+            func(self.style)
+
+        assert self.style == {"a": 1, "b": 2}
+
+    @pytest.mark.parametrize("copy_func", [copy, deepcopy,
+                                           lambda style: pickle.loads(
+                                               pickle.dumps(style, 2))])
+    def test_copy(self, copy_func):
+        """CellStyles can be copied and pickled"""
+
+        style_copy = copy_func(self.style)
+
+        assert type(style_copy) is CellStyle
+        assert style_copy == self.style
+
+# End of class TestCellStyle
+
+
+class TestStylePool(object):
+    """Unit tests for StylePool"""
+
+    def setup_method(self, method):
+        """Creates StylePool"""
+
+        self.style_pool = StylePool({"a": 1, "b": 2})
+
+    def test_get_style(self):
+        """Equal attributes share one CellStyle"""
+
+        style = self.style_pool.get_style({"a": 3})
+
+        assert style == {"a": 3, "b": 2}
+        assert self.style_pool.get_style({"a": 3}) is style
+        assert self.style_pool.get_style({"a": 3, "b": 2}) is style
+
+        default_style = self.style_pool.get_style({})
+
+        assert default_style == {"a": 1, "b": 2}
+        assert self.style_pool.get_style({"a": 1}) is default_style
+        assert len(self.style_pool) == 2
+
+    def test_get_style_unhashable(self):
+        """Attributes with unhashable values are not interned"""
+
+        style = self.style_pool.get_style({"a": [1]})
+
+        assert style == {"a": [1], "b": 2}
+        assert len(self.style_pool) == 0
+
+    def test_clear(self):
+        """Unit test for clear"""
+
+        self.style_pool.get_style({"a": 3})
+        self.style_pool.clear()
+
+        assert len(self.style_pool) == 0
+
+    def test_get_memory_size(self):
+        """Memory grows with the number of styles"""
+
+        size = self.style_pool.get_memory_size()
+        self.style_pool.get_style({"a": 3})
+
+        assert self.style_pool.get_memory_size() > size
+
+# End of class TestStylePool
@@ -98,4 +98,18 @@ class TestUnRedo(object):
 
         self.unredo.append(self.step[:2], self.step[2:])
         assert len(self.unredo.undolist) == 1
-        assert self.unredo.undolist[0] == self.step
\ No newline at end of file
+        assert self.unredo.undolist[0] == self.step
+
+    def test_append_to_last_step(self):
+        """Operations are appended before the MARK of the last step"""
+
+        self.unredo.append_to_last_step(self.step[:2], self.step[2:])
+        assert self.unredo.undolist == [self.step]
+
+        self.unredo.mark()
+        self.unredo.append_to_last_step(self.step[:2], self.step[2:])
+        assert self.unredo.undolist == [self.step, self.step, "MARK"]
+
+        self.unredo.undo()
+        assert self.list == ["Test", "Test"]
+        assert self.unredo.undolist == []
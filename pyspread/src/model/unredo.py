@@ -146,4 +146,27 @@ class UnRedo(object):
         if not self.active:
             self.undolist.append(undo_operation + operation)
 
+    def append_to_last_step(self, undo_operation, operation):
+        """Stores an operation and its undo operation in the last undo step
+
+        The operation is undone before and redone after the other
+        operations of the step. If there is no step then the operation
+        starts a new one.
+
+        undo_operation: (undo_function, [undo_function_attribute_1, ...])
+        operation: (redo_function, [redo_function_attribute_1, ...])
+
+        """
+
+        if self.active:
+            return False
+
+        if self.undolist and self.undolist[-1] == "MARK":
+            self.undolist.pop()
+            self.append(undo_operation, operation)
+            self.mark()
+
+        else:
+            self.append(undo_operation, operation)
+
 # End of class UnRedo
@@ -0,0 +1,314 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright 2011 Martin Manns
+# Distributed under the terms of the GNU General Public License
+
+# --------------------------------------------------------------------
+# pyspread is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# pyspread is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with pyspread.  If not, see <http://www.gnu.org/licenses/>.
+# --------------------------------------------------------------------
+
+"""
+
+==============
+pyspread_batch
+==============
+
+Recalculates pyspread files without GUI
+
+Run this script to load pys files, optionally execute their macros,
+evaluate all cells and write the results to CSV or pys files. No wx
+application is created, so that the script runs on servers without
+display.
+
+Files are not checked for valid signatures. Only process trusted files.
+
+Provides
+--------
+
+* Commandlineparser: Gets command line options and parameters
+* process_file: Recalculates and exports one file
+
+"""
+
+import optparse
+import os
+import sys
+from multiprocessing import Pool
+
+from sysvars import get_program_path
+
+import lib.i18n as i18n
+
+#use ugettext instead of getttext to avoid unicode errors
+_ = i18n.language.ugettext
+
+sys.path.insert(0, get_program_path())
+
+# Charts are drawn without display
+import matplotlib
+matplotlib.use("Agg")
+
+from src.model.batch import load_pys, save_pys, recalculate_all
+from src.model.batch import get_value_array, export_csv
+from src.model.profiler import CellProfiler
+from src.model.model import DictGrid
+from src.model.diskstore import DiskDictGrid
+
+
+class Commandlineparser(object):
+    """
+    Command line handling
+
+    Methods:
+    --------
+
+    parse: Returns command line options and arguments as 2-tuple
+
+    """
+
+    def __init__(self):
+        from src.config import config
+
+        usage = _("usage: %prog [options] filename [filename ...]")
+        version = _("%prog {}").format(config["version"])
+        self.parser = optparse.OptionParser(usage=usage, version=version)
+
+        self.parser.add_option("-o", "--output-dir", dest="output_dir",
+            default=None,
+            help=_("Directory of output files [default: directory of "
+                   "the input file]"))
+
+        self.parser.add_option("-f", "--format", dest="format",
+            choices=["csv", "pys"], default="csv",
+            help=_("Output format csv or pys. pys files contain cell "
+                   "results instead of cell code where possible "
+                   "[default: %default]"))
+
+        self.parser.add_option("-t", "--table", type="int", dest="table",
+            default=None,
+            help=_("Table that is exported to CSV [default: all tables]"))
+
+        self.parser.add_option("-m", "--macros", action="store_true",
+            dest="macros", default=False,
+            help=_("Execute macros before recalculation"))
+
+        self.parser.add_option("-j", "--jobs", type="int", dest="jobs",
+            default=1,
+            help=_("Number of files that are processed in parallel "
+                   "[default: %default]"))
+
+        self.parser.add_option("-p", "--profile", action="store_true",
+            dest="profile", default=False,
+            help=_("Write a CSV report of the evaluation time of each "
+                   "cell, slowest cells first"))
+
+        self.parser.add_option("-d", "--disk", action="store_true",
+            dest="disk", default=False,
+            help=_("Keep cell code in a temporary database on disk for "
+                   "grids that do not fit into memory"))
+
+    def parse(self):
+        """
+        Returns a a tuple (options, filepaths)
+
+        options: The command line options
+        filepaths: List of String
+        \tThe names of the files that are processed
+
+        """
+
+        options, args = self.parser.parse_args()
+
+        if not args:
+            self.parser.error(_("No file given."))
+
+        if options.jobs < 1:
+            self.parser.error(_("Number of jobs must be > 0."))
+
+        return options, args
+
+# end of class Commandlineparser
+
+
+def get_output_filepath(filepath, options, table=None, suffix=None):
+    """Returns path of output file
+
+    Parameters
+    ----------
+    filepath: String
+    \tPath of input file
+    options: optparse.Values
+    \tCommand line options
+    table: Integer, defaults to None
+    \tTable of CSV file, None if the table is not part of the file name
+    suffix: String, defaults to None
+    \tSuffix of CSV file name, e.g. for reports
+
+    """
+
+    output_dir, filename = os.path.split(filepath)
+
+    if options.output_dir is not None:
+        output_dir = options.output_dir
+
+    basename = os.path.splitext(filename)[0]
+
+    if suffix is not None:
+        filename = "{}_{}.csv".format(basename, suffix)
+
+    elif options.format == "pys":
+        # Never overwrite the input file
+        filename = basename + "_results.pys"
+
+    elif table is None:
+        filename = basename + ".csv"
+
+    else:
+        filename = "{}_{}.csv".format(basename, table)
+
+    return os.path.join(output_dir, filename)
+
+
+def process_file(filepath, options):
+    """Recalculates and exports one file
+
+    Returns tuple of error message and list of keys of failed cells.
+    The error message is None if the file has been processed.
+
+    Parameters
+    ----------
+    filepath: String
+    \tPath of pys file
+    options: optparse.Values
+    \tCommand line options
+
+    """
+
+    dict_grid_class = DiskDictGrid if options.disk else DictGrid
+
+    try:
+        code_array = load_pys(filepath, dict_grid_class)
+
+    except (IOError, EOFError, ValueError), err:
+        return unicode(err), []
+
+    # Globals of previously processed files must not leak
+    code_array.clear_globals()
+
+    if options.profile:
+        code_array.profiler = CellProfiler()
+
+    try:
+        if options.macros:
+            code_array.execute_macros()
+
+        failed_keys = recalculate_all(code_array)
+
+        if options.profile:
+            outfilepath = get_output_filepath(filepath, options,
+                                              suffix="profile")
+            outfile = open(outfilepath, "wb")
+
+            try:
+                code_array.profiler.write_csv(outfile, code_array.dict_grid)
+
+            finally:
+                outfile.close()
+
+            # Export reads results without profiling
+            code_array.profiler = None
+
+        if options.format == "pys":
+            outfilepath = get_output_filepath(filepath, options)
+            save_pys(get_value_array(code_array), outfilepath)
+
+        elif options.table is not None:
+            outfilepath = get_output_filepath(filepath, options)
+            export_csv(code_array, outfilepath, options.table)
+
+        else:
+            no_tables = code_array.shape[2]
+
+            for table in xrange(no_tables):
+                if no_tables == 1:
+                    outfilepath = get_output_filepath(filepath, options)
+
+                else:
+                    outfilepath = get_output_filepath(filepath, options,
+                                                      table)
+
+                export_csv(code_array, outfilepath, table)
+
+    except (IOError, OSError), err:
+        return unicode(err), []
+
+    finally:
+        code_array.clear_globals()
+
+    return None, failed_keys
+
+
+def _process_file(args):
+    """Wrapper of process_file for worker processes"""
+
+    filepath, options = args
+
+    return process_file(filepath, options)
+
+
+def main():
+    """Parses command line and processes files
+
+    Returns exit status, which is 1 if a file could not be processed.
+
+    """
+
+    options, filepaths = Commandlineparser().parse()
+
+    jobs = [(filepath, options) for filepath in filepaths]
+
+    if options.jobs == 1:
+        reports = map(_process_file, jobs)
+
+    else:
+        # Each file gets a fresh process so that macros cannot interfere
+        pool = Pool(options.jobs, maxtasksperchild=1)
+
+        try:
+            reports = pool.map(_process_file, jobs)
+            pool.close()
+
+        finally:
+            pool.terminate()
+            pool.join()
+
+    exit_status = 0
+
+    for filepath, (error, failed_keys) in zip(filepaths, reports):
+        if error is not None:
+            msg = _("Error processing {}: {}").format(filepath, error)
+            print >> sys.stderr, msg.encode("utf-8")
+            exit_status = 1
+
+        elif failed_keys:
+            msg = _("{}: {} cells with errors").format(filepath,
+                                                       len(failed_keys))
+            print >> sys.stderr, msg.encode("utf-8")
+
+    return exit_status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -30,7 +30,12 @@ System environment access
 
 import os
 
-import wx
+try:
+    import wx
+
+except ImportError:
+    # Headless operation without wxPython, e.g. in batch mode
+    wx = None
 
 # Paths
 